@@ -0,0 +1,281 @@
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from PIL import Image
+from color_conversion import rgb_to_ycbcr, rgb_to_ycbcr_into, ycbcr_to_rgb, ycbcr_planes_to_rgb
+from subsampling import downsample_channel, upsample_channel, get_subsampling_factors
+from compressor import build_zigzag_blocks, downsample_channel_420, encode_myjpeg, compress_image, quantize_channel_blocks
+from block_processing import reconstruct_blocks
+from quantization import adjust_quantization_matrix, dequantize, BASE_Q_LUMINANCE, BASE_Q_CHROMINANCE
+from dct import idct_2d_transform_batch
+from zigzag import inverse_zigzag_scan_blocks, last_nonzero_indices
+from rle import rle_encode_blocks
+from huffman_coding import HuffmanTable, huffman_encode_symbols, huffman_decode_blocks
+from jpeg_codec import jpeg_compress, jpeg_decompress
+from quality_sweep import quality_sweep
+from decompressor import decompress_image, decode_image, split_myjpeg
+from region_decoder import decode_region
+from restart_intervals import huffman_encode_intervals, huffman_decode_intervals
+from huffman_tables import DEFAULT_DC_LUMINANCE_BITS, DEFAULT_DC_LUMINANCE_HUFFVAL
+from huffman_tables import DEFAULT_AC_LUMINANCE_BITS, DEFAULT_AC_LUMINANCE_HUFFVAL
+from huffman_tables import DEFAULT_DC_CHROMINANCE_BITS, DEFAULT_DC_CHROMINANCE_HUFFVAL
+from huffman_tables import DEFAULT_AC_CHROMINANCE_BITS, DEFAULT_AC_CHROMINANCE_HUFFVAL
+
+BENCHMARK_IMAGES = [
+    ('Lenna.png', 'Lenna'),
+    ('test/test_image.png', 'test_image_2048'),
+]
+
+def best_time(func, *args, repeat=3, **kwargs):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+def load_rgb(image_path):
+    return np.array(Image.open(image_path).convert('RGB'))
+
+def bench_entropy_encode(images=BENCHMARK_IMAGES, quality=75, block_size=8):
+    huff_dc_y = HuffmanTable(DEFAULT_DC_LUMINANCE_BITS, DEFAULT_DC_LUMINANCE_HUFFVAL)
+    huff_ac_y = HuffmanTable(DEFAULT_AC_LUMINANCE_BITS, DEFAULT_AC_LUMINANCE_HUFFVAL)
+    huff_dc_c = HuffmanTable(DEFAULT_DC_CHROMINANCE_BITS, DEFAULT_DC_CHROMINANCE_HUFFVAL)
+    huff_ac_c = HuffmanTable(DEFAULT_AC_CHROMINANCE_BITS, DEFAULT_AC_CHROMINANCE_HUFFVAL)
+    q_y = adjust_quantization_matrix(BASE_Q_LUMINANCE, quality)
+    q_c = adjust_quantization_matrix(BASE_Q_CHROMINANCE, quality)
+
+    print("Entropy encode throughput (rle_encode_blocks + huffman_encode_symbols, all components)")
+    for image_path, name in images:
+        rgb = load_rgb(image_path)
+        ycbcr = rgb_to_ycbcr(rgb)
+        components = [
+            (ycbcr[:, :, 0], q_y, huff_dc_y, huff_ac_y),
+            (downsample_channel_420(ycbcr[:, :, 1]), q_c, huff_dc_c, huff_ac_c),
+            (downsample_channel_420(ycbcr[:, :, 2]), q_c, huff_dc_c, huff_ac_c),
+        ]
+        prepared = [(build_zigzag_blocks(channel, q_matrix, block_size)[0], dc_table, ac_table)
+                    for channel, q_matrix, dc_table, ac_table in components]
+
+        def encode_all():
+            return sum(len(huffman_encode_symbols(*rle_encode_blocks(zigzag_blocks), dc_table, ac_table))
+                       for zigzag_blocks, dc_table, ac_table in prepared)
+
+        elapsed, output_size = best_time(encode_all)
+        raw_mb = rgb.nbytes / 1e6
+        print(f"{name}: {elapsed:.3f}s, {raw_mb / elapsed:.2f} MB/s of RGB input, "
+              f"{output_size / 1e6 / elapsed:.2f} MB/s of coded output ({output_size} bytes)")
+
+def bench_restart_intervals(image_path='test/test_image.png', quality=75, block_size=8, restart_interval=256,
+                            worker_counts=(1, 2, 4, 8)):
+    huff_dc_y = HuffmanTable(DEFAULT_DC_LUMINANCE_BITS, DEFAULT_DC_LUMINANCE_HUFFVAL)
+    huff_ac_y = HuffmanTable(DEFAULT_AC_LUMINANCE_BITS, DEFAULT_AC_LUMINANCE_HUFFVAL)
+    q_y = adjust_quantization_matrix(BASE_Q_LUMINANCE, quality)
+    y = rgb_to_ycbcr(load_rgb(image_path))[:, :, 0]
+    zigzag_blocks = build_zigzag_blocks(y, q_y, block_size)[0]
+    num_blocks = len(zigzag_blocks)
+
+    symbols = rle_encode_blocks(zigzag_blocks)
+    plain_bytes = huffman_encode_symbols(*symbols, huff_dc_y, huff_ac_y)
+    elapsed, _ = best_time(huffman_decode_blocks, plain_bytes, huff_dc_y, huff_ac_y, num_blocks, block_size)
+    print(f"Y entropy decode of {image_path}, {num_blocks} blocks")
+    print(f"no restart intervals: {elapsed:.3f}s, {len(plain_bytes)} bytes")
+
+    symbols = rle_encode_blocks(build_zigzag_blocks(y, q_y, block_size, restart_interval)[0])
+    for workers in worker_counts:
+        encode_time, (interval_bytes, offsets) = best_time(huffman_encode_intervals, *symbols, huff_dc_y, huff_ac_y,
+                                                           restart_interval, workers)
+        decode_time, _ = best_time(huffman_decode_intervals, interval_bytes, offsets, huff_dc_y, huff_ac_y,
+                                   num_blocks, restart_interval, block_size, workers)
+        print(f"restart_interval={restart_interval}, workers={workers}: encode {encode_time:.3f}s, "
+              f"decode {decode_time:.3f}s, {len(interval_bytes)} bytes")
+
+def bench_parallel_encode(image_path='test/test_image.png', quality=75, block_size=8, worker_counts=(1, 2, 4, 8)):
+    q_y = adjust_quantization_matrix(BASE_Q_LUMINANCE, quality)
+    q_c = adjust_quantization_matrix(BASE_Q_CHROMINANCE, quality)
+    ycbcr = rgb_to_ycbcr(load_rgb(image_path))
+    y = ycbcr[:, :, 0]
+    chroma_planes = [downsample_channel_420(ycbcr[:, :, 1]), downsample_channel_420(ycbcr[:, :, 2])]
+
+    print(f"Parallel encode of {image_path} (DCT, quantization and entropy coding, all components)")
+    baseline = None
+    for workers in worker_counts:
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed, output = best_time(encode_myjpeg, y, chroma_planes, q_y, q_c, quality, block_size, workers=workers)
+        baseline = baseline or elapsed
+        print(f"workers={workers}: {elapsed:.3f}s, speedup {baseline / elapsed:.2f}x, {len(output)} bytes")
+
+def bench_quality_sweep(images=BENCHMARK_IMAGES, qualities=(10, 20, 30, 40, 50, 60, 70, 80, 90, 95)):
+    print(f"Quality sweep over {len(qualities)} qualities")
+    for image_path, name in images:
+        with contextlib.redirect_stdout(io.StringIO()):
+            loop_time, _ = best_time(lambda: [compress_image(image_path, os.devnull, quality) for quality in qualities],
+                                     repeat=1)
+        sweep_time, _ = best_time(quality_sweep, image_path, qualities, repeat=1)
+        print(f"{name}: compress_image per quality {loop_time:.3f}s, quality_sweep {sweep_time:.3f}s")
+
+def bench_region_decode(image_path='test/test_image.png', quality=75, region=(1400, 1560, 640, 480)):
+    print(f"Region decode of {region} from {image_path}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        plain_path = os.path.join(tmp_dir, 'bench_region.myjpeg')
+        indexed_path = os.path.join(tmp_dir, 'bench_region_indexed.myjpeg')
+        with contextlib.redirect_stdout(io.StringIO()):
+            compress_image(image_path, plain_path, quality)
+            compress_image(image_path, indexed_path, quality, row_index=True)
+            full_time, _ = best_time(decompress_image, plain_path, os.path.join(tmp_dir, 'bench_region.png'), repeat=1)
+        print(f"full decode: {full_time:.3f}s")
+        for label, path in (('no row index', plain_path), ('row index', indexed_path)):
+            elapsed, _ = best_time(decode_region, path, *region)
+            print(f"{label}: {elapsed:.3f}s")
+
+def bench_scaled_decode(images=BENCHMARK_IMAGES, quality=75, scales=(1, 2, 4, 8)):
+    print("Scaled decode (decode_image with scale=1/n)")
+    for image_path, name in images:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'bench_scaled.myjpeg')
+            with contextlib.redirect_stdout(io.StringIO()):
+                compress_image(image_path, path, quality)
+            for scale in scales:
+                elapsed, pixels = best_time(decode_image, path, scale=scale)
+                print(f"{name} 1/{scale}: {elapsed:.3f}s, {pixels.shape[1]}x{pixels.shape[0]}")
+
+def bench_dct_methods(images=BENCHMARK_IMAGES, qualities=(50, 75, 95), block_size=8):
+    print("Float vs fast (fixed-point AAN) DCT on the Y plane")
+    for image_path, name in images:
+        y = rgb_to_ycbcr(load_rgb(image_path))[:, :, 0]
+        block_rows, block_cols = -(-y.shape[0] // block_size), -(-y.shape[1] // block_size)
+        for quality in qualities:
+            q_y = adjust_quantization_matrix(BASE_Q_LUMINANCE, quality)
+            row = []
+            for dct_method in ('float', 'fast'):
+                encode_time, (zigzag_blocks, _) = best_time(quantize_channel_blocks, y, q_y, block_size, dct_method)
+                decode_time, plane = best_time(reconstruct_blocks, zigzag_blocks, q_y, block_size, block_rows,
+                                               block_cols, dct_method=dct_method)
+                error = np.mean((plane[:y.shape[0], :y.shape[1]].astype(np.float64) - y) ** 2)
+                row.append(f"{dct_method} fdct+quant {encode_time:.3f}s, dequant+idct {decode_time:.3f}s, "
+                           f"PSNR {10 * np.log10(255.0 ** 2 / error):.2f}dB")
+            print(f"{name} q{quality}: " + ' | '.join(row))
+
+def bench_sparse_blocks(images=BENCHMARK_IMAGES + [('test/test_image_bw.png', 'test_image_bw')],
+                        qualities=(10, 50, 75, 95), block_size=8):
+    print("Sparse-aware dequantize+IDCT vs every block through the full kernel (Y plane)")
+    for image_path, name in images:
+        y = rgb_to_ycbcr(load_rgb(image_path))[:, :, 0]
+        block_rows, block_cols = -(-y.shape[0] // block_size), -(-y.shape[1] // block_size)
+        for quality in qualities:
+            q_y = adjust_quantization_matrix(BASE_Q_LUMINANCE, quality)
+            zigzag_blocks, _ = quantize_channel_blocks(y, q_y, block_size)
+            zigzag_blocks = np.ascontiguousarray(zigzag_blocks)
+            last_nonzero = last_nonzero_indices(zigzag_blocks)
+            full_time, _ = best_time(lambda: idct_2d_transform_batch(
+                dequantize(inverse_zigzag_scan_blocks(zigzag_blocks, block_size), q_y)))
+            sparse_time, _ = best_time(reconstruct_blocks, zigzag_blocks, q_y, block_size, block_rows, block_cols)
+            print(f"{name} q{quality}: {np.mean(last_nonzero == 0):.0%} DC-only blocks, "
+                  f"full kernel {full_time:.3f}s, sparse-aware {sparse_time:.3f}s")
+
+def bench_grayscale(images=(('test/test_image_grayscale.png', 'test_image_grayscale'),
+                            ('test/test_image_bw.png', 'test_image_bw')), quality=75):
+    print("Grayscale sources: single Y component vs the same pixels coded as RGB")
+    for image_path, name in images:
+        gray = np.asarray(Image.open(image_path).convert('L'))
+        for label, pixels in (('Y only', gray), ('RGB', np.repeat(gray[:, :, np.newaxis], 3, axis=2))):
+            encode_time, data = best_time(jpeg_compress, pixels, quality)
+            decode_time, _ = best_time(jpeg_decompress, data)
+            print(f"{name} {label}: encode {encode_time:.3f}s, decode {decode_time:.3f}s, {len(data)} bytes")
+
+def peak_memory(func, *args, **kwargs):
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_color_conversion(image_path='test/test_image.png', subsampling='4:2:0'):
+    print(f"Colour conversion on {image_path} ({subsampling} chroma)")
+    rgb = load_rgb(image_path)
+    height, width = rgb.shape[:2]
+    y, cb, cr = (np.empty((height, width), dtype=np.uint8) for _ in range(3))
+    rgb_to_ycbcr_into(rgb, y, cb, cr)
+    cb, cr = downsample_channel(cb, subsampling), downsample_channel(cr, subsampling)
+    factor_v, factor_h = get_subsampling_factors(subsampling)
+    out = np.empty_like(rgb)
+
+    def unfused(fancy):
+        planes = (y, upsample_channel(cb, height, width, subsampling, fancy),
+                  upsample_channel(cr, height, width, subsampling, fancy))
+        return ycbcr_to_rgb(np.stack(planes, axis=-1))
+
+    cases = [
+        ('rgb_to_ycbcr', rgb_to_ycbcr, (rgb,)),
+        ('rgb_to_ycbcr_into', rgb_to_ycbcr_into, (rgb, y.copy(), y.copy(), y.copy())),
+    ]
+    for fancy in (False, True):
+        cases += [
+            (f"upsample + ycbcr_to_rgb (fancy={fancy})", unfused, (fancy,)),
+            (f"ycbcr_planes_to_rgb (fancy={fancy})", ycbcr_planes_to_rgb, (y, cb, cr, factor_v, factor_h, fancy, out)),
+        ]
+    for label, func, args in cases:
+        elapsed, _ = best_time(func, *args)
+        print(f"{label}: {elapsed:.3f}s, peak {peak_memory(func, *args) / 2 ** 20:.1f} MiB")
+
+def bench_progressive(images=BENCHMARK_IMAGES, quality=75):
+    for image_path, name in images:
+        rgb = load_rgb(image_path)
+        sequential = jpeg_compress(rgb, quality, optimize_huffman=True)
+        encode_time, data = best_time(jpeg_compress, rgb, quality, progressive=True)
+        decode_time, _ = best_time(jpeg_decompress, data)
+        print(f"{name} q{quality}: sequential {len(sequential)} bytes, progressive {len(data)} bytes, "
+              f"encode {encode_time:.3f}s, decode {decode_time:.3f}s")
+
+        metadata, payloads = split_myjpeg(data)
+        received = len(data) - sum(len(payload) for payload in payloads)
+        for num_scans, (scan, payload) in enumerate(zip(metadata['scans'], payloads), 1):
+            received += len(payload)
+            preview = jpeg_decompress(data, max_scans=num_scans).astype(np.float64)
+            mse = np.mean((preview - rgb) ** 2)
+            psnr = 10 * np.log10(255.0 ** 2 / mse) if mse else float('inf')
+            print(f"  scan {num_scans:2d} {scan['component']:<2} {scan['ss']:2d}-{scan['se']:<2d} "
+                  f"Ah={scan['ah']} Al={scan['al']}: {100.0 * received / len(data):5.1f}% of bytes, {psnr:.2f} dB")
+
+def _retry_target_bytes(rgb, target_bytes):
+    low, high, best = 1, 100, None
+    while low <= high:
+        quality = (low + high) // 2
+        data = jpeg_compress(rgb, quality)
+        if len(data) <= target_bytes:
+            best, low = data, quality + 1
+        else:
+            high = quality - 1
+    return best
+
+def bench_rate_control(images=BENCHMARK_IMAGES, target_ratio=0.1):
+    print("Target-size encoding: full-encode retry loop vs target_bytes")
+    for image_path, name in images:
+        rgb = load_rgb(image_path)
+        target_bytes = int(rgb.size * target_ratio)
+        loop_time, loop_data = best_time(_retry_target_bytes, rgb, target_bytes, repeat=1)
+        rate_time, rate_data = best_time(jpeg_compress, rgb, target_bytes=target_bytes, repeat=1)
+        print(f"{name} target {target_bytes} bytes: retry loop {loop_time:.3f}s ({len(loop_data)} bytes), "
+              f"target_bytes {rate_time:.3f}s ({len(rate_data)} bytes)")
+
+if __name__ == '__main__':
+    bench_entropy_encode()
+    bench_restart_intervals()
+    bench_parallel_encode()
+    bench_quality_sweep()
+    bench_region_decode()
+    bench_scaled_decode()
+    bench_dct_methods()
+    bench_sparse_blocks()
+    bench_grayscale()
+    bench_color_conversion()
+    bench_progressive()
+    bench_rate_control()
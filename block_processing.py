@@ -1,59 +1,143 @@
-import numpy as np
-
-def split_into_blocks(image_channel, block_size, fill_value=0):
-    if not isinstance(image_channel, np.ndarray):
-        raise TypeError("Input must be a numpy array.")
-    if image_channel.ndim != 2:
-        raise ValueError("Input must be a 2D array.")
-    if not isinstance(block_size, int) or block_size <= 0:
-        raise ValueError("block_size must be a positive integer.")
-
-    height, width = image_channel.shape
-
-    pad_height = (block_size - (height % block_size)) % block_size
-    pad_width = (block_size - (width % block_size)) % block_size
-
-    if pad_height > 0 or pad_width > 0:
-        padded_image = np.pad(image_channel,
-                              ((0, pad_height), (0, pad_width)),
-                              mode='constant',
-                              constant_values=fill_value)
-    else:
-        padded_image = image_channel
-
-    padded_height, padded_width = padded_image.shape
-
-    blocks = []
-    for row in range(0, padded_height, block_size):
-        for col in range(0, padded_width, block_size):
-            block = padded_image[row:row+block_size, col:col+block_size]
-            blocks.append(block)
-
-    return blocks
-
-def reassemble_from_blocks(blocks, padded_height, padded_width):
-    if not blocks:
-        return np.array([], dtype=np.uint8).reshape(0, 0)
-
-    block_size = blocks[0].shape[0]
-    if any(block.shape != (block_size, block_size) for block in blocks):
-        raise ValueError("All blocks must be square and of the same size.")
-
-    if padded_height % block_size != 0 or padded_width % block_size != 0:
-        raise ValueError("padded_height and padded_width must be multiples of block_size.")
-
-    num_blocks_vert = padded_height // block_size
-    num_blocks_horz = padded_width // block_size
-
-    if len(blocks) != num_blocks_vert * num_blocks_horz:
-        raise ValueError("Number of blocks does not match padded dimensions.")
-
-    image = np.zeros((padded_height, padded_width), dtype=blocks[0].dtype)
-
-    idx = 0
-    for r in range(num_blocks_vert):
-        for c in range(num_blocks_horz):
-            image[r*block_size:(r+1)*block_size, c*block_size:(c+1)*block_size] = blocks[idx]
-            idx += 1
-
-    return image
+import numpy as np
+from dct import idct_2d_transform_batch, idct_2d_low_order_batch, idct_2d_dc_only, idct_aan_batch, idct_aan_dc_only
+from dct import AAN_BLOCK_SIZE
+from quantization import dequantize, dequantize_aan
+from zigzag import inverse_zigzag_scan_blocks, corner_zigzag_positions, last_nonzero_indices
+
+SCALE_DENOMINATORS = (1, 2, 4, 8)
+# Splitting a batch by sparsity only pays off once at least 1/SPARSE_SPLIT_RATIO of its blocks are sparse
+SPARSE_SPLIT_RATIO = 8
+
+def pad_to_block_multiple(image_channel, block_size, fill_value=0):
+    if not isinstance(image_channel, np.ndarray):
+        raise TypeError("Input must be a numpy array.")
+    if image_channel.ndim != 2:
+        raise ValueError("Input must be a 2D array.")
+    if not isinstance(block_size, int) or block_size <= 0:
+        raise ValueError("block_size must be a positive integer.")
+
+    height, width = image_channel.shape
+
+    pad_height = (block_size - (height % block_size)) % block_size
+    pad_width = (block_size - (width % block_size)) % block_size
+
+    if pad_height > 0 or pad_width > 0:
+        return np.pad(image_channel,
+                      ((0, pad_height), (0, pad_width)),
+                      mode='constant',
+                      constant_values=fill_value)
+    return image_channel
+
+def block_view(image_channel, block_size, fill_value=0):
+    padded_image = pad_to_block_multiple(image_channel, block_size, fill_value)
+    padded_height, padded_width = padded_image.shape
+    rows = padded_height // block_size
+    cols = padded_width // block_size
+    return padded_image.reshape(rows, block_size, cols, block_size).swapaxes(1, 2)
+
+def merge_block_view(blocks):
+    if not isinstance(blocks, np.ndarray):
+        raise TypeError("Input must be a numpy array.")
+    if blocks.ndim != 4 or blocks.shape[2] != blocks.shape[3]:
+        raise ValueError("Input must have shape (rows, cols, N, N).")
+    rows, cols, block_size, _ = blocks.shape
+    return blocks.swapaxes(1, 2).reshape(rows * block_size, cols * block_size)
+
+def split_into_blocks(image_channel, block_size, fill_value=0):
+    view = block_view(image_channel, block_size, fill_value)
+    return [block for block_row in view for block in block_row]
+
+def reassemble_from_blocks(blocks, padded_height, padded_width):
+    if len(blocks) == 0:
+        return np.array([], dtype=np.uint8).reshape(0, 0)
+
+    blocks = np.asarray(blocks)
+    if blocks.ndim != 3 or blocks.shape[1] != blocks.shape[2]:
+        raise ValueError("All blocks must be square and of the same size.")
+    block_size = blocks.shape[1]
+
+    if padded_height % block_size != 0 or padded_width % block_size != 0:
+        raise ValueError("padded_height and padded_width must be multiples of block_size.")
+
+    num_blocks_vert = padded_height // block_size
+    num_blocks_horz = padded_width // block_size
+
+    if len(blocks) != num_blocks_vert * num_blocks_horz:
+        raise ValueError("Number of blocks does not match padded dimensions.")
+
+    return merge_block_view(blocks.reshape(num_blocks_vert, num_blocks_horz, block_size, block_size))
+
+def scaled_block_size(block_size, scale):
+    if scale not in SCALE_DENOMINATORS or block_size % scale:
+        raise ValueError(f"Unsupported decode scale 1/{scale} for block size {block_size}. "
+                         f"Expected one of {['1/%d' % d for d in SCALE_DENOMINATORS if block_size % d == 0]}.")
+    return block_size // scale
+
+def scaled_coefficient_count(block_size, scale):
+    scaled_size = scaled_block_size(block_size, scale)
+    return int(corner_zigzag_positions(block_size, scaled_size).max()) + 1
+
+def _to_pixels(samples):
+    samples += 128
+    return np.clip(samples, 0, 255).astype(np.uint8)
+
+def _low_order_blocks(zigzag_blocks, last_nonzero, block_size):
+    corner = corner_zigzag_positions(block_size, block_size // 2)
+    outside = np.setdiff1d(np.arange(corner.max() + 1), corner)
+    candidates = np.flatnonzero((last_nonzero > 0) & (last_nonzero <= corner.max()))
+    in_corner = ~np.any(zigzag_blocks[np.ix_(candidates, outside)] != 0, axis=1)
+    return candidates[in_corner], corner
+
+def _full_block_pixels(zigzag_blocks, q_matrix, block_size, fast):
+    quantized_array = inverse_zigzag_scan_blocks(zigzag_blocks, block_size)
+    if fast:
+        return _to_pixels(idct_aan_batch(dequantize_aan(quantized_array, q_matrix)))
+    return _to_pixels(idct_2d_transform_batch(dequantize(quantized_array, q_matrix)))
+
+def reconstruct_full_blocks(zigzag_blocks, q_matrix, block_size, dct_method='float'):
+    fast = dct_method == 'fast' and block_size == AAN_BLOCK_SIZE
+    last_nonzero = last_nonzero_indices(zigzag_blocks)
+    dc_only = np.flatnonzero(last_nonzero == 0)
+    low_order, corner = _low_order_blocks(zigzag_blocks, last_nonzero, block_size)
+    if (len(dc_only) + len(low_order)) * SPARSE_SPLIT_RATIO < len(zigzag_blocks):
+        return _full_block_pixels(zigzag_blocks, q_matrix, block_size, fast)
+    final_blocks = np.empty((len(zigzag_blocks), block_size, block_size), dtype=np.uint8)
+
+    # DC-only blocks are flat
+    if fast:
+        dc_samples = idct_aan_dc_only(dequantize_aan(zigzag_blocks[dc_only, :1], q_matrix)[:, 0])
+    else:
+        dc_samples = idct_2d_dc_only(dequantize(zigzag_blocks[dc_only, 0], q_matrix[0, 0]), block_size)
+    final_blocks[dc_only] = _to_pixels(dc_samples)[:, None, None]
+
+    # Blocks whose coefficients all sit in the top-left quarter take the reduced kernel
+    corner_size = block_size // 2
+    corner_blocks = zigzag_blocks[low_order][:, corner].reshape(-1, corner_size, corner_size)
+    if fast:
+        low_order_samples = idct_aan_batch(dequantize_aan(corner_blocks, q_matrix))
+    else:
+        low_order_samples = idct_2d_low_order_batch(dequantize(corner_blocks, q_matrix[:corner_size, :corner_size]),
+                                                    block_size)
+    final_blocks[low_order] = _to_pixels(low_order_samples)
+
+    full = np.ones(len(zigzag_blocks), dtype=bool)
+    full[dc_only] = False
+    full[low_order] = False
+    final_blocks[full] = _full_block_pixels(zigzag_blocks[full], q_matrix, block_size, fast)
+    return final_blocks
+
+def reconstruct_blocks(zigzag_blocks, q_matrix, block_size, block_rows, block_cols, scale=1, dct_method='float'):
+    scaled_size = scaled_block_size(block_size, scale)
+    if scaled_size == 1:
+        dc_pixels = zigzag_blocks[:, 0] * (0.125 * float(q_matrix[0, 0])) + 128.0
+        return np.clip(dc_pixels, 0, 255).astype(np.uint8).reshape(block_rows, block_cols)
+
+    if scaled_size == block_size:
+        final_blocks = reconstruct_full_blocks(zigzag_blocks, q_matrix, block_size, dct_method)
+        return merge_block_view(final_blocks.reshape(block_rows, block_cols, block_size, block_size))
+
+    corner = corner_zigzag_positions(block_size, scaled_size)
+    quantized_array = zigzag_blocks[:, corner].reshape(-1, scaled_size, scaled_size)
+    dequant_blocks = dequantize(quantized_array, q_matrix[:scaled_size, :scaled_size])
+    final_blocks = _to_pixels(idct_2d_transform_batch(dequant_blocks))
+    return merge_block_view(final_blocks.reshape(block_rows, block_cols, scaled_size, scaled_size))
@@ -1,51 +1,110 @@
-import numpy as np
-
-def rgb_to_ycbcr(rgb_image):
-    if not isinstance(rgb_image, np.ndarray):
-        raise TypeError("Input image must be a numpy array.")
-    if rgb_image.ndim != 3 or rgb_image.shape[2] != 3:
-        raise ValueError("Input image must have shape (H, W, 3).")
-
-    rgb_image_float = rgb_image.astype(np.float32)
-
-    r = rgb_image_float[:, :, 0]
-    g = rgb_image_float[:, :, 1]
-    b = rgb_image_float[:, :, 2]
-
-    y = 0.299 * r + 0.587 * g + 0.114 * b
-    cb = -0.168736 * r - 0.331264 * g + 0.5 * b + 128.0
-    cr = 0.5 * r - 0.418688 * g - 0.081312 * b + 128.0
-
-    ycbcr_image = np.zeros_like(rgb_image_float)
-    ycbcr_image[:, :, 0] = y
-    ycbcr_image[:, :, 1] = cb
-    ycbcr_image[:, :, 2] = cr
-
-    ycbcr_image = np.clip(ycbcr_image, 0, 255)
-
-    return ycbcr_image.astype(np.uint8)
-
-def ycbcr_to_rgb(ycbcr_image):
-    if not isinstance(ycbcr_image, np.ndarray):
-        raise TypeError("Input image must be a numpy array.")
-    if ycbcr_image.ndim != 3 or ycbcr_image.shape[2] != 3:
-        raise ValueError("Input image must have shape (H, W, 3).")
-
-    ycbcr_image_float = ycbcr_image.astype(np.float32)
-
-    y = ycbcr_image_float[:, :, 0]
-    cb = ycbcr_image_float[:, :, 1]
-    cr = ycbcr_image_float[:, :, 2]
-
-    r = y + 1.402 * (cr - 128.0)
-    g = y - 0.344136 * (cb - 128.0) - 0.714136 * (cr - 128.0)
-    b = y + 1.772 * (cb - 128.0)
-
-    rgb_image = np.zeros_like(ycbcr_image_float)
-    rgb_image[:, :, 0] = r
-    rgb_image[:, :, 1] = g
-    rgb_image[:, :, 2] = b
-
-    rgb_image = np.clip(rgb_image, 0, 255)
-
-    return rgb_image.astype(np.uint8)
+import numpy as np
+from subsampling import upsample_rows
+
+SCALE_BITS = 16
+ONE_HALF = 1 << (SCALE_BITS - 1)
+CONVERSION_STRIP_PIXELS = 1 << 16
+
+def _fix(x):
+    return int(round(x * (1 << SCALE_BITS)))
+
+# (R, G, B) weights and rounding offset per output plane; the chroma offsets sit one below
+# a half so that full-scale inputs cannot round past 255
+_RGB_TO_YCBCR = (
+    (_fix(0.299), _fix(0.587), _fix(0.114), ONE_HALF),
+    (-_fix(0.168736), -_fix(0.331264), _fix(0.5), (128 << SCALE_BITS) + ONE_HALF - 1),
+    (_fix(0.5), -_fix(0.418688), -_fix(0.081312), (128 << SCALE_BITS) + ONE_HALF - 1),
+)
+_CR_TO_R = _fix(1.402)
+_CB_TO_G = -_fix(0.344136)
+_CR_TO_G = -_fix(0.714136)
+_CB_TO_B = _fix(1.772)
+
+def _strip_rows(width):
+    return max(1, CONVERSION_STRIP_PIXELS // max(width, 1))
+
+def _check_output(buffer, shape):
+    if not isinstance(buffer, np.ndarray) or buffer.dtype != np.uint8 or buffer.shape != shape:
+        raise ValueError(f"Output buffer must be a uint8 array of shape {shape}.")
+
+def _check_color_image(image):
+    if not isinstance(image, np.ndarray):
+        raise TypeError("Input image must be a numpy array.")
+    if image.ndim != 3 or image.shape[2] != 3:
+        raise ValueError("Input image must have shape (H, W, 3).")
+    if image.dtype != np.uint8:
+        raise TypeError("Input image must have dtype uint8.")
+
+def rgb_to_ycbcr_into(rgb_image, y_out, cb_out, cr_out):
+    _check_color_image(rgb_image)
+    height, width = rgb_image.shape[:2]
+    outputs = (y_out, cb_out, cr_out)
+    for plane in outputs:
+        _check_output(plane, (height, width))
+
+    rows = _strip_rows(width)
+    acc = np.empty((rows, width), dtype=np.int32)
+    term = np.empty_like(acc)
+    for row_start in range(0, height, rows):
+        strip = rgb_image[row_start:row_start + rows]
+        count = len(strip)
+        acc_rows, term_rows = acc[:count], term[:count]
+        for plane, (weight_r, weight_g, weight_b, offset) in zip(outputs, _RGB_TO_YCBCR):
+            np.multiply(strip[:, :, 0], weight_r, out=acc_rows, dtype=np.int32)
+            np.multiply(strip[:, :, 1], weight_g, out=term_rows, dtype=np.int32)
+            acc_rows += term_rows
+            np.multiply(strip[:, :, 2], weight_b, out=term_rows, dtype=np.int32)
+            acc_rows += term_rows
+            acc_rows += offset
+            acc_rows >>= SCALE_BITS
+            plane[row_start:row_start + count] = acc_rows
+
+def rgb_to_ycbcr(rgb_image, out=None):
+    _check_color_image(rgb_image)
+    if out is None:
+        out = np.empty(rgb_image.shape, dtype=np.uint8)
+    _check_output(out, rgb_image.shape)
+    rgb_to_ycbcr_into(rgb_image, out[:, :, 0], out[:, :, 1], out[:, :, 2])
+    return out
+
+def _store_channel(target, acc, y_rows):
+    acc += ONE_HALF
+    acc >>= SCALE_BITS
+    acc += y_rows
+    np.clip(acc, 0, 255, out=acc)
+    target[...] = acc
+
+def ycbcr_planes_to_rgb(y, cb, cr, factor_v=1, factor_h=1, fancy=False, out=None):
+    height, width = y.shape
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.uint8)
+    _check_output(out, (height, width, 3))
+
+    rows = _strip_rows(width)
+    acc = np.empty((rows, width), dtype=np.int32)
+    cb_term = np.empty_like(acc)
+    cr_term = np.empty_like(acc)
+    for row_start in range(0, height, rows):
+        row_end = min(row_start + rows, height)
+        count = row_end - row_start
+        # Chroma is upsampled one strip at a time, so full-size Cb/Cr planes never exist
+        np.subtract(upsample_rows(cb, row_start, row_end, width, factor_v, factor_h, fancy), 128,
+                    out=cb_term[:count], dtype=np.int32)
+        np.subtract(upsample_rows(cr, row_start, row_end, width, factor_v, factor_h, fancy), 128,
+                    out=cr_term[:count], dtype=np.int32)
+        y_rows = y[row_start:row_end]
+        target = out[row_start:row_end]
+
+        np.multiply(cr_term[:count], _CR_TO_R, out=acc[:count])
+        _store_channel(target[:, :, 0], acc[:count], y_rows)
+        np.multiply(cb_term[:count], _CB_TO_B, out=acc[:count])
+        _store_channel(target[:, :, 2], acc[:count], y_rows)
+        np.multiply(cb_term[:count], _CB_TO_G, out=acc[:count])
+        cr_term[:count] *= _CR_TO_G
+        acc[:count] += cr_term[:count]
+        _store_channel(target[:, :, 1], acc[:count], y_rows)
+    return out
+
+def ycbcr_to_rgb(ycbcr_image, out=None):
+    _check_color_image(ycbcr_image)
+    return ycbcr_planes_to_rgb(ycbcr_image[:, :, 0], ycbcr_image[:, :, 1], ycbcr_image[:, :, 2], out=out)
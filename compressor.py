@@ -1,160 +1,337 @@
-import numpy as np
-from PIL import Image
-import math
-import json
-from color_conversion import rgb_to_ycbcr
-from block_processing import split_into_blocks
-from dct import dct_2d_transform
-from quantization import adjust_quantization_matrix, quantize, BASE_Q_LUMINANCE, BASE_Q_CHROMINANCE
-from zigzag import zigzag_scan
-from rle import rle_encode_ac_coefficients
-from vli_coding import get_vli_category_and_value
-from huffman_coding import HuffmanTable, huffman_encode_data
-import os
-
-def downsample_channel_420(channel):
-    original_height, original_width = channel.shape
-    new_height = math.ceil(original_height / 2)
-    new_width = math.ceil(original_width / 2)
-    downsampled = np.zeros((new_height, new_width), dtype=np.uint8)
-    for r in range(new_height):
-        for c in range(new_width):
-            block = channel[r*2:min(r*2+2, original_height), c*2:min(c*2+2, original_width)]
-            downsampled[r, c] = int(np.round(np.mean(block.astype(np.float64))))
-    return downsampled
-
-def dpcm_encode_dc(dc_coeffs):
-    dc_coeffs = np.array(dc_coeffs, dtype=np.int32)
-    diffs = np.empty_like(dc_coeffs)
-    diffs[0] = dc_coeffs[0]
-    for i in range(1, len(dc_coeffs)):
-        diffs[i] = dc_coeffs[i] - dc_coeffs[i-1]
-    return diffs.tolist()
-
-
-from huffman_tables import DEFAULT_DC_LUMINANCE_BITS, DEFAULT_DC_LUMINANCE_HUFFVAL
-from huffman_tables import DEFAULT_AC_LUMINANCE_BITS, DEFAULT_AC_LUMINANCE_HUFFVAL
-from huffman_tables import DEFAULT_DC_CHROMINANCE_BITS, DEFAULT_DC_CHROMINANCE_HUFFVAL
-from huffman_tables import DEFAULT_AC_CHROMINANCE_BITS, DEFAULT_AC_CHROMINANCE_HUFFVAL
-
-def compress_image(image_path, output_path, quality=75, block_size=8):
-    print(f"Compressing {image_path} with quality {quality}...")
-    try:
-        img = Image.open(image_path)
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        img_rgb = np.array(img)
-    except Exception as e:
-        print(f"Error opening image {image_path}: {e}")
-        return
-
-    height, width, _ = img_rgb.shape
-
-    
-    ycbcr = rgb_to_ycbcr(img_rgb)
-    y = ycbcr[:, :, 0]
-    cb = ycbcr[:, :, 1]
-    cr = ycbcr[:, :, 2]
-
-    
-    cb_ds = downsample_channel_420(cb)
-    cr_ds = downsample_channel_420(cr)
-
-    
-    q_y = adjust_quantization_matrix(BASE_Q_LUMINANCE, quality)
-    q_c = adjust_quantization_matrix(BASE_Q_CHROMINANCE, quality)
-
-    huff_dc_y = HuffmanTable(DEFAULT_DC_LUMINANCE_BITS, DEFAULT_DC_LUMINANCE_HUFFVAL)
-    huff_ac_y = HuffmanTable(DEFAULT_AC_LUMINANCE_BITS, DEFAULT_AC_LUMINANCE_HUFFVAL)
-    huff_dc_c = HuffmanTable(DEFAULT_DC_CHROMINANCE_BITS, DEFAULT_DC_CHROMINANCE_HUFFVAL)
-    huff_ac_c = HuffmanTable(DEFAULT_AC_CHROMINANCE_BITS, DEFAULT_AC_CHROMINANCE_HUFFVAL)
-
-    components = {
-        'Y': (y, q_y, huff_dc_y, huff_ac_y),
-        'Cb': (cb_ds, q_c, huff_dc_c, huff_ac_c),
-        'Cr': (cr_ds, q_c, huff_dc_c, huff_ac_c)
-    }
-
-    compressed_data = {}
-    padded_dims = {}
-    total_blocks = 0
-
-    for comp_name, (channel, q_matrix, dc_table, ac_table) in components.items():
-        
-        blocks = split_into_blocks(channel, block_size, fill_value=128)
-        padded_height = math.ceil(channel.shape[0] / block_size) * block_size
-        padded_width = math.ceil(channel.shape[1] / block_size) * block_size
-        padded_dims[comp_name] = (padded_height, padded_width)
-
-        quantized_blocks = []
-        dc_coeffs = []
-
-        for block in blocks:
-            block_shifted = block.astype(np.float64) - 128.0
-            dct_block = dct_2d_transform(block_shifted)
-            quant_block = quantize(dct_block, q_matrix)
-            quantized_blocks.append(quant_block)
-            dc_coeffs.append(quant_block[0, 0])
-
-        
-        dc_diffs = dpcm_encode_dc(dc_coeffs)
-
-        
-        data_units = []
-        for i, quant_block in enumerate(quantized_blocks):
-            dc_diff = dc_diffs[i]
-            dc_cat, dc_vli = get_vli_category_and_value(dc_diff)
-            ac_coeffs = zigzag_scan(quant_block)[1:]
-            ac_rle = rle_encode_ac_coefficients(ac_coeffs.tolist())
-            data_units.append((dc_cat, dc_vli, ac_rle))
-
-        
-        compressed_bytes = huffman_encode_data(data_units, dc_table, ac_table)
-        compressed_data[comp_name] = compressed_bytes
-        total_blocks += len(blocks)
-        print(f"{comp_name}: {len(blocks)} blocks, compressed size {len(compressed_bytes)} bytes")
-
-    
-    metadata = {
-        "original_width": width,
-        "original_height": height,
-        "block_size": block_size,
-        "quality": quality,
-        "padded_dims_y": padded_dims['Y'],
-        "padded_dims_cb": padded_dims['Cb'],
-        "padded_dims_cr": padded_dims['Cr'],
-        "q_table_y": q_y.tolist(),
-        "q_table_c": q_c.tolist(),
-        "huff_dc_y_bits": huff_dc_y.bits,
-        "huff_dc_y_huffval": huff_dc_y.huffval,
-        "huff_ac_y_bits": huff_ac_y.bits,
-        "huff_ac_y_huffval": huff_ac_y.huffval,
-        "huff_dc_c_bits": huff_dc_c.bits,
-        "huff_dc_c_huffval": huff_dc_c.huffval,
-        "huff_ac_c_bits": huff_ac_c.bits,
-        "huff_ac_c_huffval": huff_ac_c.huffval,
-        "data_len_y": len(compressed_data['Y']),
-        "data_len_cb": len(compressed_data['Cb']),
-        "data_len_cr": len(compressed_data['Cr']),
-    }
-
-    
-    output_dir = os.path.dirname(output_path)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    
-    try:
-        with open(output_path, 'wb') as f:
-            f.write(b'MYJPEG')
-            header_bytes = json.dumps(metadata).encode('utf-8')
-            f.write(len(header_bytes).to_bytes(4, 'big'))
-            f.write(header_bytes)
-            f.write(compressed_data['Y'])
-            f.write(compressed_data['Cb'])
-            f.write(compressed_data['Cr'])
-    except Exception as e:
-        print(f"Error writing to output file {output_path}: {e}")
-        return
-
-    print(f"Compression complete. Output saved to {output_path}")
+import numpy as np
+from PIL import Image
+from container import write_container, COMPONENT_NAMES
+from jfif import encode_jfif, mcu_layout, pad_plane, JFIF_BLOCK_SIZE
+from color_conversion import rgb_to_ycbcr_into
+from subsampling import downsample_channel, get_subsampling_factors
+from block_processing import block_view
+from dct import dct_2d_transform_batch, fdct_aan_batch
+from quantization import adjust_quantization_matrix, quantize, quantize_aan, BASE_Q_LUMINANCE, BASE_Q_CHROMINANCE
+from zigzag import zigzag_scan_blocks
+from rle import rle_encode_blocks
+from huffman_coding import HuffmanTable, huffman_encode_symbols, build_optimized_table, symbol_frequencies
+from row_index import block_row_index
+from restart_intervals import dpcm_encode_intervals, huffman_encode_intervals, validate_restart_interval
+from progressive import expand_scan_script, encode_scan
+import io
+import os
+
+GRAYSCALE_MODES = ('1', 'L', 'LA')
+
+def downsample_channel_420(channel):
+    return downsample_channel(channel, '4:2:0')
+
+def dpcm_encode_dc(dc_coeffs, restart_interval=0):
+    return dpcm_encode_intervals(dc_coeffs, restart_interval)
+
+def transform_channel_blocks(channel, block_size, dct_method='float'):
+    blocks = block_view(channel, block_size, fill_value=128)
+    block_rows, block_cols = blocks.shape[:2]
+    num_blocks = block_rows * block_cols
+
+    if dct_method == 'fast':
+        block_array = blocks.reshape(num_blocks, block_size, block_size).astype(np.uint8, copy=False)
+        return fdct_aan_batch(block_array), (block_rows, block_cols)
+
+    block_array = blocks.astype(np.float64).reshape(num_blocks, block_size, block_size)
+    block_array -= 128.0
+    return dct_2d_transform_batch(block_array), (block_rows, block_cols)
+
+def quantize_transformed_blocks(dct_blocks, q_matrix, dct_method='float'):
+    if dct_method == 'fast':
+        return zigzag_scan_blocks(quantize_aan(dct_blocks, q_matrix))
+    return zigzag_scan_blocks(quantize(dct_blocks, q_matrix))
+
+def quantize_channel_blocks(channel, q_matrix, block_size, dct_method='float'):
+    dct_blocks, block_grid = transform_channel_blocks(channel, block_size, dct_method)
+    return quantize_transformed_blocks(dct_blocks, q_matrix, dct_method), block_grid
+
+def build_zigzag_blocks(channel, q_matrix, block_size, restart_interval=0):
+    zigzag_blocks, (block_rows, block_cols) = quantize_channel_blocks(channel, q_matrix, block_size)
+    zigzag_blocks[:, 0] = dpcm_encode_dc(zigzag_blocks[:, 0], restart_interval)
+    return zigzag_blocks, (block_rows * block_size, block_cols * block_size)
+
+from huffman_tables import DEFAULT_DC_LUMINANCE_BITS, DEFAULT_DC_LUMINANCE_HUFFVAL
+from huffman_tables import DEFAULT_AC_LUMINANCE_BITS, DEFAULT_AC_LUMINANCE_HUFFVAL
+from huffman_tables import DEFAULT_DC_CHROMINANCE_BITS, DEFAULT_DC_CHROMINANCE_HUFFVAL
+from huffman_tables import DEFAULT_AC_CHROMINANCE_BITS, DEFAULT_AC_CHROMINANCE_HUFFVAL
+
+def select_huffman_tables(frequencies=None):
+    if frequencies is None:
+        huff_dc_y = HuffmanTable(DEFAULT_DC_LUMINANCE_BITS, DEFAULT_DC_LUMINANCE_HUFFVAL)
+        huff_ac_y = HuffmanTable(DEFAULT_AC_LUMINANCE_BITS, DEFAULT_AC_LUMINANCE_HUFFVAL)
+        huff_dc_c = HuffmanTable(DEFAULT_DC_CHROMINANCE_BITS, DEFAULT_DC_CHROMINANCE_HUFFVAL)
+        huff_ac_c = HuffmanTable(DEFAULT_AC_CHROMINANCE_BITS, DEFAULT_AC_CHROMINANCE_HUFFVAL)
+    else:
+        huff_dc_y = build_optimized_table(frequencies['Y'][0])
+        huff_ac_y = build_optimized_table(frequencies['Y'][1])
+        if 'Cb' not in frequencies:
+            return {'Y': (huff_dc_y, huff_ac_y)}
+        huff_dc_c = build_optimized_table(frequencies['Cb'][0] + frequencies['Cr'][0])
+        huff_ac_c = build_optimized_table(frequencies['Cb'][1] + frequencies['Cr'][1])
+
+    return {
+        'Y': (huff_dc_y, huff_ac_y),
+        'Cb': (huff_dc_c, huff_ac_c),
+        'Cr': (huff_dc_c, huff_ac_c)
+    }
+
+def component_huffman_tables(component_symbols, optimize_huffman=False):
+    frequencies = None
+    if optimize_huffman:
+        frequencies = {comp_name: symbol_frequencies(symbols[0], symbols[3])
+                       for comp_name, symbols in component_symbols.items()}
+    return select_huffman_tables(frequencies)
+
+def entropy_code_components(zigzag_components, optimize_huffman=False, restart_interval=0, verbose=True):
+    component_symbols = {comp_name: rle_encode_blocks(zigzag_blocks)
+                         for comp_name, zigzag_blocks in zigzag_components.items()}
+    huffman_tables = component_huffman_tables(component_symbols, optimize_huffman)
+
+    compressed_data = {}
+    restart_offsets = {}
+    for comp_name, symbols in component_symbols.items():
+        dc_table, ac_table = huffman_tables[comp_name]
+        if restart_interval:
+            compressed_bytes, restart_offsets[comp_name] = huffman_encode_intervals(
+                *symbols, dc_table, ac_table, restart_interval)
+        else:
+            compressed_bytes = huffman_encode_symbols(*symbols, dc_table, ac_table)
+        compressed_data[comp_name] = compressed_bytes
+        if verbose:
+            num_blocks = int(np.count_nonzero(symbols[3]))
+            print(f"{comp_name}: {num_blocks} blocks, compressed size {len(compressed_bytes)} bytes")
+    return compressed_data, restart_offsets, huffman_tables
+
+def entropy_code_scans(zigzag_components, progressive=True, block_size=8, verbose=True):
+    scans = []
+    payloads = []
+    for comp_name, ss, se, ah, al in expand_scan_script(progressive, list(zigzag_components), block_size * block_size):
+        table, data = encode_scan(zigzag_components[comp_name], ss, se, ah, al)
+        scan = {'component': comp_name, 'ss': ss, 'se': se, 'ah': ah, 'al': al, 'data_len': len(data)}
+        if table is not None:
+            scan['huff_bits'], scan['huff_huffval'] = table.bits, table.huffval
+        scans.append(scan)
+        payloads.append(data)
+        if verbose:
+            print(f"{comp_name} scan {ss}-{se} Ah={ah} Al={al}: compressed size {len(data)} bytes")
+    return scans, payloads
+
+def myjpeg_metadata(width, height, quality, block_size, subsampling, q_y, q_c, padded_dims, huffman_tables,
+                    data_lengths, restart_interval=0, restart_offsets=None, row_index=None, scans=None):
+    grayscale = 'Cb' not in padded_dims
+
+    
+    metadata = {
+        "original_width": width,
+        "original_height": height,
+        "block_size": block_size,
+        "quality": quality,
+        "subsampling": '4:4:4' if grayscale else subsampling,
+        "q_table_y": q_y.tolist(),
+    }
+    if not grayscale:
+        metadata["q_table_c"] = q_c.tolist()
+    # Progressive files carry a Huffman table per scan instead
+    for name, comp_name in (('y', 'Y'), ('c', 'Cb')):
+        if comp_name in huffman_tables:
+            huff_dc, huff_ac = huffman_tables[comp_name]
+            metadata.update({
+                f"huff_dc_{name}_bits": huff_dc.bits,
+                f"huff_dc_{name}_huffval": huff_dc.huffval,
+                f"huff_ac_{name}_bits": huff_ac.bits,
+                f"huff_ac_{name}_huffval": huff_ac.huffval,
+            })
+    for comp_name in padded_dims:
+        key = comp_name.lower()
+        metadata[f"padded_dims_{key}"] = padded_dims[comp_name]
+        metadata[f"data_len_{key}"] = data_lengths[comp_name]
+        if restart_interval:
+            metadata[f"restart_offsets_{key}"] = restart_offsets[comp_name]
+        if row_index:
+            metadata[f"row_index_{key}"] = row_index[comp_name]
+    if restart_interval:
+        metadata["restart_interval"] = restart_interval
+    if scans:
+        metadata["scans"] = scans
+    return metadata
+
+def pack_myjpeg(width, height, quality, block_size, subsampling, q_y, q_c, padded_dims, huffman_tables,
+                compressed_data, restart_interval=0, restart_offsets=None, row_index=None, scans=None):
+    if scans:
+        # compressed_data holds one payload per scan, in scan order
+        payloads = compressed_data
+        data_lengths = {comp_name: sum(scan['data_len'] for scan in scans if scan['component'] == comp_name)
+                        for comp_name in padded_dims}
+    else:
+        payloads = [compressed_data[name] for name in COMPONENT_NAMES if name in compressed_data]
+        data_lengths = {comp_name: len(data) for comp_name, data in compressed_data.items()}
+    metadata = myjpeg_metadata(width, height, quality, block_size, subsampling, q_y, q_c, padded_dims,
+                               huffman_tables, data_lengths, restart_interval, restart_offsets, row_index, scans)
+    output = io.BytesIO()
+    write_container(output, metadata, payloads)
+    return output.getvalue()
+
+def transform_components(y, chroma_planes, block_size=8, dct_method='float'):
+    return {comp_name: transform_channel_blocks(plane, block_size, dct_method)
+            for comp_name, plane in zip(COMPONENT_NAMES, [y] + list(chroma_planes))}
+
+def quantize_components(coefficients, q_y, q_c, block_size=8, dct_method='float'):
+    q_tables = {'Y': q_y, 'Cb': q_c, 'Cr': q_c}
+    zigzag_components = {}
+    padded_dims = {}
+    for comp_name, (dct_blocks, (block_rows, block_cols)) in coefficients.items():
+        zigzag_components[comp_name] = quantize_transformed_blocks(dct_blocks, q_tables[comp_name], dct_method)
+        padded_dims[comp_name] = (block_rows * block_size, block_cols * block_size)
+    return zigzag_components, padded_dims
+
+def build_row_index(zigzag_components, compressed_data, huffman_tables, padded_dims, block_size, restart_interval=0,
+                    restart_offsets=None):
+    row_index = {}
+    for comp_name, zigzag_blocks in zigzag_components.items():
+        dc_table, ac_table = huffman_tables[comp_name]
+        blocks_per_row = padded_dims[comp_name][1] // block_size
+        row_index[comp_name] = block_row_index(compressed_data[comp_name], zigzag_blocks, dc_table, ac_table,
+                                               blocks_per_row, restart_interval,
+                                               restart_offsets.get(comp_name) if restart_offsets else None)
+    return row_index
+
+def encode_myjpeg_coefficients(coefficients, width, height, q_y, q_c, quality, block_size=8, subsampling='4:2:0',
+                               optimize_huffman=False, restart_interval=0, verbose=True, row_index=False,
+                               dct_method='float', progressive=False):
+    zigzag_components, padded_dims = quantize_components(coefficients, q_y, q_c, block_size, dct_method)
+    if not progressive:
+        for zigzag_blocks in zigzag_components.values():
+            zigzag_blocks[:, 0] = dpcm_encode_dc(zigzag_blocks[:, 0], restart_interval)
+
+    if progressive:
+        scans, payloads = entropy_code_scans(zigzag_components, progressive, block_size, verbose)
+        return pack_myjpeg(width, height, quality, block_size, subsampling, q_y, q_c, padded_dims, {}, payloads,
+                           scans=scans)
+
+    compressed_data, restart_offsets, huffman_tables = entropy_code_components(
+        zigzag_components, optimize_huffman, restart_interval, verbose)
+    row_positions = None
+    if row_index:
+        row_positions = build_row_index(zigzag_components, compressed_data, huffman_tables, padded_dims, block_size,
+                                        restart_interval, restart_offsets)
+    return pack_myjpeg(width, height, quality, block_size, subsampling, q_y, q_c, padded_dims, huffman_tables,
+                       compressed_data, restart_interval, restart_offsets, row_positions)
+
+def encode_myjpeg(y, chroma_planes, q_y, q_c, quality, block_size=8, subsampling='4:2:0', optimize_huffman=False,
+                  restart_interval=0, workers=1, row_index=False, verbose=True, dct_method='float', progressive=False):
+    height, width = y.shape
+    # Progressive scans are entropy coded in-process
+    if workers <= 1 or progressive:
+        coefficients = transform_components(y, chroma_planes, block_size, dct_method)
+        return encode_myjpeg_coefficients(coefficients, width, height, q_y, q_c, quality, block_size, subsampling,
+                                          optimize_huffman, restart_interval, verbose, row_index, dct_method,
+                                          progressive)
+
+    from parallel_encoder import ParallelComponentEncoder
+    components = {comp_name: (plane, q_matrix)
+                  for comp_name, plane, q_matrix in zip(COMPONENT_NAMES, [y] + list(chroma_planes), (q_y, q_c, q_c))}
+    with ParallelComponentEncoder(components, block_size, restart_interval, workers, dct_method) as encoder:
+        padded_dims = encoder.padded_dims
+        frequencies = encoder.symbol_frequencies() if optimize_huffman else None
+        huffman_tables = select_huffman_tables(frequencies)
+        compressed_data, restart_offsets = encoder.encode(huffman_tables)
+        row_positions = None
+        if row_index:
+            row_positions = build_row_index(encoder.zigzag_components(), compressed_data, huffman_tables,
+                                            padded_dims, block_size, restart_interval, restart_offsets)
+    if verbose:
+        for comp_name, (padded_h, padded_w) in padded_dims.items():
+            num_blocks = (padded_h // block_size) * (padded_w // block_size)
+            print(f"{comp_name}: {num_blocks} blocks, compressed size {len(compressed_data[comp_name])} bytes")
+    return pack_myjpeg(width, height, quality, block_size, subsampling, q_y, q_c, padded_dims, huffman_tables,
+                       compressed_data, restart_interval, restart_offsets, row_positions)
+
+def encode_jfif_planes(y, chroma_planes, q_y, q_c, subsampling='4:2:0', optimize_huffman=False, restart_interval=0,
+                       workers=1, verbose=True, dct_method='float'):
+    height, width = y.shape
+    mcu_rows, mcu_cols, sampling = mcu_layout(height, width, subsampling, 1 + len(chroma_planes))
+    component_blocks = []
+    for plane, (h, v), q_matrix in zip([y] + list(chroma_planes), sampling, [q_y, q_c, q_c]):
+        padded = pad_plane(plane, mcu_rows * JFIF_BLOCK_SIZE * v, mcu_cols * JFIF_BLOCK_SIZE * h)
+        zigzag_blocks, _ = quantize_channel_blocks(padded, q_matrix, JFIF_BLOCK_SIZE, dct_method)
+        component_blocks.append(zigzag_blocks)
+    jfif_bytes = encode_jfif(width, height, component_blocks, [q_y, q_c], subsampling, optimize_huffman,
+                             restart_interval, workers)
+    if verbose:
+        print(f"JFIF: {sum(len(blocks) for blocks in component_blocks)} blocks, compressed size {len(jfif_bytes)} bytes")
+    return jfif_bytes
+
+def image_to_array(image):
+    if isinstance(image, Image.Image):
+        if image.mode in GRAYSCALE_MODES:
+            return np.asarray(image if image.mode == 'L' else image.convert('L'))
+        return np.asarray(image if image.mode == 'RGB' else image.convert('RGB'))
+    if not isinstance(image, np.ndarray):
+        raise TypeError("Image must be a PIL image or a numpy array.")
+    if image.ndim not in (2, 3) or (image.ndim == 3 and image.shape[2] != 3):
+        raise ValueError("Input array must have shape (H, W) or (H, W, 3).")
+    if image.dtype != np.uint8:
+        raise TypeError("Input array must have dtype uint8.")
+    return image
+
+def image_to_rgb(image):
+    image = image_to_array(image)
+    if image.ndim == 2:
+        return np.repeat(image[:, :, np.newaxis], 3, axis=2)
+    return image
+
+def rgb_to_ycbcr_planes(img_rgb, subsampling='4:2:0'):
+    y, cb, cr = (np.empty(img_rgb.shape[:2], dtype=np.uint8) for _ in range(3))
+    rgb_to_ycbcr_into(img_rgb, y, cb, cr)
+
+    
+    cb_ds = downsample_channel(cb, subsampling)
+    cr_ds = downsample_channel(cr, subsampling)
+    return y, [cb_ds, cr_ds]
+
+def image_to_ycbcr_planes(image, subsampling='4:2:0'):
+    pixels = image_to_array(image)
+    # Grayscale sources are coded as a lone Y component
+    if pixels.ndim == 2:
+        return pixels, []
+    return rgb_to_ycbcr_planes(pixels, subsampling)
+
+def load_ycbcr_planes(image_path, subsampling='4:2:0'):
+    return image_to_ycbcr_planes(Image.open(image_path), subsampling)
+
+def compress_image(image_path, output_path, quality=75, block_size=8, subsampling='4:2:0', optimize_huffman=False,
+                   output_format='myjpeg', restart_interval=0, workers=1, row_index=False, dct_method='float',
+                   progressive=False, target_bytes=None, target_psnr=None):
+    from jpeg_codec import jpeg_compress
+    if target_bytes is not None:
+        print(f"Compressing {image_path} to at most {target_bytes} bytes...")
+    elif target_psnr is not None:
+        print(f"Compressing {image_path} to at least {target_psnr}dB PSNR...")
+    else:
+        print(f"Compressing {image_path} with quality {quality}...")
+    try:
+        img = Image.open(image_path)
+        img.load()
+    except Exception as e:
+        print(f"Error opening image {image_path}: {e}")
+        return
+
+    output_bytes = jpeg_compress(img, quality, block_size, subsampling, optimize_huffman, output_format,
+                                 restart_interval, workers, row_index, verbose=True, dct_method=dct_method,
+                                 progressive=progressive, target_bytes=target_bytes, target_psnr=target_psnr)
+
+    
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    
+    try:
+        with open(output_path, 'wb') as f:
+            f.write(output_bytes)
+    except Exception as e:
+        print(f"Error writing to output file {output_path}: {e}")
+        return
+
+    print(f"Compression complete. Output saved to {output_path}")
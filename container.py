@@ -0,0 +1,224 @@
+import json
+import struct
+from huffman_tables import DEFAULT_HUFFMAN_TABLES
+
+MAGIC = b'MYJPEG'
+FORMAT_VERSION = 1
+
+SUBSAMPLING_CODES = {'4:4:4': 0, '4:2:2': 1, '4:2:0': 2}
+SUBSAMPLING_MODES = {code: mode for mode, code in SUBSAMPLING_CODES.items()}
+
+COMPONENT_NAMES = ('Y', 'Cb', 'Cr')
+QUANT_TABLE_NAMES = ('y', 'c')
+HUFFMAN_TABLE_NAMES = ('dc_y', 'ac_y', 'dc_c', 'ac_c')
+COMPONENT_TABLES = {
+    'Y': (0, 0, 1),
+    'Cb': (1, 2, 3),
+    'Cr': (1, 2, 3),
+}
+
+DEFAULT_TABLE_FLAG = 0x80
+
+_IMAGE_FIELDS = struct.Struct('>BIIBBBB')
+_COMPONENT_FIELDS = struct.Struct('>BIIBBBI')
+_EXTENSION_FIELDS = struct.Struct('>BI')
+_SCAN_FIELDS = struct.Struct('>BHHBBI')
+
+# tag -> (metadata key, pack(value) -> bytes, unpack(bytes) -> value)
+EXTENSIONS = {}
+
+def _pack_u32_list(values):
+    return struct.pack(f'>{len(values)}I', *values)
+
+def _unpack_u32_list(payload):
+    return list(struct.unpack(f'>{len(payload) // 4}I', payload))
+
+def _pack_row_index(rows):
+    return b''.join(struct.pack('>Ii', position, predictor) for position, predictor in rows)
+
+def _unpack_row_index(payload):
+    return [list(row) for row in struct.iter_unpack('>Ii', payload)]
+
+EXTENSIONS[1] = ('restart_interval', lambda value: struct.pack('>H', value), lambda payload: struct.unpack('>H', payload)[0])
+for _index, _name in enumerate(COMPONENT_NAMES):
+    EXTENSIONS[2 + _index] = (f"restart_offsets_{_name.lower()}", _pack_u32_list, _unpack_u32_list)
+    EXTENSIONS[5 + _index] = (f"row_index_{_name.lower()}", _pack_row_index, _unpack_row_index)
+
+def present_components(metadata):
+    return [name for name in COMPONENT_NAMES if f"data_len_{name.lower()}" in metadata]
+
+def component_table_names(metadata, comp_name):
+    # JSON headers predate the per-component table ids and always used the fixed assignment
+    quant_id, dc_id, ac_id = metadata.get(f"table_ids_{comp_name.lower()}", COMPONENT_TABLES[comp_name])
+    return QUANT_TABLE_NAMES[quant_id], HUFFMAN_TABLE_NAMES[dc_id], HUFFMAN_TABLE_NAMES[ac_id]
+
+def _pack_huffman_table(bits, huffval):
+    bits = list(bits)
+    huffval = list(huffval)
+    for table_id, (default_bits, default_huffval) in enumerate(DEFAULT_HUFFMAN_TABLES):
+        if bits == default_bits and huffval == default_huffval:
+            return bytes([DEFAULT_TABLE_FLAG | table_id])
+    if len(bits) != 16 or sum(bits) != len(huffval):
+        raise ValueError("Huffman table must have 16 BITS counts matching the number of HUFFVAL symbols.")
+    return bytes([0]) + bytes(bits) + bytes(huffval)
+
+def _unpack_huffman_table(header_bytes, offset):
+    flag = header_bytes[offset]
+    offset += 1
+    if flag & DEFAULT_TABLE_FLAG:
+        table_id = flag & ~DEFAULT_TABLE_FLAG
+        if table_id >= len(DEFAULT_HUFFMAN_TABLES):
+            raise ValueError(f"Unknown default Huffman table id {table_id}")
+        bits, huffval = DEFAULT_HUFFMAN_TABLES[table_id]
+        return list(bits), list(huffval), offset
+    bits = list(header_bytes[offset:offset + 16])
+    offset += 16
+    num_values = sum(bits)
+    huffval = list(header_bytes[offset:offset + num_values])
+    return bits, huffval, offset + num_values
+
+def scan_has_table(ss, ah):
+    # DC refinement scans are raw bits; every other scan carries its own Huffman table
+    return ss > 0 or ah == 0
+
+def _pack_scans(scans):
+    payload = bytearray()
+    for scan in scans:
+        payload += _SCAN_FIELDS.pack(COMPONENT_NAMES.index(scan['component']), scan['ss'], scan['se'], scan['ah'],
+                                     scan['al'], scan['data_len'])
+        if scan_has_table(scan['ss'], scan['ah']):
+            payload += _pack_huffman_table(scan['huff_bits'], scan['huff_huffval'])
+    return bytes(payload)
+
+def _unpack_scans(payload):
+    scans = []
+    offset = 0
+    while offset < len(payload):
+        component_id, ss, se, ah, al, data_len = _SCAN_FIELDS.unpack_from(payload, offset)
+        offset += _SCAN_FIELDS.size
+        scan = {'component': COMPONENT_NAMES[component_id], 'ss': ss, 'se': se, 'ah': ah, 'al': al,
+                'data_len': data_len}
+        if scan_has_table(ss, ah):
+            scan['huff_bits'], scan['huff_huffval'], offset = _unpack_huffman_table(payload, offset)
+        scans.append(scan)
+    return scans
+
+EXTENSIONS[8] = ('scans', _pack_scans, _unpack_scans)
+
+def pack_header(metadata):
+    components = present_components(metadata)
+    header = bytearray(_IMAGE_FIELDS.pack(
+        FORMAT_VERSION,
+        metadata['original_width'],
+        metadata['original_height'],
+        metadata['block_size'],
+        metadata['quality'],
+        SUBSAMPLING_CODES[metadata.get('subsampling', '4:2:0')],
+        len(components),
+    ))
+
+    for name in components:
+        key = name.lower()
+        padded_height, padded_width = metadata[f"padded_dims_{key}"]
+        quant_id, dc_id, ac_id = metadata.get(f"table_ids_{key}", COMPONENT_TABLES[name])
+        header += _COMPONENT_FIELDS.pack(COMPONENT_NAMES.index(name), padded_height, padded_width,
+                                         quant_id, dc_id, ac_id, metadata[f"data_len_{key}"])
+
+    quant_tables = [name for name in QUANT_TABLE_NAMES if f"q_table_{name}" in metadata]
+    header.append(len(quant_tables))
+    for name in quant_tables:
+        rows = metadata[f"q_table_{name}"]
+        header.append(len(rows))
+        header += bytes(value for row in rows for value in row)
+
+    huffman_tables = [name for name in HUFFMAN_TABLE_NAMES if f"huff_{name}_bits" in metadata]
+    header.append(len(huffman_tables))
+    for name in huffman_tables:
+        header += _pack_huffman_table(metadata[f"huff_{name}_bits"], metadata[f"huff_{name}_huffval"])
+
+    for tag, (key, pack, _) in EXTENSIONS.items():
+        if metadata.get(key) is not None:
+            payload = pack(metadata[key])
+            header += _EXTENSION_FIELDS.pack(tag, len(payload)) + payload
+
+    return bytes(header)
+
+def unpack_header(header_bytes):
+    if header_bytes[:1] == b'{':
+        return json.loads(bytes(header_bytes).decode('utf-8'))
+
+    version, width, height, block_size, quality, subsampling_code, num_components = \
+        _IMAGE_FIELDS.unpack_from(header_bytes, 0)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported container version {version}")
+    offset = _IMAGE_FIELDS.size
+
+    metadata = {
+        "original_width": width,
+        "original_height": height,
+        "block_size": block_size,
+        "quality": quality,
+        "subsampling": SUBSAMPLING_MODES[subsampling_code],
+    }
+
+    for _ in range(num_components):
+        component_id, padded_height, padded_width, quant_id, dc_id, ac_id, data_len = \
+            _COMPONENT_FIELDS.unpack_from(header_bytes, offset)
+        offset += _COMPONENT_FIELDS.size
+        key = COMPONENT_NAMES[component_id].lower()
+        metadata[f"padded_dims_{key}"] = [padded_height, padded_width]
+        metadata[f"data_len_{key}"] = data_len
+        metadata[f"table_ids_{key}"] = [quant_id, dc_id, ac_id]
+
+    num_quant_tables = header_bytes[offset]
+    offset += 1
+    for name in QUANT_TABLE_NAMES[:num_quant_tables]:
+        size = header_bytes[offset]
+        offset += 1
+        values = list(header_bytes[offset:offset + size * size])
+        offset += size * size
+        metadata[f"q_table_{name}"] = [values[row * size:(row + 1) * size] for row in range(size)]
+
+    num_huffman_tables = header_bytes[offset]
+    offset += 1
+    for name in HUFFMAN_TABLE_NAMES[:num_huffman_tables]:
+        bits, huffval, offset = _unpack_huffman_table(header_bytes, offset)
+        metadata[f"huff_{name}_bits"] = bits
+        metadata[f"huff_{name}_huffval"] = huffval
+
+    while offset < len(header_bytes):
+        tag, length = _EXTENSION_FIELDS.unpack_from(header_bytes, offset)
+        offset += _EXTENSION_FIELDS.size
+        if tag in EXTENSIONS:
+            key, _, unpack = EXTENSIONS[tag]
+            metadata[key] = unpack(bytes(header_bytes[offset:offset + length]))
+        offset += length
+
+    return metadata
+
+def write_header(f, metadata):
+    header_bytes = pack_header(metadata)
+    f.write(MAGIC)
+    f.write(len(header_bytes).to_bytes(4, 'big'))
+    f.write(header_bytes)
+    return len(MAGIC) + 4 + len(header_bytes)
+
+def write_container(f, metadata, payloads):
+    write_header(f, metadata)
+    for payload in payloads:
+        f.write(payload)
+
+def parse_header(data):
+    data = memoryview(data).cast('B')
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Invalid file format")
+    header_start = len(MAGIC) + 4
+    header_end = header_start + int.from_bytes(data[len(MAGIC):header_start], 'big')
+    return unpack_header(data[header_start:header_end]), header_end
+
+def read_header(f):
+    magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        raise ValueError("Invalid file format")
+    header_len = int.from_bytes(f.read(4), 'big')
+    return unpack_header(f.read(header_len))
@@ -1,43 +1,255 @@
-import numpy as np
-
-def _get_C_factor(k):
-    return 1.0 / np.sqrt(2.0) if k == 0 else 1.0
-
-def _create_dct_1d_matrix(N):
-    T = np.zeros((N, N), dtype=np.float64)
-    for k in range(N):
-        for n in range(N):
-            T[k, n] = np.cos((2 * n + 1) * k * np.pi / (2 * N))
-    return T
-
-def dct_2d_transform(block):
-    N = block.shape[0]
-    if block.shape[1] != N:
-        raise ValueError("Input block must be square.")
-    if block.dtype == np.uint8:
-        block = block.astype(np.float64) - 128.0
-    else:
-        block = block.astype(np.float64)
-
-    T = _create_dct_1d_matrix(N)
-    dct_intermediate = T @ block @ T.T
-
-    C = np.array([_get_C_factor(k) for k in range(N)], dtype=np.float64)
-    C_matrix = np.outer(C, C)
-
-    dct_coeffs = 0.25 * C_matrix * dct_intermediate
-    return dct_coeffs
-
-def idct_2d_transform(dct_coeffs):
-    N = dct_coeffs.shape[0]
-    if dct_coeffs.shape[1] != N:
-        raise ValueError("Input block must be square.")
-
-    T = _create_dct_1d_matrix(N)
-    C = np.array([_get_C_factor(k) for k in range(N)], dtype=np.float64)
-    C_matrix = np.outer(C, C)
-
-    S_prime = C_matrix * dct_coeffs
-
-    block = 0.25 * (T.T @ S_prime @ T)
-    return block
+import numpy as np
+from functools import lru_cache
+
+def _get_C_factor(k):
+    return 1.0 / np.sqrt(2.0) if k == 0 else 1.0
+
+@lru_cache(maxsize=None)
+def _create_dct_1d_matrix(N):
+    k = np.arange(N, dtype=np.float64).reshape(-1, 1)
+    n = np.arange(N, dtype=np.float64).reshape(1, -1)
+    T = np.cos((2 * n + 1) * k * np.pi / (2 * N))
+    T.setflags(write=False)
+    return T
+
+@lru_cache(maxsize=None)
+def _create_C_matrix(N):
+    C = np.array([_get_C_factor(k) for k in range(N)], dtype=np.float64)
+    C_matrix = np.outer(C, C)
+    C_matrix.setflags(write=False)
+    return C_matrix
+
+def dct_2d_transform(block):
+    N = block.shape[0]
+    if block.shape[1] != N:
+        raise ValueError("Input block must be square.")
+    if block.dtype == np.uint8:
+        block = block.astype(np.float64) - 128.0
+    else:
+        block = block.astype(np.float64)
+
+    T = _create_dct_1d_matrix(N)
+    dct_intermediate = T @ block @ T.T
+
+    dct_coeffs = 0.25 * _create_C_matrix(N) * dct_intermediate
+    return dct_coeffs
+
+def idct_2d_transform(dct_coeffs):
+    N = dct_coeffs.shape[0]
+    if dct_coeffs.shape[1] != N:
+        raise ValueError("Input block must be square.")
+
+    T = _create_dct_1d_matrix(N)
+    S_prime = _create_C_matrix(N) * dct_coeffs
+
+    block = 0.25 * (T.T @ S_prime @ T)
+    return block
+
+def idct_2d_low_order_batch(corner_coeffs, block_size):
+    M = _check_block_batch(corner_coeffs)
+    T = _create_dct_1d_matrix(block_size)[:M]
+    S_prime = _create_C_matrix(block_size)[:M, :M] * corner_coeffs
+
+    blocks = np.matmul(np.matmul(T.T, S_prime), T)
+    blocks *= 0.25
+    return blocks
+
+def idct_2d_dc_only(dc_coeffs, block_size):
+    return _create_C_matrix(block_size)[0, 0] * dc_coeffs * 0.25
+
+def _check_block_batch(blocks):
+    if not isinstance(blocks, np.ndarray):
+        raise TypeError("Input must be a numpy array.")
+    if blocks.ndim != 3 or blocks.shape[1] != blocks.shape[2]:
+        raise ValueError("Input must have shape (n_blocks, N, N).")
+    return blocks.shape[1]
+
+def dct_2d_transform_batch(blocks):
+    N = _check_block_batch(blocks)
+    if blocks.dtype == np.uint8:
+        blocks = blocks.astype(np.float64) - 128.0
+    else:
+        blocks = blocks.astype(np.float64, copy=False)
+
+    T = _create_dct_1d_matrix(N)
+    dct_coeffs = np.matmul(np.matmul(T, blocks), T.T)
+    dct_coeffs *= 0.25 * _create_C_matrix(N)
+    return dct_coeffs
+
+def idct_2d_transform_batch(dct_coeffs):
+    N = _check_block_batch(dct_coeffs)
+
+    T = _create_dct_1d_matrix(N)
+    S_prime = _create_C_matrix(N) * dct_coeffs
+
+    blocks = np.matmul(np.matmul(T.T, S_prime), T)
+    blocks *= 0.25
+    return blocks
+
+DCT_METHODS = ('float', 'fast')
+AAN_BLOCK_SIZE = 8
+AAN_CONST_BITS = 8
+AAN_PASS1_BITS = 2
+AAN_CHUNK_BLOCKS = 4096
+
+def _fix(x):
+    return int(round(x * (1 << AAN_CONST_BITS)))
+
+_FIX_0_382683433 = _fix(0.382683433)
+_FIX_0_541196100 = _fix(0.541196100)
+_FIX_0_707106781 = _fix(0.707106781)
+_FIX_1_082392200 = _fix(1.082392200)
+_FIX_1_306562965 = _fix(1.306562965)
+_FIX_1_414213562 = _fix(1.414213562)
+_FIX_1_847759065 = _fix(1.847759065)
+_FIX_2_613125930 = _fix(2.613125930)
+
+def validate_dct_method(dct_method, block_size=AAN_BLOCK_SIZE):
+    if dct_method not in DCT_METHODS:
+        raise ValueError(f"Unsupported DCT method {dct_method!r}. Expected one of {list(DCT_METHODS)}.")
+    if dct_method == 'fast' and block_size != AAN_BLOCK_SIZE:
+        raise ValueError(f"The fast DCT requires block_size={AAN_BLOCK_SIZE}.")
+
+@lru_cache(maxsize=None)
+def aan_scale_factors():
+    factors = np.array([1.0] + [np.cos(k * np.pi / 16) * np.sqrt(2.0) for k in range(1, AAN_BLOCK_SIZE)])
+    scale = np.outer(factors, factors)
+    scale.setflags(write=False)
+    return scale
+
+def _scale(x, constant):
+    x *= constant
+    x += 1 << (AAN_CONST_BITS - 1)
+    x >>= AAN_CONST_BITS
+    return x
+
+def _fdct_aan_pass(x, out):
+    tmp0 = x[0] + x[7]
+    tmp7 = x[0] - x[7]
+    tmp1 = x[1] + x[6]
+    tmp6 = x[1] - x[6]
+    tmp2 = x[2] + x[5]
+    tmp5 = x[2] - x[5]
+    tmp3 = x[3] + x[4]
+    tmp4 = x[3] - x[4]
+
+    # Even part
+    tmp10 = tmp0 + tmp3
+    tmp13 = tmp0 - tmp3
+    tmp11 = tmp1 + tmp2
+    tmp12 = tmp1 - tmp2
+    np.add(tmp10, tmp11, out=out[0])
+    np.subtract(tmp10, tmp11, out=out[4])
+    z1 = _scale(tmp12 + tmp13, _FIX_0_707106781)
+    np.add(tmp13, z1, out=out[2])
+    np.subtract(tmp13, z1, out=out[6])
+
+    # Odd part
+    tmp10 = tmp4 + tmp5
+    tmp11 = tmp5 + tmp6
+    tmp12 = tmp6 + tmp7
+    z5 = _scale(tmp10 - tmp12, _FIX_0_382683433)
+    z2 = _scale(tmp10, _FIX_0_541196100) + z5
+    z4 = _scale(tmp12, _FIX_1_306562965) + z5
+    z3 = _scale(tmp11, _FIX_0_707106781)
+    z11 = tmp7 + z3
+    z13 = tmp7 - z3
+    np.add(z13, z2, out=out[5])
+    np.subtract(z13, z2, out=out[3])
+    np.add(z11, z4, out=out[1])
+    np.subtract(z11, z4, out=out[7])
+
+def _write_idct_aan_outputs(out, tmp0, tmp1, tmp2, tmp3, tmp4, tmp5, tmp6, tmp7):
+    np.add(tmp0, tmp7, out=out[0])
+    np.subtract(tmp0, tmp7, out=out[7])
+    np.add(tmp1, tmp6, out=out[1])
+    np.subtract(tmp1, tmp6, out=out[6])
+    np.add(tmp2, tmp5, out=out[2])
+    np.subtract(tmp2, tmp5, out=out[5])
+    np.add(tmp3, tmp4, out=out[4])
+    np.subtract(tmp3, tmp4, out=out[3])
+
+def _idct_aan_pass(x, out):
+    # Even part
+    tmp10 = x[0] + x[4]
+    tmp11 = x[0] - x[4]
+    tmp13 = x[2] + x[6]
+    tmp12 = _scale(x[2] - x[6], _FIX_1_414213562) - tmp13
+    tmp0 = tmp10 + tmp13
+    tmp3 = tmp10 - tmp13
+    tmp1 = tmp11 + tmp12
+    tmp2 = tmp11 - tmp12
+
+    # Odd part
+    z13 = x[5] + x[3]
+    z10 = x[5] - x[3]
+    z11 = x[1] + x[7]
+    z12 = x[1] - x[7]
+    tmp7 = z11 + z13
+    tmp11 = _scale(z11 - z13, _FIX_1_414213562)
+    z5 = _scale(z10 + z12, _FIX_1_847759065)
+    tmp10 = _scale(z12, _FIX_1_082392200) - z5
+    tmp12 = _scale(z10, -_FIX_2_613125930) + z5
+    tmp6 = tmp12 - tmp7
+    tmp5 = tmp11 - tmp6
+    tmp4 = tmp10 + tmp5
+    _write_idct_aan_outputs(out, tmp0, tmp1, tmp2, tmp3, tmp4, tmp5, tmp6, tmp7)
+
+def _idct_aan_low_order_pass(x, out):
+    # _idct_aan_pass with inputs 4..7 known to be zero; the results are identical
+    tmp12 = _scale(x[2].copy(), _FIX_1_414213562) - x[2]
+    tmp0 = x[0] + x[2]
+    tmp3 = x[0] - x[2]
+    tmp1 = x[0] + tmp12
+    tmp2 = x[0] - tmp12
+
+    odd_difference = x[1] - x[3]
+    tmp7 = x[1] + x[3]
+    tmp11 = _scale(odd_difference.copy(), _FIX_1_414213562)
+    z5 = _scale(odd_difference, _FIX_1_847759065)
+    tmp10 = _scale(x[1].copy(), _FIX_1_082392200) - z5
+    tmp12 = _scale(x[3].copy(), _FIX_2_613125930) + z5
+    tmp6 = tmp12 - tmp7
+    tmp5 = tmp11 - tmp6
+    tmp4 = tmp10 + tmp5
+    _write_idct_aan_outputs(out, tmp0, tmp1, tmp2, tmp3, tmp4, tmp5, tmp6, tmp7)
+
+def _aan_2d_batch(blocks, one_d_pass, offset=0):
+    input_size = _check_block_batch(blocks)
+    result = np.empty((len(blocks), AAN_BLOCK_SIZE, AAN_BLOCK_SIZE), dtype=np.int32)
+    for start in range(0, len(blocks), AAN_CHUNK_BLOCKS):
+        chunk = blocks[start:start + AAN_CHUNK_BLOCKS]
+        # Blocks on the last axis so each butterfly operand is a contiguous row of the chunk
+        planes = chunk.transpose(1, 2, 0).astype(np.int32)
+        if offset:
+            planes += offset
+        columns = np.empty((AAN_BLOCK_SIZE, input_size, len(chunk)), dtype=np.int32)
+        one_d_pass(planes.transpose(1, 0, 2), columns)
+        samples = np.empty((AAN_BLOCK_SIZE, AAN_BLOCK_SIZE, len(chunk)), dtype=np.int32)
+        one_d_pass(columns.transpose(1, 0, 2), samples)
+        result[start:start + AAN_CHUNK_BLOCKS] = samples.transpose(2, 0, 1)
+    return result
+
+def fdct_aan_batch(blocks):
+    if _check_block_batch(blocks) != AAN_BLOCK_SIZE:
+        raise ValueError(f"The fast DCT requires {AAN_BLOCK_SIZE}x{AAN_BLOCK_SIZE} blocks.")
+    return _aan_2d_batch(blocks, _fdct_aan_pass, offset=-128 if blocks.dtype == np.uint8 else 0)
+
+def _descale_aan_samples(samples):
+    samples += 1 << (AAN_PASS1_BITS + 2)
+    samples >>= AAN_PASS1_BITS + 3
+    return samples
+
+def idct_aan_batch(dct_coeffs):
+    size = _check_block_batch(dct_coeffs)
+    if size == AAN_BLOCK_SIZE:
+        one_d_pass = _idct_aan_pass
+    elif size == AAN_BLOCK_SIZE // 2:
+        one_d_pass = _idct_aan_low_order_pass
+    else:
+        raise ValueError(f"The fast IDCT takes {AAN_BLOCK_SIZE}x{AAN_BLOCK_SIZE} blocks or their "
+                         f"{AAN_BLOCK_SIZE // 2}x{AAN_BLOCK_SIZE // 2} low-order corners.")
+    return _descale_aan_samples(_aan_2d_batch(dct_coeffs, one_d_pass))
+
+def idct_aan_dc_only(dc_coeffs):
+    return _descale_aan_samples(np.asarray(dc_coeffs, dtype=np.int32).copy())
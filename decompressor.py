@@ -1,117 +1,186 @@
-import numpy as np
-from PIL import Image
-import json
-import math
-from block_processing import reassemble_from_blocks
-from dct import idct_2d_transform
-from quantization import dequantize
-from zigzag import inverse_zigzag_scan
-from rle import rle_decode_ac_coefficients
-from vli_coding import decode_vli
-from huffman_coding import HuffmanTable, huffman_decode_data
-from color_conversion import ycbcr_to_rgb
-
-def upsample_channel_nearest_neighbor(channel, target_height, target_width):
-    if channel.size == 0:
-        return np.full((target_height, target_width), 128, dtype=np.uint8)
-    upsampled = channel.repeat(2, axis=0).repeat(2, axis=1)
-    return upsampled[:target_height, :target_width]
-
-def dpcm_decode_dc(dc_diffs):
-    dc_diffs = np.array(dc_diffs, dtype=np.int32)
-    dc_coeffs = np.empty_like(dc_diffs)
-    dc_coeffs[0] = dc_diffs[0]
-    for i in range(1, len(dc_diffs)):
-        dc_coeffs[i] = dc_diffs[i] + dc_coeffs[i-1]
-    return dc_coeffs.tolist()
-
-def decompress_image(input_path, output_path):
-    with open(input_path, 'rb') as f:
-        magic = f.read(6)
-        if magic != b'MYJPEG':
-            raise ValueError("Invalid file format")
-        header_len = int.from_bytes(f.read(4), 'big')
-        metadata_bytes = f.read(header_len)
-        metadata = json.loads(metadata_bytes.decode('utf-8'))
-
-        y_len = metadata['data_len_y']
-        cb_len = metadata['data_len_cb']
-        cr_len = metadata['data_len_cr']
-
-        y_data = f.read(y_len)
-        cb_data = f.read(cb_len)
-        cr_data = f.read(cr_len)
-
-    block_size = metadata['block_size']
-    width = metadata['original_width']
-    height = metadata['original_height']
-
-    q_y = np.array(metadata['q_table_y'], dtype=np.uint8)
-    q_c = np.array(metadata['q_table_c'], dtype=np.uint8)
-
-    huff_dc_y = HuffmanTable(metadata['huff_dc_y_bits'], metadata['huff_dc_y_huffval'])
-    huff_ac_y = HuffmanTable(metadata['huff_ac_y_bits'], metadata['huff_ac_y_huffval'])
-    huff_dc_c = HuffmanTable(metadata['huff_dc_c_bits'], metadata['huff_dc_c_huffval'])
-    huff_ac_c = HuffmanTable(metadata['huff_ac_c_bits'], metadata['huff_ac_c_huffval'])
-
-    padded_dims = {
-        'Y': tuple(metadata['padded_dims_y']),
-        'Cb': tuple(metadata['padded_dims_cb']),
-        'Cr': tuple(metadata['padded_dims_cr'])
-    }
-
-    components = {
-        'Y': (y_data, huff_dc_y, huff_ac_y, q_y, padded_dims['Y']),
-        'Cb': (cb_data, huff_dc_c, huff_ac_c, q_c, padded_dims['Cb']),
-        'Cr': (cr_data, huff_dc_c, huff_ac_c, q_c, padded_dims['Cr'])
-    }
-
-    reconstructed_channels = {}
-
-    for comp_name, (comp_data, dc_table, ac_table, q_matrix, (padded_h, padded_w)) in components.items():
-        num_blocks = (padded_h // block_size) * (padded_w // block_size)
-        decoded_units = huffman_decode_data(comp_data, dc_table, ac_table, num_blocks)
-
-        dc_diffs = []
-        quantized_blocks = []
-
-        for dc_cat, dc_vli_bits, ac_rle in decoded_units:
-            dc_diff = decode_vli(dc_cat, dc_vli_bits)
-            dc_diffs.append(dc_diff)
-            ac_coeffs = rle_decode_ac_coefficients(ac_rle, num_ac_coeffs=block_size*block_size - 1)
-            zigzag_array = np.array([dc_diff] + ac_coeffs, dtype=np.int32)
-            block = inverse_zigzag_scan(zigzag_array, block_size)
-            quantized_blocks.append(block)
-
-        dc_coeffs = dpcm_decode_dc(dc_diffs)
-
-        final_blocks = []
-        for i, quant_block in enumerate(quantized_blocks):
-            quant_block[0, 0] = dc_coeffs[i]
-            dequant_block = dequantize(quant_block, q_matrix)
-            idct_block = idct_2d_transform(dequant_block)
-            idct_block_shifted = idct_block + 128.0
-            idct_block_clipped = np.clip(idct_block_shifted, 0, 255).astype(np.uint8)
-            final_blocks.append(idct_block_clipped)
-
-        reassembled = reassemble_from_blocks(final_blocks, padded_h, padded_w)
-
-        
-        if comp_name == 'Y':
-            final = reassembled[:height, :width]
-        else:
-            final = reassembled[:math.ceil(height/2), :math.ceil(width/2)]
-
-        reconstructed_channels[comp_name] = final
-
-    
-    y_channel = reconstructed_channels['Y']
-    cb_upsampled = upsample_channel_nearest_neighbor(reconstructed_channels['Cb'], y_channel.shape[0], y_channel.shape[1])
-    cr_upsampled = upsample_channel_nearest_neighbor(reconstructed_channels['Cr'], y_channel.shape[0], y_channel.shape[1])
-
-    ycbcr_image = np.stack((y_channel, cb_upsampled, cr_upsampled), axis=-1)
-    rgb_image = ycbcr_to_rgb(ycbcr_image)
-
-    img_out = Image.fromarray(rgb_image)
-    img_out.save(output_path)
-    print(f"Decompression complete. Output saved to {output_path}")
+import contextlib
+import math
+import mmap
+import os
+import numpy as np
+from PIL import Image
+from container import read_header, parse_header, present_components, component_table_names
+from block_processing import reconstruct_blocks, scaled_coefficient_count
+from huffman_coding import HuffmanTable, huffman_decode_blocks
+from color_conversion import ycbcr_planes_to_rgb
+from subsampling import upsample_channel, subsampled_size, subsampling_mode, get_subsampling_factors
+from quantization import estimate_quality, BASE_Q_LUMINANCE
+from jfif import probe_jfif, JFIF_BLOCK_SIZE
+from restart_intervals import dpcm_decode_intervals, huffman_decode_intervals
+from progressive import decode_scans
+
+def upsample_channel_nearest_neighbor(channel, target_height, target_width):
+    return upsample_channel(channel, target_height, target_width, '4:2:0')
+
+def dpcm_decode_dc(dc_diffs, restart_interval=0):
+    return dpcm_decode_intervals(dc_diffs, restart_interval)
+
+@contextlib.contextmanager
+def map_file(input_path):
+    with open(input_path, 'rb') as f:
+        # mmap refuses empty files; report them like any other unreadable header
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("Invalid file format")
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data = memoryview(mapping)
+    try:
+        yield data
+    finally:
+        data.release()
+        try:
+            mapping.close()
+        except BufferError:
+            # A propagating traceback still holds payload views; the mapping closes once they are collected
+            pass
+
+def split_myjpeg(data):
+    metadata, offset = parse_header(data)
+    data = memoryview(data).cast('B')
+    if 'scans' in metadata:
+        # Progressive payloads are kept in scan order; a truncated file yields short or empty trailing scans
+        payloads = []
+        for scan in metadata['scans']:
+            payloads.append(data[offset:offset + scan['data_len']])
+            offset += scan['data_len']
+        return metadata, payloads
+
+    payloads = {}
+    for comp_name in present_components(metadata):
+        length = metadata[f"data_len_{comp_name.lower()}"]
+        payloads[comp_name] = data[offset:offset + length]
+        offset += length
+    return metadata, payloads
+
+def component_specs(metadata):
+    huffman_tables = {}
+    specs = {}
+    for comp_name in present_components(metadata):
+        key = comp_name.lower()
+        quant_name, dc_name, ac_name = component_table_names(metadata, comp_name)
+        for name in (dc_name, ac_name):
+            if name not in huffman_tables and f"huff_{name}_bits" in metadata:
+                huffman_tables[name] = HuffmanTable(metadata[f"huff_{name}_bits"], metadata[f"huff_{name}_huffval"])
+        specs[comp_name] = (huffman_tables.get(dc_name), huffman_tables.get(ac_name),
+                            np.array(metadata[f"q_table_{quant_name}"], dtype=np.uint8),
+                            tuple(metadata[f"padded_dims_{key}"]), metadata.get(f"restart_offsets_{key}"),
+                            metadata.get(f"row_index_{key}"))
+    return specs
+
+def decode_myjpeg(data, fancy_upsampling=False, workers=1, scale=1, dct_method='float', max_scans=None):
+    metadata, payloads = split_myjpeg(data)
+    specs = component_specs(metadata)
+
+    block_size = metadata['block_size']
+    num_coefficients = scaled_coefficient_count(block_size, scale)
+    width = math.ceil(metadata['original_width'] / scale)
+    height = math.ceil(metadata['original_height'] / scale)
+    subsampling = metadata.get('subsampling', '4:2:0')
+    restart_interval = metadata.get('restart_interval', 0)
+    chroma_height, chroma_width = subsampled_size(metadata['original_height'], metadata['original_width'], subsampling)
+    chroma_height, chroma_width = math.ceil(chroma_height / scale), math.ceil(chroma_width / scale)
+
+    reconstructed_channels = {}
+
+    progressive_blocks = None
+    if 'scans' in metadata:
+        block_counts = {comp_name: (padded_h // block_size) * (padded_w // block_size)
+                        for comp_name, (_, _, _, (padded_h, padded_w), _, _) in specs.items()}
+        progressive_blocks = decode_scans(metadata['scans'][:max_scans], payloads, block_counts,
+                                          block_size * block_size)
+
+    for comp_name, (dc_table, ac_table, q_matrix, (padded_h, padded_w), restart_offsets, _) in specs.items():
+        num_blocks = (padded_h // block_size) * (padded_w // block_size)
+        if progressive_blocks is not None:
+            zigzag_blocks = progressive_blocks[comp_name][:, :num_coefficients]
+        else:
+            comp_data = payloads[comp_name]
+            if restart_interval:
+                zigzag_blocks = huffman_decode_intervals(comp_data, restart_offsets, dc_table, ac_table, num_blocks,
+                                                         restart_interval, block_size, workers, num_coefficients)
+            else:
+                zigzag_blocks = huffman_decode_blocks(comp_data, dc_table, ac_table, num_blocks, block_size,
+                                                      num_coefficients=num_coefficients)
+            zigzag_blocks[:, 0] = dpcm_decode_dc(zigzag_blocks[:, 0], restart_interval)
+
+        reassembled = reconstruct_blocks(zigzag_blocks, q_matrix, block_size, padded_h // block_size,
+                                         padded_w // block_size, scale, dct_method)
+
+        
+        if comp_name == 'Y':
+            final = reassembled[:height, :width]
+        else:
+            final = reassembled[:chroma_height, :chroma_width]
+
+        reconstructed_channels[comp_name] = final
+
+    
+    y_channel = reconstructed_channels['Y']
+    if 'Cb' not in reconstructed_channels:
+        return y_channel
+    factor_v, factor_h = get_subsampling_factors(subsampling)
+    return ycbcr_planes_to_rgb(y_channel, reconstructed_channels['Cb'], reconstructed_channels['Cr'], factor_v, factor_h,
+                               fancy_upsampling)
+
+def decode_image(input_path, fancy_upsampling=False, workers=1, scale=1, dct_method='float', max_scans=None):
+    from jpeg_codec import jpeg_decompress
+    with map_file(input_path) as data:
+        return jpeg_decompress(data, fancy_upsampling, workers, scale, dct_method, max_scans)
+
+def probe_image(input_path):
+    with open(input_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if f.read(2) == b'\xff\xd8':
+            f.seek(0)
+            frame, q_tables, restart_interval = probe_jfif(f)
+            luma = frame['components'][frame['order'][0]]
+            quality = None
+            if luma['q_table'] in q_tables:
+                quality = estimate_quality(q_tables[luma['q_table']], BASE_Q_LUMINANCE)
+            subsampling = None
+            if len(frame['order']) > 1:
+                chroma = frame['components'][frame['order'][1]]
+                subsampling = subsampling_mode(frame['v_max'] // chroma['v'], frame['h_max'] // chroma['h'])
+            return {
+                'format': 'jfif',
+                'width': frame['width'],
+                'height': frame['height'],
+                'num_components': len(frame['order']),
+                'quality': quality,
+                'subsampling': subsampling,
+                'block_size': JFIF_BLOCK_SIZE,
+                'restart_interval': restart_interval,
+                'progressive': frame['process'] == 0xC2,
+                'header_size': f.tell(),
+                'file_size': file_size,
+            }
+        f.seek(0)
+        metadata = read_header(f)
+        header_size = f.tell()
+    components = present_components(metadata)
+
+    return {
+        'format': 'myjpeg',
+        'width': metadata['original_width'],
+        'height': metadata['original_height'],
+        'num_components': len(components),
+        'quality': metadata['quality'],
+        'subsampling': metadata.get('subsampling', '4:2:0') if len(components) > 1 else None,
+        'block_size': metadata['block_size'],
+        'restart_interval': metadata.get('restart_interval', 0),
+        'progressive': 'scans' in metadata,
+        'header_size': header_size,
+        'file_size': file_size,
+        'component_sizes': {comp_name: metadata[f"data_len_{comp_name.lower()}"] for comp_name in components},
+        'scan_sizes': [scan['data_len'] for scan in metadata['scans']] if 'scans' in metadata else None,
+    }
+
+def decompress_image(input_path, output_path, fancy_upsampling=False, workers=1, scale=1, dct_method='float',
+                     max_scans=None):
+    img_out = Image.fromarray(decode_image(input_path, fancy_upsampling, workers, scale, dct_method, max_scans))
+    img_out.save(output_path)
+    print(f"Decompression complete. Output saved to {output_path}")
@@ -1,232 +1,495 @@
-import io
-
-class HuffmanTable:
-    def __init__(self, bits, huffval):
-        
-        self.bits = list(bits)
-        self.huffval = list(huffval)
-        self.encode_table = {}
-        self.decode_table = {}
-        self.max_code_len = 0
-
-        self._generate_huffman_codes()
-        self._build_decode_table()
-
-    def _generate_huffman_codes(self):
-        code = 0
-        si = 1
-        huffval_idx = 0
-        for i in range(16):
-            num_codes = self.bits[i]
-            for _ in range(num_codes):
-                symbol = self.huffval[huffval_idx]
-                self.encode_table[symbol] = (code, si)
-                code += 1
-                huffval_idx += 1
-            code <<= 1
-            si += 1
-            if num_codes > 0:
-                self.max_code_len = i + 1
-
-    def _build_decode_table(self):
-        self.decode_table = {}
-        for symbol, (code, length) in self.encode_table.items():
-            code_str = format(code, f'0{length}b')
-            self.decode_table[code_str] = symbol
-
-    def get_code(self, symbol):
-        return self.encode_table.get(symbol)
-
-    def decode_symbol(self, bit_reader):
-        current_code = ""
-        for _ in range(self.max_code_len):
-            bit = bit_reader.read_bit()
-            if bit is None:
-                return None
-            current_code += str(bit)
-            if current_code in self.decode_table:
-                return self.decode_table[current_code]
-        return None
-
-class BitWriter:
-    def __init__(self):
-        self._buffer = 0
-        self._bit_count = 0
-        self._byte_stream = bytearray()
-
-    def write_bit(self, bit):
-        if bit not in (0, 1):
-            raise ValueError("Bit must be 0 or 1")
-        self._buffer = (self._buffer << 1) | bit
-        self._bit_count += 1
-        if self._bit_count == 8:
-            self._flush_byte()
-
-    def write_bits(self, value, num_bits):
-        if num_bits == 0:
-            return
-        mask = (1 << num_bits) - 1
-        bits_to_write = value & mask
-        for i in range(num_bits - 1, -1, -1):
-            bit = (bits_to_write >> i) & 1
-            self.write_bit(bit)
-
-    def _flush_byte(self):
-
-        byte_to_write = self._buffer
-        self._byte_stream.append(byte_to_write)
-        if byte_to_write == 0xFF:
-            self._byte_stream.append(0x00)
-        self._buffer = 0
-        self._bit_count = 0
-
-    def get_byte_string(self):
-        if self._bit_count > 0:
-            padding_bits = 8 - self._bit_count
-            pad_mask = (1 << padding_bits) - 1
-            self._buffer = (self._buffer << padding_bits) | pad_mask
-            self._bit_count = 8
-            self._flush_byte()
-        return bytes(self._byte_stream)
-
-class BitReader:
-    def __init__(self, byte_data):
-        self._byte_stream = io.BytesIO(byte_data)
-        self._current_byte = 0
-        self._bit_pos = 8
-        self._marker_found = False
-
-    def _load_byte(self):
-        if self._marker_found:
-            return None
-        byte = self._byte_stream.read(1)
-        if not byte:
-            return None
-        val = byte[0]
-        if val == 0xFF:
-            next_byte = self._byte_stream.read(1)
-            if not next_byte:
-                self._marker_found = True
-                return None
-            next_val = next_byte[0]
-            if next_val == 0x00:
-                self._current_byte = 0xFF
-                self._bit_pos = 0
-                return True
-            else:
-                self._byte_stream.seek(-2, 1)
-                self._marker_found = True
-                return None
-        else:
-            self._current_byte = val
-            self._bit_pos = 0
-            return True
-
-    def read_bit(self):
-        if self._bit_pos > 7:
-            if not self._load_byte():
-                return None
-        bit = (self._current_byte >> (7 - self._bit_pos)) & 1
-        self._bit_pos += 1
-        return bit
-
-    def read_bits(self, num_bits):
-
-        if num_bits == 0:
-            return 0
-        value = 0
-        for _ in range(num_bits):
-            bit = self.read_bit()
-
-            value = (value << 1) | bit
-        return value
-
-def huffman_encode_data(data_units, dc_table, ac_table):
-    bit_writer = BitWriter()
-    for dc_category, dc_vli_bits, ac_rle_pairs in data_units:
-        dc_code_info = dc_table.get_code(dc_category)
-
-        dc_code, dc_len = dc_code_info
-        bit_writer.write_bits(dc_code, dc_len)
-        if dc_category > 0:
-
-            dc_vli_val = int(dc_vli_bits, 2)
-            bit_writer.write_bits(dc_vli_val, dc_category)
-        for run_length, ac_value in ac_rle_pairs:
-            if run_length == 0 and ac_value == 0:
-                ac_symbol = 0x00
-                ac_code_info = ac_table.get_code(ac_symbol)
-
-                ac_code, ac_len = ac_code_info
-                bit_writer.write_bits(ac_code, ac_len)
-                break
-            elif run_length == 15 and ac_value == 0:
-                ac_symbol = 0xF0
-                ac_code_info = ac_table.get_code(ac_symbol)
-
-                ac_code, ac_len = ac_code_info
-                bit_writer.write_bits(ac_code, ac_len)
-            else:
-                from vli_coding import get_vli_category_and_value
-                ac_category, ac_vli_bits = get_vli_category_and_value(ac_value)
-                if ac_category == 0:
-                    raise ValueError(f"Zero category for non-zero AC value {ac_value}")
-                if ac_category > 15:
-                    raise ValueError(f"AC VLI category {ac_category} > 15")
-                if not (0 <= run_length <= 15):
-                    raise ValueError(f"Invalid run_length {run_length} in AC RLE.")
-                ac_symbol = (run_length << 4) | ac_category
-                ac_code_info = ac_table.get_code(ac_symbol)
-                if ac_code_info is None:
-                    raise ValueError(f"AC symbol 0x{ac_symbol:02X} not found in Huffman table.")
-                ac_code, ac_len = ac_code_info
-                bit_writer.write_bits(ac_code, ac_len)
-                if len(ac_vli_bits) != ac_category:
-                    raise ValueError(f"Invalid VLI bits length for AC value {ac_value}")
-                ac_vli_val = int(ac_vli_bits, 2)
-                bit_writer.write_bits(ac_vli_val, ac_category)
-    return bit_writer.get_byte_string()
-
-def huffman_decode_data(byte_data, dc_table, ac_table, num_blocks):
-    bit_reader = BitReader(byte_data)
-    decoded_units = []
-    from vli_coding import decode_vli
-    try:
-        for block_idx in range(num_blocks):
-            dc_category = dc_table.decode_symbol(bit_reader)
-            if dc_category is None:
-                raise EOFError(f"Failed to decode DC category for block {block_idx+1}")
-            dc_vli_bits = ""
-            if dc_category > 0:
-                dc_vli_val = bit_reader.read_bits(dc_category)
-                dc_vli_bits = format(dc_vli_val, f'0{dc_category}b')
-            ac_rle_pairs = []
-            ac_count = 0
-            while ac_count < 63:
-                ac_symbol = ac_table.decode_symbol(bit_reader)
-                if ac_symbol is None:
-                    raise EOFError(f"Failed to decode AC symbol in block {block_idx+1} after {len(ac_rle_pairs)} pairs")
-                if ac_symbol == 0x00:
-                    ac_rle_pairs.append((0, 0))
-                    break
-                elif ac_symbol == 0xF0:
-                    ac_rle_pairs.append((15, 0))
-                    ac_count += 16
-                else:
-                    run_length = (ac_symbol >> 4) & 0x0F
-                    ac_category = ac_symbol & 0x0F
-                    if ac_category == 0 or ac_category > 15:
-                        raise ValueError(f"Invalid AC symbol 0x{ac_symbol:02X} (run={run_length}, size={ac_category})")
-                    ac_vli_val = bit_reader.read_bits(ac_category)
-                    ac_vli_bits = format(ac_vli_val, f'0{ac_category}b')
-                    ac_value = decode_vli(ac_category, ac_vli_bits)
-                    ac_rle_pairs.append((run_length, ac_value))
-                    ac_count += run_length + 1
-                if ac_count > 63:
-                    break
-            decoded_units.append((dc_category, dc_vli_bits, ac_rle_pairs))
-    except EOFError as e:
-        pass
-    except ValueError as e:
-        pass
-    return decoded_units
+import re
+import numpy as np
+from vli_coding import decode_vli_value
+
+LOOKUP_BITS = 9
+
+class HuffmanTable:
+    def __init__(self, bits, huffval):
+        
+        self.bits = list(bits)
+        self.huffval = list(huffval)
+        self.encode_table = {}
+        self.decode_table = {}
+        self.max_code_len = 0
+        self._code_arrays = None
+
+        self._generate_huffman_codes()
+        self._build_decode_table()
+        self._build_lookup_tables()
+
+    def _generate_huffman_codes(self):
+        code = 0
+        si = 1
+        huffval_idx = 0
+        for i in range(16):
+            num_codes = self.bits[i]
+            for _ in range(num_codes):
+                symbol = self.huffval[huffval_idx]
+                self.encode_table[symbol] = (code, si)
+                code += 1
+                huffval_idx += 1
+            code <<= 1
+            si += 1
+            if num_codes > 0:
+                self.max_code_len = i + 1
+
+    def _build_decode_table(self):
+        self.decode_table = {}
+        for symbol, (code, length) in self.encode_table.items():
+            code_str = format(code, f'0{length}b')
+            self.decode_table[code_str] = symbol
+
+    def _build_lookup_tables(self):
+        self.lookup_symbol = [0] * (1 << LOOKUP_BITS)
+        self.lookup_length = [0] * (1 << LOOKUP_BITS)
+        for symbol, (code, length) in self.encode_table.items():
+            if length > LOOKUP_BITS:
+                continue
+            shift = LOOKUP_BITS - length
+            start = code << shift
+            for index in range(start, start + (1 << shift)):
+                self.lookup_symbol[index] = symbol
+                self.lookup_length[index] = length
+
+        self.min_code = [0] * 17
+        self.max_code = [-1] * 17
+        self.val_ptr = [0] * 17
+        code = 0
+        huffval_idx = 0
+        for length in range(1, 17):
+            num_codes = self.bits[length - 1]
+            if num_codes > 0:
+                self.val_ptr[length] = huffval_idx
+                self.min_code[length] = code
+                code += num_codes
+                huffval_idx += num_codes
+                self.max_code[length] = code - 1
+            code <<= 1
+
+    def code_arrays(self):
+        if self._code_arrays is None:
+            codes = np.zeros(256, dtype=np.int64)
+            lengths = np.zeros(256, dtype=np.int64)
+            for symbol, (code, length) in self.encode_table.items():
+                codes[symbol] = code
+                lengths[symbol] = length
+            self._code_arrays = (codes, lengths)
+        return self._code_arrays
+
+    def get_code(self, symbol):
+        return self.encode_table.get(symbol)
+
+    def decode_symbol(self, bit_reader):
+        current_code = ""
+        for _ in range(self.max_code_len):
+            bit = bit_reader.read_bit()
+            if bit is None:
+                return None
+            current_code += str(bit)
+            if current_code in self.decode_table:
+                return self.decode_table[current_code]
+        return None
+
+    def decode_symbol_fast(self, bit_reader):
+        peek = bit_reader.peek_bits(LOOKUP_BITS)
+        length = self.lookup_length[peek]
+        if length:
+            if not bit_reader.skip_bits(length):
+                return None
+            return self.lookup_symbol[peek]
+
+        peek = bit_reader.peek_bits(16)
+        for length in range(LOOKUP_BITS + 1, self.max_code_len + 1):
+            code = peek >> (16 - length)
+            if code <= self.max_code[length]:
+                if not bit_reader.skip_bits(length):
+                    return None
+                return self.huffval[self.val_ptr[length] + code - self.min_code[length]]
+        return None
+
+def symbol_frequencies(symbols, is_dc):
+    dc_frequencies = np.bincount(symbols[is_dc], minlength=256)
+    ac_frequencies = np.bincount(symbols[~is_dc], minlength=256)
+    return dc_frequencies, ac_frequencies
+
+def build_optimized_table(frequencies):
+    freq = [0] * 257
+    for symbol, count in enumerate(frequencies):
+        freq[symbol] = int(count)
+    freq[256] = 1
+
+    codesize = [0] * 257
+    others = [-1] * 257
+    while True:
+        c1 = -1
+        v = None
+        for i in range(257):
+            if freq[i] and (v is None or freq[i] <= v):
+                v = freq[i]
+                c1 = i
+        c2 = -1
+        v = None
+        for i in range(257):
+            if freq[i] and i != c1 and (v is None or freq[i] <= v):
+                v = freq[i]
+                c2 = i
+        if c2 < 0:
+            break
+
+        freq[c1] += freq[c2]
+        freq[c2] = 0
+        codesize[c1] += 1
+        while others[c1] >= 0:
+            c1 = others[c1]
+            codesize[c1] += 1
+        others[c1] = c2
+        codesize[c2] += 1
+        while others[c2] >= 0:
+            c2 = others[c2]
+            codesize[c2] += 1
+
+    bits = [0] * 33
+    for i in range(257):
+        if codesize[i]:
+            if codesize[i] > 32:
+                raise ValueError("Huffman code size exceeds 32 bits during table optimization.")
+            bits[codesize[i]] += 1
+
+    for i in range(32, 16, -1):
+        while bits[i] > 0:
+            j = i - 2
+            while bits[j] == 0:
+                j -= 1
+            bits[i] -= 2
+            bits[i - 1] += 1
+            bits[j + 1] += 2
+            bits[j] -= 1
+
+    i = 16
+    while bits[i] == 0:
+        i -= 1
+    bits[i] -= 1
+
+    huffval = [symbol for size in range(1, 33) for symbol in range(256) if codesize[symbol] == size]
+    return HuffmanTable(bits[1:17], huffval)
+
+def build_optimized_tables(symbol_sets):
+    dc_frequencies = np.zeros(256, dtype=np.int64)
+    ac_frequencies = np.zeros(256, dtype=np.int64)
+    for symbols, _, _, is_dc in symbol_sets:
+        dc_counts, ac_counts = symbol_frequencies(symbols, is_dc)
+        dc_frequencies += dc_counts
+        ac_frequencies += ac_counts
+    return build_optimized_table(dc_frequencies), build_optimized_table(ac_frequencies)
+
+class BitWriter:
+    FLUSH_THRESHOLD_BITS = 256
+
+    def __init__(self, stuff_bytes=True):
+        self.stuff_bytes = stuff_bytes
+        self._buffer = 0
+        self._bit_count = 0
+        self._byte_stream = bytearray()
+
+    def write_bit(self, bit):
+        if bit not in (0, 1):
+            raise ValueError("Bit must be 0 or 1")
+        self.write_bits(bit, 1)
+
+    def write_bits(self, value, num_bits):
+        if num_bits == 0:
+            return
+        self._buffer = (self._buffer << num_bits) | (value & ((1 << num_bits) - 1))
+        self._bit_count += num_bits
+        if self._bit_count >= self.FLUSH_THRESHOLD_BITS:
+            self._flush_bytes()
+
+    def _flush_bytes(self):
+        num_bytes = self._bit_count >> 3
+        if num_bytes == 0:
+            return
+        remaining_bits = self._bit_count & 7
+        chunk = (self._buffer >> remaining_bits).to_bytes(num_bytes, 'big')
+        self._buffer &= (1 << remaining_bits) - 1
+        self._bit_count = remaining_bits
+        if self.stuff_bytes and 0xFF in chunk:
+            chunk = chunk.replace(b'\xff', b'\xff\x00')
+        self._byte_stream += chunk
+
+    def write_raw_bits(self, byte_data, tail_value=0, tail_bits=0):
+        if byte_data:
+            self.write_bits(int.from_bytes(byte_data, 'big'), 8 * len(byte_data))
+        self.write_bits(tail_value, tail_bits)
+
+    def bit_position(self):
+        self._flush_bytes()
+        return len(self._byte_stream), self._bit_count
+
+    def take_bytes(self):
+        data = bytes(self._byte_stream)
+        self._byte_stream = bytearray()
+        return data
+
+    def get_raw_bits(self):
+        self._flush_bytes()
+        return bytes(self._byte_stream), self._buffer, self._bit_count
+
+    def get_byte_string(self):
+        if self._bit_count & 7:
+            padding_bits = 8 - (self._bit_count & 7)
+            self.write_bits((1 << padding_bits) - 1, padding_bits)
+        self._flush_bytes()
+        return bytes(self._byte_stream)
+
+_MARKER_PATTERN = re.compile(b'\xff(?!\x00)')
+_STUFFED_BYTE_PATTERN = re.compile(b'\xff')
+
+class BitReader:
+    REFILL_BYTES = 8
+
+    def __init__(self, byte_data):
+        view = memoryview(byte_data).cast('B')
+        marker = _MARKER_PATTERN.search(view)
+        if marker is None:
+            self.marker_position = None
+            self.marker = None
+            payload = view
+        else:
+            self.marker_position = marker.start()
+            self.marker = view[self.marker_position + 1] if self.marker_position + 1 < len(view) else None
+            payload = view[:self.marker_position]
+        if _STUFFED_BYTE_PATTERN.search(payload) is not None:
+            payload = bytes(payload).replace(b'\xff\x00', b'\xff')
+        self._data = payload
+        self._byte_pos = 0
+        self._bit_buffer = 0
+        self._bits_in_buffer = 0
+
+    def _refill(self):
+        num_bytes = min(self.REFILL_BYTES - (self._bits_in_buffer >> 3), len(self._data) - self._byte_pos)
+        if num_bytes <= 0:
+            return
+        chunk = self._data[self._byte_pos:self._byte_pos + num_bytes]
+        self._byte_pos += num_bytes
+        self._bit_buffer = (self._bit_buffer << (num_bytes << 3)) | int.from_bytes(chunk, 'big')
+        self._bits_in_buffer += num_bytes << 3
+
+    def bits_remaining(self):
+        return self._bits_in_buffer + ((len(self._data) - self._byte_pos) << 3)
+
+    def peek_bits(self, num_bits):
+        if self._bits_in_buffer < num_bits:
+            self._refill()
+            if self._bits_in_buffer < num_bits:
+                missing = num_bits - self._bits_in_buffer
+                return (self._bit_buffer << missing) | ((1 << missing) - 1)
+        return self._bit_buffer >> (self._bits_in_buffer - num_bits)
+
+    def skip_bits(self, num_bits):
+        if self._bits_in_buffer < num_bits:
+            self._refill()
+            if self._bits_in_buffer < num_bits:
+                return False
+        self._bits_in_buffer -= num_bits
+        self._bit_buffer &= (1 << self._bits_in_buffer) - 1
+        return True
+
+    def read_bit(self):
+        if self._bits_in_buffer < 1:
+            self._refill()
+            if self._bits_in_buffer < 1:
+                return None
+        self._bits_in_buffer -= 1
+        bit = self._bit_buffer >> self._bits_in_buffer
+        self._bit_buffer &= (1 << self._bits_in_buffer) - 1
+        return bit
+
+    def read_bits(self, num_bits):
+
+        if num_bits == 0:
+            return 0
+        if self._bits_in_buffer < num_bits:
+            self._refill()
+            if self._bits_in_buffer < num_bits:
+                raise EOFError(f"Not enough data to read {num_bits} bits")
+        self._bits_in_buffer -= num_bits
+        value = self._bit_buffer >> self._bits_in_buffer
+        self._bit_buffer &= (1 << self._bits_in_buffer) - 1
+        return value
+
+def huffman_encode_data(data_units, dc_table, ac_table):
+    bit_writer = BitWriter()
+    for dc_category, dc_vli_bits, ac_rle_pairs in data_units:
+        dc_code_info = dc_table.get_code(dc_category)
+
+        dc_code, dc_len = dc_code_info
+        bit_writer.write_bits(dc_code, dc_len)
+        if dc_category > 0:
+
+            dc_vli_val = int(dc_vli_bits, 2)
+            bit_writer.write_bits(dc_vli_val, dc_category)
+        for run_length, ac_value in ac_rle_pairs:
+            if run_length == 0 and ac_value == 0:
+                ac_symbol = 0x00
+                ac_code_info = ac_table.get_code(ac_symbol)
+
+                ac_code, ac_len = ac_code_info
+                bit_writer.write_bits(ac_code, ac_len)
+                break
+            elif run_length == 15 and ac_value == 0:
+                ac_symbol = 0xF0
+                ac_code_info = ac_table.get_code(ac_symbol)
+
+                ac_code, ac_len = ac_code_info
+                bit_writer.write_bits(ac_code, ac_len)
+            else:
+                from vli_coding import get_vli_category_and_value
+                ac_category, ac_vli_bits = get_vli_category_and_value(ac_value)
+                if ac_category == 0:
+                    raise ValueError(f"Zero category for non-zero AC value {ac_value}")
+                if ac_category > 15:
+                    raise ValueError(f"AC VLI category {ac_category} > 15")
+                if not (0 <= run_length <= 15):
+                    raise ValueError(f"Invalid run_length {run_length} in AC RLE.")
+                ac_symbol = (run_length << 4) | ac_category
+                ac_code_info = ac_table.get_code(ac_symbol)
+                if ac_code_info is None:
+                    raise ValueError(f"AC symbol 0x{ac_symbol:02X} not found in Huffman table.")
+                ac_code, ac_len = ac_code_info
+                bit_writer.write_bits(ac_code, ac_len)
+                if len(ac_vli_bits) != ac_category:
+                    raise ValueError(f"Invalid VLI bits length for AC value {ac_value}")
+                ac_vli_val = int(ac_vli_bits, 2)
+                bit_writer.write_bits(ac_vli_val, ac_category)
+    return bit_writer.get_byte_string()
+
+def huffman_decode_data(byte_data, dc_table, ac_table, num_blocks):
+    bit_reader = BitReader(byte_data)
+    decoded_units = []
+    from vli_coding import decode_vli
+    try:
+        for block_idx in range(num_blocks):
+            dc_category = dc_table.decode_symbol_fast(bit_reader)
+            if dc_category is None:
+                raise EOFError(f"Failed to decode DC category for block {block_idx+1}")
+            dc_vli_bits = ""
+            if dc_category > 0:
+                dc_vli_val = bit_reader.read_bits(dc_category)
+                dc_vli_bits = format(dc_vli_val, f'0{dc_category}b')
+            ac_rle_pairs = []
+            ac_count = 0
+            while True:
+                ac_symbol = ac_table.decode_symbol_fast(bit_reader)
+                if ac_symbol is None:
+                    raise EOFError(f"Failed to decode AC symbol in block {block_idx+1} after {len(ac_rle_pairs)} pairs")
+                if ac_symbol == 0x00:
+                    ac_rle_pairs.append((0, 0))
+                    break
+                elif ac_symbol == 0xF0:
+                    ac_rle_pairs.append((15, 0))
+                    ac_count += 16
+                else:
+                    run_length = (ac_symbol >> 4) & 0x0F
+                    ac_category = ac_symbol & 0x0F
+                    if ac_category == 0 or ac_category > 15:
+                        raise ValueError(f"Invalid AC symbol 0x{ac_symbol:02X} (run={run_length}, size={ac_category})")
+                    ac_vli_val = bit_reader.read_bits(ac_category)
+                    ac_vli_bits = format(ac_vli_val, f'0{ac_category}b')
+                    ac_value = decode_vli(ac_category, ac_vli_bits)
+                    ac_rle_pairs.append((run_length, ac_value))
+                    ac_count += run_length + 1
+                if ac_count > 63:
+                    raise ValueError(f"AC coefficients overflow block {block_idx+1}")
+            decoded_units.append((dc_category, dc_vli_bits, ac_rle_pairs))
+    except EOFError as e:
+        pass
+    except ValueError as e:
+        pass
+    return decoded_units
+
+def symbol_codes(symbols, amplitudes, amplitude_lengths, is_dc, dc_table, ac_table):
+    dc_codes, dc_lengths = dc_table.code_arrays()
+    ac_codes, ac_lengths = ac_table.code_arrays()
+    codes = np.where(is_dc, dc_codes[symbols], ac_codes[symbols])
+    code_lengths = np.where(is_dc, dc_lengths[symbols], ac_lengths[symbols])
+    missing = np.flatnonzero(code_lengths == 0)
+    if len(missing):
+        symbol = int(symbols[missing[0]])
+        kind = "DC" if is_dc[missing[0]] else "AC"
+        raise ValueError(f"{kind} symbol 0x{symbol:02X} not found in Huffman table.")
+
+    values = (codes << amplitude_lengths) | amplitudes
+    lengths = code_lengths + amplitude_lengths
+    return values, lengths
+
+def write_codes(bit_writer, values, lengths):
+    write_bits = bit_writer.write_bits
+    for value, length in zip(values.tolist(), lengths.tolist()):
+        write_bits(value, length)
+
+def write_symbols(bit_writer, symbols, amplitudes, amplitude_lengths, is_dc, dc_table, ac_table):
+    write_codes(bit_writer, *symbol_codes(symbols, amplitudes, amplitude_lengths, is_dc, dc_table, ac_table))
+
+def huffman_encode_symbols(symbols, amplitudes, amplitude_lengths, is_dc, dc_table, ac_table):
+    bit_writer = BitWriter()
+    write_symbols(bit_writer, symbols, amplitudes, amplitude_lengths, is_dc, dc_table, ac_table)
+    return bit_writer.get_byte_string()
+
+def decode_block_into(bit_reader, dc_table, ac_table, block_len, base, indices, values, baseline=False,
+                      num_coefficients=None):
+    if num_coefficients is None:
+        num_coefficients = block_len
+    read_bits = bit_reader.read_bits
+    decode_ac = ac_table.decode_symbol_fast
+    dc_category = dc_table.decode_symbol_fast(bit_reader)
+    if dc_category is None:
+        raise EOFError("Failed to decode DC category")
+    dc_diff = decode_vli_value(dc_category, read_bits(dc_category))
+    k = 1
+    while not baseline or k < block_len:
+        ac_symbol = decode_ac(bit_reader)
+        if ac_symbol is None:
+            raise EOFError("Failed to decode AC symbol")
+        if ac_symbol == 0x00:
+            break
+        if ac_symbol == 0xF0:
+            k += 16
+        else:
+            ac_category = ac_symbol & 0x0F
+            if ac_category == 0:
+                raise ValueError(f"Invalid AC symbol 0x{ac_symbol:02X}")
+            k += ac_symbol >> 4
+            if k >= block_len:
+                raise ValueError("AC coefficients overflow block")
+            if k < num_coefficients:
+                indices.append(base + k)
+                values.append(decode_vli_value(ac_category, read_bits(ac_category)))
+            else:
+                bit_reader.skip_bits(ac_category)
+            k += 1
+        if k > block_len:
+            raise ValueError("AC coefficients overflow block")
+    return dc_diff
+
+def huffman_decode_blocks(byte_data, dc_table, ac_table, num_blocks, block_size=8, baseline=False,
+                          num_coefficients=None):
+    bit_reader = BitReader(byte_data)
+    block_len = block_size * block_size
+    if num_coefficients is None:
+        num_coefficients = block_len
+    zigzag_blocks = np.zeros((num_blocks, num_coefficients), dtype=np.int32)
+    indices = []
+    values = []
+    try:
+        for block_idx in range(num_blocks):
+            base = block_idx * num_coefficients
+            dc_diff = decode_block_into(bit_reader, dc_table, ac_table, block_len, base, indices, values, baseline,
+                                        num_coefficients)
+            if dc_diff:
+                indices.append(base)
+                values.append(dc_diff)
+    except (EOFError, ValueError):
+        pass
+    zigzag_blocks.reshape(-1)[indices] = values
+    return zigzag_blocks
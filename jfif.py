@@ -0,0 +1,385 @@
+import math
+import re
+import struct
+import numpy as np
+from block_processing import reconstruct_blocks, scaled_coefficient_count
+from zigzag import zigzag_indices
+from rle import rle_encode_blocks
+from subsampling import get_subsampling_factors, upsample_channel_by_factors
+from color_conversion import ycbcr_planes_to_rgb
+from huffman_coding import HuffmanTable, BitReader, symbol_codes, build_optimized_tables, decode_block_into
+from restart_intervals import dpcm_encode_intervals, encode_code_intervals, join_intervals, split_groups, run_groups
+from huffman_tables import DEFAULT_HUFFMAN_TABLES
+
+SOI = 0xD8
+EOI = 0xD9
+SOF0 = 0xC0
+SOF1 = 0xC1
+DHT = 0xC4
+DQT = 0xDB
+DRI = 0xDD
+SOS = 0xDA
+APP0 = 0xE0
+RST0 = 0xD0
+TEM = 0x01
+
+JFIF_BLOCK_SIZE = 8
+JFIF_BLOCK_LEN = JFIF_BLOCK_SIZE * JFIF_BLOCK_SIZE
+
+_SCAN_END_PATTERN = re.compile(b'\xff[^\x00\xd0-\xd7]')
+_RESTART_MARKER_PATTERN = re.compile(b'\xff[\xd0-\xd7]')
+
+def _segment(marker, payload):
+    return bytes([0xFF, marker]) + struct.pack('>H', len(payload) + 2) + payload
+
+def mcu_layout(height, width, subsampling, num_components=3):
+    factor_v, factor_h = get_subsampling_factors(subsampling)
+    if num_components == 1:
+        # A lone component is scanned non-interleaved, one block per MCU
+        factor_v = factor_h = 1
+    mcu_rows = math.ceil(height / (JFIF_BLOCK_SIZE * factor_v))
+    mcu_cols = math.ceil(width / (JFIF_BLOCK_SIZE * factor_h))
+    sampling = [(factor_h, factor_v)] + [(1, 1)] * (num_components - 1)
+    return mcu_rows, mcu_cols, sampling
+
+def pad_plane(plane, padded_height, padded_width):
+    height, width = plane.shape
+    if height == padded_height and width == padded_width:
+        return plane
+    return np.pad(plane, ((0, padded_height - height), (0, padded_width - width)), mode='edge')
+
+def _to_mcu_order(zigzag_blocks, mcu_rows, mcu_cols, h, v):
+    grid = zigzag_blocks.reshape(mcu_rows, v, mcu_cols, h, -1)
+    return grid.transpose(0, 2, 1, 3, 4).reshape(mcu_rows * mcu_cols * v * h, -1)
+
+def encode_jfif(width, height, component_blocks, q_tables, subsampling, optimize_huffman=False, restart_interval=0,
+                workers=1):
+    mcu_rows, mcu_cols, sampling = mcu_layout(height, width, subsampling, len(component_blocks))
+    blocks_per_mcu = sum(h * v for h, v in sampling)
+
+    component_symbols = []
+    for zigzag_blocks, (h, v) in zip(component_blocks, sampling):
+        scan_blocks = _to_mcu_order(np.asarray(zigzag_blocks), mcu_rows, mcu_cols, h, v).astype(np.int64)
+        scan_blocks[:, 0] = dpcm_encode_intervals(scan_blocks[:, 0], restart_interval * h * v)
+        component_symbols.append(rle_encode_blocks(scan_blocks, baseline=True))
+
+    if optimize_huffman:
+        huffman_tables = list(build_optimized_tables(component_symbols[:1]))
+        if len(component_symbols) > 1:
+            huffman_tables += build_optimized_tables(component_symbols[1:])
+    else:
+        huffman_tables = [HuffmanTable(bits, huffval) for bits, huffval in DEFAULT_HUFFMAN_TABLES]
+
+    all_values = []
+    all_lengths = []
+    all_keys = []
+    offset_in_mcu = 0
+    for index, (symbols, (h, v)) in enumerate(zip(component_symbols, sampling)):
+        table_id = 0 if index == 0 else 1
+        dc_table, ac_table = huffman_tables[2 * table_id], huffman_tables[2 * table_id + 1]
+        values, lengths = symbol_codes(*symbols, dc_table, ac_table)
+        block_of_symbol = np.cumsum(symbols[3]) - 1
+        keys = (block_of_symbol // (h * v)) * blocks_per_mcu + offset_in_mcu + block_of_symbol % (h * v)
+        all_values.append(values)
+        all_lengths.append(lengths)
+        all_keys.append(keys)
+        offset_in_mcu += h * v
+
+    keys = np.concatenate(all_keys)
+    order = np.argsort(keys, kind='stable')
+    num_mcus = mcu_rows * mcu_cols
+    mcus_per_interval = restart_interval or num_mcus
+    interval_starts = np.arange(0, num_mcus, mcus_per_interval) * blocks_per_mcu
+    bounds = np.append(np.searchsorted(keys[order], interval_starts), len(keys))
+    segments = encode_code_intervals(np.concatenate(all_values)[order], np.concatenate(all_lengths)[order],
+                                     bounds, workers)
+    entropy_data, _ = join_intervals(segments)
+
+    output = bytearray([0xFF, SOI])
+    output += _segment(APP0, b'JFIF\x00' + bytes([1, 1, 0]) + struct.pack('>HH', 1, 1) + bytes([0, 0]))
+    natural_to_zigzag = zigzag_indices(JFIF_BLOCK_SIZE)
+    for table_id, q_table in enumerate(q_tables[:len(component_blocks)]):
+        q_values = np.asarray(q_table, dtype=np.uint8).reshape(-1)[natural_to_zigzag]
+        output += _segment(DQT, bytes([table_id]) + q_values.tobytes())
+
+    frame = struct.pack('>BHHB', 8, height, width, len(component_blocks))
+    for index, (h, v) in enumerate(sampling):
+        frame += bytes([index + 1, (h << 4) | v, 0 if index == 0 else 1])
+    output += _segment(SOF0, frame)
+
+    for index, table in enumerate(huffman_tables):
+        table_class, table_id = index % 2, index // 2
+        output += _segment(DHT, bytes([(table_class << 4) | table_id] + table.bits + table.huffval))
+
+    if restart_interval:
+        output += _segment(DRI, struct.pack('>H', restart_interval))
+
+    scan = bytes([len(component_blocks)])
+    for index in range(len(component_blocks)):
+        table_id = 0 if index == 0 else 1
+        scan += bytes([index + 1, (table_id << 4) | table_id])
+    scan += bytes([0, 63, 0])
+    output += _segment(SOS, scan)
+    output += entropy_data
+    output += bytes([0xFF, EOI])
+    return bytes(output)
+
+def _parse_dqt(payload, q_tables):
+    offset = 0
+    zigzag_to_natural = np.argsort(zigzag_indices(JFIF_BLOCK_SIZE))
+    while offset < len(payload):
+        precision, table_id = payload[offset] >> 4, payload[offset] & 0x0F
+        offset += 1
+        if precision == 0:
+            values = np.frombuffer(payload, dtype=np.uint8, count=JFIF_BLOCK_LEN, offset=offset)
+            offset += JFIF_BLOCK_LEN
+        else:
+            values = np.frombuffer(payload, dtype='>u2', count=JFIF_BLOCK_LEN, offset=offset)
+            offset += 2 * JFIF_BLOCK_LEN
+        q_tables[table_id] = values[zigzag_to_natural].astype(np.uint16).reshape(JFIF_BLOCK_SIZE, JFIF_BLOCK_SIZE)
+
+def _parse_dht(payload, dc_tables, ac_tables):
+    offset = 0
+    while offset < len(payload):
+        table_class, table_id = payload[offset] >> 4, payload[offset] & 0x0F
+        bits = list(payload[offset + 1:offset + 17])
+        num_values = sum(bits)
+        huffval = list(payload[offset + 17:offset + 17 + num_values])
+        offset += 17 + num_values
+        tables = ac_tables if table_class else dc_tables
+        tables[table_id] = HuffmanTable(bits, huffval)
+
+def _mcu_block_positions(component, mcu, mcu_cols, interleaved):
+    grid_cols = component['grid_cols']
+    if interleaved:
+        h, v = component['h'], component['v']
+        mcu_row, mcu_col = divmod(mcu, mcu_cols)
+        return [(mcu_row * v + y) * grid_cols + mcu_col * h + x for y in range(v) for x in range(h)]
+    row, col = divmod(mcu, component['block_cols'])
+    return [row * grid_cols + col]
+
+def _decode_interval_segments(segments, first_mcu, num_mcus, scan_layout, mcu_cols, interleaved, restart_interval,
+                              num_coefficients):
+    indices = [[] for _ in scan_layout]
+    values = [[] for _ in scan_layout]
+    for segment_index, segment in enumerate(segments):
+        bit_reader = BitReader(segment)
+        predictors = [0] * len(scan_layout)
+        mcu_start = first_mcu + segment_index * restart_interval
+        try:
+            for mcu in range(mcu_start, min(mcu_start + restart_interval, num_mcus)):
+                for index, (component, dc_table, ac_table) in enumerate(scan_layout):
+                    for block_index in _mcu_block_positions(component, mcu, mcu_cols, interleaved):
+                        base = block_index * num_coefficients
+                        predictors[index] += decode_block_into(bit_reader, dc_table, ac_table, JFIF_BLOCK_LEN, base,
+                                                               indices[index], values[index], True, num_coefficients)
+                        indices[index].append(base)
+                        values[index].append(predictors[index])
+        except (EOFError, ValueError):
+            pass
+    return indices, values
+
+def _decode_scan_intervals(data, offset, scan_components, frame, restart_interval, num_mcus, interleaved, workers):
+    scan_end = _SCAN_END_PATTERN.search(data, offset)
+    scan_end = scan_end.start() if scan_end else len(data)
+    markers = [match.start() for match in _RESTART_MARKER_PATTERN.finditer(data, offset, scan_end)]
+    num_intervals = -(-num_mcus // restart_interval)
+    if len(markers) != num_intervals - 1:
+        return False
+    starts = [offset] + [marker + 2 for marker in markers]
+    segments = [bytes(data[start:end]) for start, end in zip(starts, markers + [scan_end])]
+
+    # Workers only need the block geometry, not the coefficient lists gathered so far
+    scan_layout = [({key: component[key] for key in ('h', 'v', 'grid_cols', 'block_cols')}, dc_table, ac_table)
+                   for component, dc_table, ac_table in scan_components]
+    group_edges = split_groups(num_intervals, workers)
+    group_args = [(segments[first:last], first * restart_interval, num_mcus, scan_layout, frame['mcu_cols'],
+                   interleaved, restart_interval, frame['num_coefficients'])
+                  for first, last in zip(group_edges[:-1], group_edges[1:])]
+    for indices, values in run_groups(_decode_interval_segments, group_args, workers):
+        for (component, _, _), component_indices, component_values in zip(scan_components, indices, values):
+            component['indices'].extend(component_indices)
+            component['values'].extend(component_values)
+    return True
+
+def _decode_scan(data, offset, scan_components, frame, restart_interval, workers=1):
+    mcu_rows, mcu_cols = frame['mcu_rows'], frame['mcu_cols']
+    interleaved = len(scan_components) > 1
+    if interleaved:
+        num_mcus = mcu_rows * mcu_cols
+    else:
+        component = scan_components[0][0]
+        num_mcus = component['block_rows'] * component['block_cols']
+
+    # Restart intervals are independent; a scan whose RST markers don't add up falls back to the serial walk
+    if restart_interval and workers > 1 and _decode_scan_intervals(data, offset, scan_components, frame,
+                                                                   restart_interval, num_mcus, interleaved, workers):
+        return
+
+    num_coefficients = frame['num_coefficients']
+    predictors = [0] * len(scan_components)
+    bit_reader = BitReader(data[offset:])
+    segment_start = offset
+    try:
+        for mcu in range(num_mcus):
+            if restart_interval and mcu and mcu % restart_interval == 0:
+                if bit_reader.marker_position is None:
+                    raise EOFError("Missing restart marker")
+                segment_start += bit_reader.marker_position + 2
+                bit_reader = BitReader(data[segment_start:])
+                predictors = [0] * len(scan_components)
+
+            for index, (component, dc_table, ac_table) in enumerate(scan_components):
+                for block_index in _mcu_block_positions(component, mcu, mcu_cols, interleaved):
+                    base = block_index * num_coefficients
+                    predictors[index] += decode_block_into(bit_reader, dc_table, ac_table, JFIF_BLOCK_LEN, base,
+                                                           component['indices'], component['values'], True,
+                                                           num_coefficients)
+                    component['indices'].append(base)
+                    component['values'].append(predictors[index])
+    except (EOFError, ValueError):
+        pass
+
+def decode_jfif(data, fancy_upsampling=False, scale=1, dct_method='float', workers=1):
+    num_coefficients = scaled_coefficient_count(JFIF_BLOCK_SIZE, scale)
+    data = memoryview(data).cast('B')
+    if bytes(data[:2]) != bytes([0xFF, SOI]):
+        raise ValueError("Not a JPEG file")
+
+    q_tables = {}
+    dc_tables = {}
+    ac_tables = {}
+    restart_interval = 0
+    frame = None
+    offset = 2
+    while offset < len(data):
+        if data[offset] != 0xFF:
+            raise ValueError(f"Expected JPEG marker at offset {offset}")
+        while offset < len(data) and data[offset] == 0xFF:
+            offset += 1
+        marker = data[offset]
+        offset += 1
+        if marker == EOI:
+            break
+        if RST0 <= marker <= RST0 + 7 or marker == TEM:
+            continue
+        length = struct.unpack_from('>H', data, offset)[0]
+        payload = bytes(data[offset + 2:offset + length])
+        offset += length
+
+        if marker == DQT:
+            _parse_dqt(payload, q_tables)
+        elif marker == DHT:
+            _parse_dht(payload, dc_tables, ac_tables)
+        elif marker == DRI:
+            restart_interval = struct.unpack('>H', payload[:2])[0]
+        elif marker in (SOF0, SOF1):
+            frame = _parse_sof(payload)
+            frame['num_coefficients'] = num_coefficients
+        elif 0xC2 <= marker <= 0xCF and marker not in (DHT, 0xC8, 0xCC):
+            raise ValueError(f"Unsupported JPEG process (SOF marker 0x{marker:02X}); only baseline is supported")
+        elif marker == SOS:
+            if frame is None:
+                raise ValueError("SOS before SOF")
+            num_scan_components = payload[0]
+            scan_components = []
+            for i in range(num_scan_components):
+                component_id, table_ids = payload[1 + 2 * i], payload[2 + 2 * i]
+                component = frame['components'][component_id]
+                scan_components.append((component, dc_tables[table_ids >> 4], ac_tables[table_ids & 0x0F]))
+            _decode_scan(data, offset, scan_components, frame, restart_interval, workers)
+            scan_end = _SCAN_END_PATTERN.search(data, offset)
+            offset = scan_end.start() if scan_end else len(data)
+
+    if frame is None:
+        raise ValueError("JPEG file has no frame header")
+    return _reconstruct_frame(frame, q_tables, fancy_upsampling, scale, dct_method)
+
+def probe_jfif(f):
+    if f.read(2) != bytes([0xFF, SOI]):
+        raise ValueError("Not a JPEG file")
+
+    q_tables = {}
+    restart_interval = 0
+    frame = None
+    while True:
+        if f.read(1) != b'\xff':
+            raise ValueError(f"Expected JPEG marker at offset {f.tell() - 1}")
+        marker = 0xFF
+        while marker == 0xFF:
+            byte = f.read(1)
+            if not byte:
+                raise ValueError("JPEG file ends before the first scan")
+            marker = byte[0]
+        if marker in (SOS, EOI):
+            break
+        if RST0 <= marker <= RST0 + 7 or marker == TEM:
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        payload = f.read(length - 2)
+
+        if marker == DQT:
+            _parse_dqt(payload, q_tables)
+        elif marker == DRI:
+            restart_interval = struct.unpack('>H', payload[:2])[0]
+        elif 0xC0 <= marker <= 0xCF and marker not in (DHT, 0xC8, 0xCC):
+            frame = _parse_sof(payload)
+            frame['process'] = marker
+
+    if frame is None:
+        raise ValueError("JPEG file has no frame header")
+    return frame, q_tables, restart_interval
+
+def _parse_sof(payload):
+    precision, height, width, num_components = struct.unpack_from('>BHHB', payload, 0)
+    if precision != 8:
+        raise ValueError(f"Unsupported sample precision {precision}")
+    components = {}
+    order = []
+    for i in range(num_components):
+        component_id, sampling, q_table_id = payload[6 + 3 * i:9 + 3 * i]
+        components[component_id] = {'h': sampling >> 4, 'v': sampling & 0x0F, 'q_table': q_table_id,
+                                    'indices': [], 'values': []}
+        order.append(component_id)
+    h_max = max(c['h'] for c in components.values())
+    v_max = max(c['v'] for c in components.values())
+    mcu_rows = math.ceil(height / (JFIF_BLOCK_SIZE * v_max))
+    mcu_cols = math.ceil(width / (JFIF_BLOCK_SIZE * h_max))
+    for component in components.values():
+        component['height'] = math.ceil(height * component['v'] / v_max)
+        component['width'] = math.ceil(width * component['h'] / h_max)
+        component['block_rows'] = math.ceil(component['height'] / JFIF_BLOCK_SIZE)
+        component['block_cols'] = math.ceil(component['width'] / JFIF_BLOCK_SIZE)
+        component['grid_rows'] = mcu_rows * component['v']
+        component['grid_cols'] = mcu_cols * component['h']
+    return {'width': width, 'height': height, 'h_max': h_max, 'v_max': v_max,
+            'mcu_rows': mcu_rows, 'mcu_cols': mcu_cols, 'components': components, 'order': order}
+
+def _reconstruct_frame(frame, q_tables, fancy_upsampling, scale=1, dct_method='float'):
+    height, width = math.ceil(frame['height'] / scale), math.ceil(frame['width'] / scale)
+    planes = []
+    factors = []
+    for component_id in frame['order']:
+        component = frame['components'][component_id]
+        grid_rows, grid_cols = component['grid_rows'], component['grid_cols']
+        zigzag_blocks = np.zeros((grid_rows * grid_cols, frame['num_coefficients']), dtype=np.int32)
+        zigzag_blocks.reshape(-1)[component['indices']] = component['values']
+
+        plane = reconstruct_blocks(zigzag_blocks, q_tables[component['q_table']], JFIF_BLOCK_SIZE, grid_rows, grid_cols,
+                                   scale, dct_method)
+        plane = plane[:math.ceil(component['height'] / scale), :math.ceil(component['width'] / scale)]
+
+        if frame['v_max'] % component['v'] or frame['h_max'] % component['h']:
+            raise ValueError("Non-integer chroma sampling ratios are not supported")
+        planes.append(plane)
+        factors.append((frame['v_max'] // component['v'], frame['h_max'] // component['h']))
+
+    if len(planes) not in (1, 3):
+        raise ValueError(f"Unsupported number of components {len(planes)}")
+    if len(planes) == 3 and factors[0] == (1, 1) and factors[1] == factors[2]:
+        return ycbcr_planes_to_rgb(planes[0], planes[1], planes[2], *factors[1], fancy_upsampling)
+    planes = [upsample_channel_by_factors(plane, height, width, factor_v, factor_h, fancy=fancy_upsampling)
+              for plane, (factor_v, factor_h) in zip(planes, factors)]
+    if len(planes) == 1:
+        return planes[0]
+    return ycbcr_planes_to_rgb(*planes)
@@ -0,0 +1,57 @@
+from compressor import image_to_array, image_to_ycbcr_planes, encode_myjpeg, encode_jfif_planes
+from decompressor import decode_myjpeg
+from jfif import decode_jfif, JFIF_BLOCK_SIZE
+from quantization import adjust_quantization_matrix, validate_quality, BASE_Q_LUMINANCE, BASE_Q_CHROMINANCE
+from subsampling import get_subsampling_factors
+from restart_intervals import validate_restart_interval
+from dct import validate_dct_method
+from rate_control import RateController, validate_rate_targets
+
+OUTPUT_FORMATS = ('myjpeg', 'jfif')
+
+def jpeg_compress(image, quality=75, block_size=8, subsampling='4:2:0', optimize_huffman=False, output_format='myjpeg',
+                  restart_interval=0, workers=1, row_index=False, verbose=False, dct_method='float', progressive=False,
+                  target_bytes=None, target_psnr=None):
+    validate_quality(quality)
+    get_subsampling_factors(subsampling)
+    validate_restart_interval(restart_interval)
+    validate_dct_method(dct_method, block_size)
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format {output_format!r}. Expected one of {list(OUTPUT_FORMATS)}.")
+    if output_format == 'jfif' and block_size != JFIF_BLOCK_SIZE:
+        raise ValueError("JFIF output requires block_size=8.")
+    if progressive and output_format != 'myjpeg':
+        raise ValueError("Progressive scans are only supported for myjpeg output.")
+    if progressive and (restart_interval or row_index):
+        raise ValueError("Progressive output cannot be combined with restart intervals or a row index.")
+    validate_rate_targets(target_bytes, target_psnr)
+    if (target_bytes is not None or target_psnr is not None) and output_format != 'myjpeg':
+        raise ValueError("Rate control is only supported for myjpeg output.")
+    pixels = image_to_array(image)
+    y, chroma_planes = image_to_ycbcr_planes(pixels, subsampling)
+
+    if target_bytes is not None or target_psnr is not None:
+        # One DCT, then every candidate quality only re-quantizes; the winner is the only full encode
+        controller = RateController(pixels, y, chroma_planes, block_size, subsampling, optimize_huffman,
+                                    restart_interval, row_index, dct_method, progressive)
+        if target_bytes is not None:
+            return controller.fit_bytes(target_bytes, verbose)[1]
+        return controller.fit_psnr(target_psnr, verbose)[1]
+
+    q_y = adjust_quantization_matrix(BASE_Q_LUMINANCE, quality)
+    q_c = adjust_quantization_matrix(BASE_Q_CHROMINANCE, quality)
+    if output_format == 'jfif':
+        return encode_jfif_planes(y, chroma_planes, q_y, q_c, subsampling, optimize_huffman, restart_interval, workers,
+                                  verbose, dct_method)
+    return encode_myjpeg(y, chroma_planes, q_y, q_c, quality, block_size, subsampling, optimize_huffman,
+                         restart_interval, workers, row_index, verbose, dct_method, progressive)
+
+def jpeg_decompress(data, fancy_upsampling=False, workers=1, scale=1, dct_method='float', max_scans=None):
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        raise TypeError("Compressed data must be bytes, bytearray or memoryview.")
+    validate_dct_method(dct_method)
+    if max_scans is not None and (not isinstance(max_scans, int) or max_scans < 1):
+        raise ValueError(f"max_scans must be a positive integer or None, got {max_scans!r}")
+    if data[:2] == b'\xff\xd8':
+        return decode_jfif(data, fancy_upsampling, scale, dct_method, workers)
+    return decode_myjpeg(data, fancy_upsampling, workers, scale, dct_method, max_scans)
@@ -0,0 +1,170 @@
+import math
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from compressor import quantize_channel_blocks
+from rle import rle_encode_blocks
+from huffman_coding import BitWriter, symbol_codes, write_codes, symbol_frequencies
+from restart_intervals import dpcm_encode_intervals, encode_interval_segments, join_intervals
+
+TASKS_PER_WORKER = 4
+
+def _create_shared_array(shape, dtype):
+    dtype = np.dtype(dtype)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, math.prod(shape) * dtype.itemsize))
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return shm, array, (shm.name, shape, dtype.str)
+
+def _attach_shared_array(spec):
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+def _transform_stripe(plane_spec, coeff_spec, q_matrix, block_size, row_start, row_end, dct_method='float'):
+    plane_shm, plane = _attach_shared_array(plane_spec)
+    coeff_shm, coeffs = _attach_shared_array(coeff_spec)
+    stripe = plane[row_start * block_size:row_end * block_size]
+    zigzag_blocks, (_, block_cols) = quantize_channel_blocks(stripe, q_matrix, block_size, dct_method)
+    coeffs[row_start * block_cols:row_end * block_cols] = zigzag_blocks
+    del plane, coeffs, stripe
+    plane_shm.close()
+    coeff_shm.close()
+
+def _stripe_frequencies(coeff_spec, block_start, block_end):
+    coeff_shm, coeffs = _attach_shared_array(coeff_spec)
+    symbols, _, _, is_dc = rle_encode_blocks(coeffs[block_start:block_end])
+    del coeffs
+    coeff_shm.close()
+    return symbol_frequencies(symbols, is_dc)
+
+def _encode_stripe(coeff_spec, block_start, block_end, dc_table, ac_table, restart_interval):
+    coeff_shm, coeffs = _attach_shared_array(coeff_spec)
+    symbols = rle_encode_blocks(coeffs[block_start:block_end])
+    del coeffs
+    coeff_shm.close()
+    values, lengths = symbol_codes(*symbols, dc_table, ac_table)
+    if restart_interval:
+        bounds = np.append(np.flatnonzero(symbols[3])[::restart_interval], len(values))
+        return encode_interval_segments(values, lengths, bounds)
+    bit_writer = BitWriter(stuff_bytes=False)
+    write_codes(bit_writer, values, lengths)
+    return bit_writer.get_raw_bits()
+
+def _split_range(count, num_parts, multiple=1):
+    edges = [(count * part // num_parts) // multiple * multiple for part in range(num_parts)] + [count]
+    return sorted(set(edges))
+
+class ParallelComponentEncoder:
+    def __init__(self, components, block_size=8, restart_interval=0, workers=2, dct_method='float'):
+        self.block_size = block_size
+        self.dct_method = dct_method
+        self.restart_interval = restart_interval
+        self.workers = workers
+        self.padded_dims = {}
+        self._shared = []
+        self._planes = {}
+        self._coeffs = {}
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            self._transform(components)
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._pool.shutdown()
+        self._planes.clear()
+        self._coeffs.clear()
+        for shm in self._shared:
+            shm.close()
+            shm.unlink()
+        self._shared = []
+
+    def _share(self, shape, dtype):
+        shm, array, spec = _create_shared_array(shape, dtype)
+        self._shared.append(shm)
+        return array, spec
+
+    def _tasks_per_component(self, total_blocks, num_blocks):
+        blocks_per_task = max(1, math.ceil(total_blocks / (self.workers * TASKS_PER_WORKER)))
+        return max(1, math.ceil(num_blocks / blocks_per_task))
+
+    def _transform(self, components):
+        block_size = self.block_size
+        grids = {}
+        for comp_name, (channel, _) in components.items():
+            height, width = channel.shape
+            grids[comp_name] = (math.ceil(height / block_size), math.ceil(width / block_size))
+        total_blocks = sum(rows * cols for rows, cols in grids.values())
+
+        futures = []
+        for comp_name, (channel, q_matrix) in components.items():
+            block_rows, block_cols = grids[comp_name]
+            plane, plane_spec = self._share(channel.shape, np.uint8)
+            plane[...] = channel
+            coeffs, coeff_spec = self._share((block_rows * block_cols, block_size * block_size), np.int32)
+            self._planes[comp_name] = plane
+            self._coeffs[comp_name] = (coeffs, coeff_spec)
+            self.padded_dims[comp_name] = (block_rows * block_size, block_cols * block_size)
+
+            num_tasks = self._tasks_per_component(total_blocks, block_rows * block_cols)
+            row_edges = _split_range(block_rows, num_tasks)
+            for row_start, row_end in zip(row_edges[:-1], row_edges[1:]):
+                futures.append(self._pool.submit(_transform_stripe, plane_spec, coeff_spec, q_matrix, block_size,
+                                                 row_start, row_end, self.dct_method))
+        for future in futures:
+            future.result()
+
+        for coeffs, _ in self._coeffs.values():
+            coeffs[:, 0] = dpcm_encode_intervals(coeffs[:, 0], self.restart_interval)
+
+    def _block_ranges(self):
+        total_blocks = sum(len(coeffs) for coeffs, _ in self._coeffs.values())
+        ranges = {}
+        for comp_name, (coeffs, _) in self._coeffs.items():
+            num_tasks = self._tasks_per_component(total_blocks, len(coeffs))
+            edges = _split_range(len(coeffs), num_tasks, self.restart_interval or 1)
+            ranges[comp_name] = list(zip(edges[:-1], edges[1:]))
+        return ranges
+
+    def zigzag_components(self):
+        return {comp_name: coeffs for comp_name, (coeffs, _) in self._coeffs.items()}
+
+    def symbol_frequencies(self):
+        futures = {
+            comp_name: [self._pool.submit(_stripe_frequencies, self._coeffs[comp_name][1], start, end)
+                        for start, end in block_ranges]
+            for comp_name, block_ranges in self._block_ranges().items()
+        }
+        frequencies = {}
+        for comp_name, stripe_futures in futures.items():
+            counts = [future.result() for future in stripe_futures]
+            frequencies[comp_name] = (sum(dc for dc, _ in counts), sum(ac for _, ac in counts))
+        return frequencies
+
+    def encode(self, huffman_tables):
+        futures = {}
+        for comp_name, block_ranges in self._block_ranges().items():
+            dc_table, ac_table = huffman_tables[comp_name]
+            futures[comp_name] = [self._pool.submit(_encode_stripe, self._coeffs[comp_name][1], start, end,
+                                                    dc_table, ac_table, self.restart_interval)
+                                  for start, end in block_ranges]
+
+        compressed_data = {}
+        restart_offsets = {}
+        for comp_name, stripe_futures in futures.items():
+            if self.restart_interval:
+                segments = [segment for future in stripe_futures for segment in future.result()]
+                compressed_data[comp_name], restart_offsets[comp_name] = join_intervals(segments)
+            else:
+                bit_writer = BitWriter()
+                for future in stripe_futures:
+                    bit_writer.write_raw_bits(*future.result())
+                compressed_data[comp_name] = bit_writer.get_byte_string()
+        return compressed_data, restart_offsets
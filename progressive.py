@@ -0,0 +1,339 @@
+import numpy as np
+from huffman_coding import HuffmanTable, BitReader, BitWriter, build_optimized_table, write_codes
+from vli_coding import vli_category_array, vli_amplitude_array, decode_vli_value
+from restart_intervals import dpcm_encode_intervals
+
+MAX_EOB_RUN = 0x7FFF
+MAX_POINT_TRANSFORM = 13
+ZRL_SYMBOL = 0xF0
+RAW_BITS = -1
+
+def default_scan_script(component_names, block_len=64):
+    last = block_len - 1
+    split = min(5, last)
+    components = tuple(component_names)
+    chroma = [(name,) for name in component_names if name != 'Y']
+    script = [(components, 0, 0, 0, 1)]
+    if last == 0:
+        return script + [(components, 0, 0, 1, 0)]
+
+    # DC first, then a coarse low-frequency luma band so previews gain detail early
+    script.append((('Y',), 1, split, 0, 2))
+    script += [(name, 1, last, 0, 1) for name in chroma]
+    if split < last:
+        script.append((('Y',), split + 1, last, 0, 2))
+    script.append((('Y',), 1, last, 2, 1))
+    script.append((components, 0, 0, 1, 0))
+    script += [(name, 1, last, 1, 0) for name in chroma]
+    script.append((('Y',), 1, last, 1, 0))
+    return script
+
+def expand_scan_script(script, component_names, block_len=64):
+    if script is True:
+        script = default_scan_script(component_names, block_len)
+    if not isinstance(script, (list, tuple)) or not script:
+        raise ValueError("progressive must be True or a non-empty list of (components, Ss, Se, Ah, Al) scans.")
+
+    point_transforms = {name: np.full(block_len, -1) for name in component_names}
+    scans = []
+    for entry in script:
+        if not isinstance(entry, (list, tuple)) or len(entry) != 5:
+            raise ValueError(f"Scan {entry!r} must be a (components, Ss, Se, Ah, Al) tuple.")
+        components, ss, se, ah, al = entry
+        if isinstance(components, str):
+            components = (components,)
+        for name in components:
+            if name not in point_transforms:
+                raise ValueError(f"Scan {entry!r} names component {name!r}, expected one of {list(component_names)}.")
+        if not 0 <= ss <= se < block_len or (ss == 0 and se != 0):
+            raise ValueError(f"Scan {entry!r} has an invalid spectral band; DC scans use Ss=Se=0, "
+                             f"AC scans 1 <= Ss <= Se <= {block_len - 1}.")
+        if ss > 0 and len(components) != 1:
+            raise ValueError(f"AC scan {entry!r} must cover exactly one component.")
+        if not 0 <= al <= MAX_POINT_TRANSFORM or ah not in (0, al + 1):
+            raise ValueError(f"Scan {entry!r} has an invalid successive approximation Ah={ah}, Al={al}.")
+
+        for name in components:
+            band = point_transforms[name][ss:se + 1]
+            if ss > 0 and point_transforms[name][0] < 0:
+                raise ValueError(f"AC scan {entry!r} comes before the first DC scan of {name}.")
+            if np.any(band != (ah if ah else -1)):
+                raise ValueError(f"Scan {entry!r} does not continue the coefficients of {name} already sent.")
+            band[:] = al
+            scans.append((name, ss, se, ah, al))
+
+    for name, sent in point_transforms.items():
+        if np.any(sent != 0):
+            raise ValueError(f"Scan script leaves coefficients of {name} incomplete.")
+    return scans
+
+def _dc_first_events(dc_coeffs, al):
+    dc_diffs = dpcm_encode_intervals(dc_coeffs >> al)
+    categories = vli_category_array(dc_diffs)
+    return categories, vli_amplitude_array(dc_diffs, categories), categories
+
+def _dc_refine_events(dc_coeffs, al):
+    bits = (dc_coeffs.astype(np.int64) >> al) & 1
+    return np.full(len(bits), RAW_BITS, dtype=np.int64), bits, np.ones(len(bits), dtype=np.int64)
+
+def _eob_run_chunks(ends_early, flush_blocks, num_blocks):
+    eob_blocks = np.flatnonzero(ends_early)
+    # A pending EOB run is emitted before the next block that codes a symbol, in runs of at most MAX_EOB_RUN
+    group = np.searchsorted(flush_blocks, eob_blocks, side='right')
+    rank = np.arange(len(eob_blocks)) - np.searchsorted(group, group)
+    starts_chunk = rank % MAX_EOB_RUN == 0
+    chunk_starts = np.flatnonzero(starts_chunk)
+    run_lengths = np.diff(np.append(chunk_starts, len(eob_blocks)))
+    emit_blocks = np.append(flush_blocks, num_blocks)[group[chunk_starts]]
+    return eob_blocks, np.cumsum(starts_chunk) - 1, run_lengths, emit_blocks
+
+def _merge_events(parts):
+    sizes = [len(part[3]) for part in parts]
+    symbols, amplitudes, amplitude_lengths, keys, sub_keys = (
+        np.concatenate([np.broadcast_to(part[column], size) for part, size in zip(parts, sizes)]).astype(np.int64)
+        for column in range(5))
+    order = np.lexsort((sub_keys, keys))
+    return symbols[order], amplitudes[order], amplitude_lengths[order]
+
+def _ac_events(band, al, refine):
+    num_blocks, band_len = band.shape
+    stride = 4 * band_len + 1
+    levels = np.abs(band) >> al
+    block_idx, positions = np.nonzero(levels)
+    num_nonzero = len(block_idx)
+    coeff_values = band[block_idx, positions]
+    levels = levels[block_idx, positions]
+    is_new = levels == 1 if refine else np.ones(num_nonzero, dtype=bool)
+
+    last_new = np.full(num_blocks, -1, dtype=np.int64)
+    new_blocks, new_positions = block_idx[is_new], positions[is_new]
+    last_in_block = np.ones(len(new_blocks), dtype=bool)
+    last_in_block[:-1] = new_blocks[1:] != new_blocks[:-1]
+    last_new[new_blocks[last_in_block]] = new_positions[last_in_block]
+    active = positions <= last_new[block_idx]
+
+    # Zero runs count only coefficients that are still zero and restart after each newly coded coefficient
+    entry = np.arange(num_nonzero)
+    first_entry = np.searchsorted(block_idx, block_idx)
+    zeros_before = positions - (entry - first_entry)
+    previous_new = np.full(num_nonzero, -1, dtype=np.int64)
+    previous_new[1:] = np.maximum.accumulate(np.where(is_new, entry, -1))[:-1]
+    in_run = previous_new >= first_entry
+    run_zeros = zeros_before - np.where(in_run, zeros_before[previous_new], 0)
+    zrl_total = run_zeros // 16
+    previous_zrl = np.zeros(num_nonzero, dtype=np.int64)
+    continues_run = (block_idx[1:] == block_idx[:-1]) & ~is_new[:-1]
+    previous_zrl[1:] = np.where(continues_run, zrl_total[:-1], 0)
+    zrl_counts = np.where(active, zrl_total - previous_zrl, 0)
+
+    coeff_keys = block_idx * stride + 1 + 4 * positions
+    has_zrl = zrl_counts > 0
+    extra_zrl = np.repeat(coeff_keys, np.maximum(zrl_counts - 1, 0)) + 2
+
+    if refine:
+        categories = np.ones(int(is_new.sum()), dtype=np.int64)
+        amplitudes = (coeff_values[is_new] > 0).astype(np.int64)
+    else:
+        shifted = np.where(coeff_values < 0, -levels, levels)
+        categories = vli_category_array(shifted)
+        if len(categories) and categories.max() > 15:
+            raise ValueError("AC VLI category > 15")
+        amplitudes = vli_amplitude_array(shifted, categories)
+
+    ends_early = last_new < band_len - 1
+    eob_blocks, eob_chunk, run_lengths, emit_blocks = _eob_run_chunks(ends_early, np.flatnonzero(last_new >= 0),
+                                                                      num_blocks)
+    run_categories = vli_category_array(run_lengths) - 1
+
+    parts = [
+        (np.full(int(has_zrl.sum()), ZRL_SYMBOL), 0, 0, coeff_keys[has_zrl], 0),
+        (np.full(len(extra_zrl), ZRL_SYMBOL), 0, 0, extra_zrl, 0),
+        (((run_zeros[is_new] % 16) << 4) | categories, amplitudes, categories, coeff_keys[is_new] + 2, 0),
+        (run_categories << 4, run_lengths - (np.int64(1) << run_categories), run_categories, emit_blocks * stride,
+         2 * np.arange(len(run_lengths))),
+    ]
+
+    if refine:
+        # Correction bits for already-nonzero coefficients ride behind the next ZRL or new coefficient of the
+        # block, or behind the EOB run that covers the block when none follows
+        history = np.flatnonzero(~is_new)
+        flushes = np.where(active & (has_zrl | is_new), entry, num_nonzero)
+        next_flush = np.append(np.minimum.accumulate(flushes[::-1])[::-1][1:], num_nonzero)[history]
+        target = np.minimum(next_flush, max(num_nonzero - 1, 0))
+        flushed = (next_flush < num_nonzero) & (block_idx[target] == block_idx[history])
+        bit_keys = coeff_keys[target] + np.where(has_zrl[target], 1, 3)
+
+        tail = history[~flushed]
+        tail_chunk = eob_chunk[np.searchsorted(eob_blocks, block_idx[tail])]
+        bit_keys[~flushed] = emit_blocks[tail_chunk] * stride
+        bit_order = np.zeros(len(history), dtype=np.int64)
+        bit_order[~flushed] = 2 * tail_chunk + 1
+        parts.append((np.full(len(history), RAW_BITS), levels[history] & 1, 1, bit_keys, bit_order))
+
+    return _merge_events(parts)
+
+def scan_events(zigzag_blocks, ss, se, ah, al):
+    if ss == 0:
+        dc_coeffs = np.asarray(zigzag_blocks[:, 0], dtype=np.int32)
+        return _dc_refine_events(dc_coeffs, al) if ah else _dc_first_events(dc_coeffs, al)
+    band = np.asarray(zigzag_blocks[:, ss:se + 1], dtype=np.int64)
+    return _ac_events(band, al, refine=ah > 0)
+
+def encode_scan(zigzag_blocks, ss, se, ah, al):
+    symbols, amplitudes, amplitude_lengths = scan_events(zigzag_blocks, ss, se, ah, al)
+    coded = symbols != RAW_BITS
+    codes = np.zeros(len(symbols), dtype=np.int64)
+    code_lengths = np.zeros(len(symbols), dtype=np.int64)
+    table = None
+    if coded.any():
+        table = build_optimized_table(np.bincount(symbols[coded], minlength=256))
+        table_codes, table_lengths = table.code_arrays()
+        codes[coded] = table_codes[symbols[coded]]
+        code_lengths[coded] = table_lengths[symbols[coded]]
+
+    bit_writer = BitWriter()
+    write_codes(bit_writer, (codes << amplitude_lengths) | amplitudes, code_lengths + amplitude_lengths)
+    return table, bit_writer.get_byte_string()
+
+def _read_bit_array(bit_reader, count):
+    words = [bit_reader.read_bits(32) for _ in range(count // 32)]
+    tail_bits = count % 32
+    words.append(bit_reader.read_bits(tail_bits) << (32 - tail_bits))
+    return np.unpackbits(np.array(words, dtype='>u4').view(np.uint8))[:count]
+
+def _decode_dc_first(bit_reader, table, coefficients, al):
+    read_bits = bit_reader.read_bits
+    dc_diffs = []
+    try:
+        for _ in range(len(coefficients)):
+            category = table.decode_symbol_fast(bit_reader)
+            if category is None:
+                raise EOFError("Failed to decode DC category")
+            dc_diffs.append(decode_vli_value(category, read_bits(category)))
+    except (EOFError, ValueError):
+        pass
+    coefficients[:len(dc_diffs), 0] = np.cumsum(np.array(dc_diffs, dtype=np.int32)) << al
+
+def _decode_dc_refine(bit_reader, coefficients, al):
+    num_blocks = len(coefficients)
+    bits = _read_bit_array(bit_reader, min(num_blocks, bit_reader.bits_remaining()))
+    coefficients[:len(bits), 0] |= bits.astype(np.int32) << al
+
+def _decode_ac_first(bit_reader, table, coefficients, ss, se, al):
+    num_blocks, block_len = coefficients.shape
+    read_bits = bit_reader.read_bits
+    decode_symbol = table.decode_symbol_fast
+    indices = []
+    values = []
+    block = 0
+    try:
+        while block < num_blocks:
+            base = block * block_len
+            k = ss
+            eob_run = 1
+            while k <= se:
+                symbol = decode_symbol(bit_reader)
+                if symbol is None:
+                    raise EOFError("Failed to decode AC symbol")
+                run, size = symbol >> 4, symbol & 0x0F
+                if size:
+                    k += run
+                    if k > se:
+                        raise ValueError("AC coefficients overflow the spectral band")
+                    # Read the amplitude first so a scan cut mid-coefficient leaves no index without a value
+                    value = decode_vli_value(size, read_bits(size))
+                    indices.append(base + k)
+                    values.append(value)
+                    k += 1
+                elif run == 15:
+                    k += 16
+                else:
+                    eob_run = (1 << run) + read_bits(run)
+                    break
+            block += eob_run
+    except (EOFError, ValueError):
+        pass
+    coefficients.reshape(-1)[indices] = np.array(values, dtype=np.int32) << al
+
+def _refine_history(band, bit_reader, start, bit):
+    for k in range(start, len(band)):
+        if band[k] and bit_reader.read_bits(1):
+            band[k] += bit if band[k] > 0 else -bit
+
+def _decode_ac_refine(bit_reader, table, coefficients, ss, se, al):
+    num_blocks = len(coefficients)
+    read_bits = bit_reader.read_bits
+    decode_symbol = table.decode_symbol_fast
+    bit = 1 << al
+    band_len = se - ss + 1
+    block = 0
+    try:
+        while block < num_blocks:
+            band = coefficients[block, ss:se + 1].tolist()
+            k = 0
+            eob_run = 0
+            while k < band_len:
+                symbol = decode_symbol(bit_reader)
+                if symbol is None:
+                    raise EOFError("Failed to decode AC symbol")
+                run, size = symbol >> 4, symbol & 0x0F
+                value = 0
+                if size:
+                    if size != 1:
+                        raise ValueError(f"Invalid refinement symbol 0x{symbol:02X}")
+                    value = bit if read_bits(1) else -bit
+                elif run != 15:
+                    eob_run = (1 << run) + read_bits(run)
+                    break
+
+                # Skip `run` still-zero coefficients, refining the nonzero ones passed on the way
+                while k < band_len:
+                    if band[k]:
+                        if read_bits(1):
+                            band[k] += bit if band[k] > 0 else -bit
+                    elif run == 0:
+                        break
+                    else:
+                        run -= 1
+                    k += 1
+                if value:
+                    if k >= band_len:
+                        raise ValueError("AC coefficients overflow the spectral band")
+                    band[k] = value
+                k += 1
+
+            if eob_run:
+                _refine_history(band, bit_reader, k, bit)
+            coefficients[block, ss:se + 1] = band
+            block += 1
+            if eob_run > 1:
+                # The rest of an EOB run only carries correction bits, one per nonzero coefficient
+                run_band = coefficients[block:block + eob_run - 1, ss:se + 1]
+                rows, cols = np.nonzero(run_band)
+                refined = _read_bit_array(bit_reader, len(rows)).astype(bool)
+                rows, cols = rows[refined], cols[refined]
+                run_band[rows, cols] += np.where(run_band[rows, cols] > 0, bit, -bit)
+                block += eob_run - 1
+    except (EOFError, ValueError):
+        pass
+
+def decode_scan(payload, scan, coefficients):
+    bit_reader = BitReader(payload)
+    table = HuffmanTable(scan['huff_bits'], scan['huff_huffval']) if 'huff_bits' in scan else None
+    ss, se, ah, al = scan['ss'], scan['se'], scan['ah'], scan['al']
+    if ss == 0:
+        if ah:
+            _decode_dc_refine(bit_reader, coefficients, al)
+        else:
+            _decode_dc_first(bit_reader, table, coefficients, al)
+    elif ah:
+        _decode_ac_refine(bit_reader, table, coefficients, ss, se, al)
+    else:
+        _decode_ac_first(bit_reader, table, coefficients, ss, se, al)
+
+def decode_scans(scans, payloads, block_counts, block_len):
+    coefficients = {comp_name: np.zeros((num_blocks, block_len), dtype=np.int32)
+                    for comp_name, num_blocks in block_counts.items()}
+    for scan, payload in zip(scans, payloads):
+        decode_scan(payload, scan, coefficients[scan['component']])
+    return coefficients
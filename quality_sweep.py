@@ -0,0 +1,55 @@
+from concurrent.futures import ProcessPoolExecutor
+from compressor import load_ycbcr_planes, transform_components, encode_myjpeg_coefficients
+from quantization import adjust_quantization_matrix, validate_quality, BASE_Q_LUMINANCE, BASE_Q_CHROMINANCE
+from subsampling import get_subsampling_factors
+from restart_intervals import validate_restart_interval
+from dct import validate_dct_method
+
+_sweep_state = {}
+
+def _init_sweep_worker(coefficients, width, height, options):
+    _sweep_state['coefficients'] = coefficients
+    _sweep_state['width'] = width
+    _sweep_state['height'] = height
+    _sweep_state['options'] = options
+
+def _encode_quality(coefficients, width, height, quality, options):
+    q_y = adjust_quantization_matrix(BASE_Q_LUMINANCE, quality)
+    q_c = adjust_quantization_matrix(BASE_Q_CHROMINANCE, quality)
+    return encode_myjpeg_coefficients(coefficients, width, height, q_y, q_c, quality, verbose=False, **options)
+
+def _encode_quality_in_worker(quality):
+    return _encode_quality(_sweep_state['coefficients'], _sweep_state['width'], _sweep_state['height'],
+                           quality, _sweep_state['options'])
+
+def sweep_planes(y, chroma_planes, qualities, block_size=8, subsampling='4:2:0', optimize_huffman=False,
+                 restart_interval=0, workers=1, dct_method='float'):
+    height, width = y.shape
+    coefficients = transform_components(y, chroma_planes, block_size, dct_method)
+    options = {
+        'block_size': block_size,
+        'subsampling': subsampling,
+        'optimize_huffman': optimize_huffman,
+        'restart_interval': restart_interval,
+        'dct_method': dct_method,
+    }
+
+    qualities = list(qualities)
+    if workers > 1 and len(qualities) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep_worker,
+                                 initargs=(coefficients, width, height, options)) as pool:
+            streams = list(pool.map(_encode_quality_in_worker, qualities))
+    else:
+        streams = [_encode_quality(coefficients, width, height, quality, options) for quality in qualities]
+    return [(quality, len(data), data) for quality, data in zip(qualities, streams)]
+
+def quality_sweep(image_path, qualities, block_size=8, subsampling='4:2:0', optimize_huffman=False,
+                  restart_interval=0, workers=1, dct_method='float'):
+    get_subsampling_factors(subsampling)
+    validate_restart_interval(restart_interval)
+    validate_dct_method(dct_method, block_size)
+    for quality in qualities:
+        validate_quality(quality)
+    y, chroma_planes = load_ycbcr_planes(image_path, subsampling)
+    return sweep_planes(y, chroma_planes, qualities, block_size, subsampling, optimize_huffman, restart_interval,
+                        workers, dct_method)
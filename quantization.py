@@ -1,49 +1,90 @@
-import numpy as np
-
-BASE_Q_LUMINANCE = np.array([
-    [16, 11, 10, 16, 24, 40, 51, 61],
-    [12, 12, 14, 19, 26, 58, 60, 55],
-    [14, 13, 16, 24, 40, 57, 69, 56],
-    [14, 17, 22, 29, 51, 87, 80, 62],
-    [18, 22, 37, 56, 68, 109, 103, 77],
-    [24, 35, 55, 64, 81, 104, 113, 92],
-    [49, 64, 78, 87, 103, 121, 120, 101],
-    [72, 92, 95, 98, 112, 100, 103, 99]
-], dtype=np.uint8)
-
-BASE_Q_CHROMINANCE = np.array([
-    [17, 18, 24, 47, 99, 99, 99, 99],
-    [18, 21, 26, 66, 99, 99, 99, 99],
-    [24, 26, 56, 99, 99, 99, 99, 99],
-    [47, 66, 99, 99, 99, 99, 99, 99],
-    [99, 99, 99, 99, 99, 99, 99, 99],
-    [99, 99, 99, 99, 99, 99, 99, 99],
-    [99, 99, 99, 99, 99, 99, 99, 99],
-    [99, 99, 99, 99, 99, 99, 99, 99]
-], dtype=np.uint8)
-
-def adjust_quantization_matrix(base_matrix, quality_factor):
-    
-    base_matrix_float = base_matrix.astype(np.float64)
-
-    if quality_factor < 50:
-        scale_factor = 5000.0 / quality_factor
-    else:
-        scale_factor = 200.0 - 2.0 * quality_factor
-
-    adjusted = (base_matrix_float * scale_factor + 50.0) / 100.0
-    adjusted = np.floor(adjusted)
-    adjusted[adjusted < 1] = 1
-    adjusted[adjusted > 255] = 255
-
-    return adjusted.astype(np.uint8)
-
-def quantize(dct_block, quant_matrix):
-    
-    quantized = np.round(dct_block / quant_matrix.astype(np.float64))
-    return quantized.astype(np.int32)
-
-def dequantize(quantized_block, quant_matrix):
-    
-    dequantized = quantized_block.astype(np.float64) * quant_matrix.astype(np.float64)
-    return dequantized
+import numbers
+import numpy as np
+from functools import lru_cache
+from dct import aan_scale_factors, AAN_PASS1_BITS
+
+AAN_QUANT_BITS = 16
+
+BASE_Q_LUMINANCE = np.array([
+    [16, 11, 10, 16, 24, 40, 51, 61],
+    [12, 12, 14, 19, 26, 58, 60, 55],
+    [14, 13, 16, 24, 40, 57, 69, 56],
+    [14, 17, 22, 29, 51, 87, 80, 62],
+    [18, 22, 37, 56, 68, 109, 103, 77],
+    [24, 35, 55, 64, 81, 104, 113, 92],
+    [49, 64, 78, 87, 103, 121, 120, 101],
+    [72, 92, 95, 98, 112, 100, 103, 99]
+], dtype=np.uint8)
+
+BASE_Q_CHROMINANCE = np.array([
+    [17, 18, 24, 47, 99, 99, 99, 99],
+    [18, 21, 26, 66, 99, 99, 99, 99],
+    [24, 26, 56, 99, 99, 99, 99, 99],
+    [47, 66, 99, 99, 99, 99, 99, 99],
+    [99, 99, 99, 99, 99, 99, 99, 99],
+    [99, 99, 99, 99, 99, 99, 99, 99],
+    [99, 99, 99, 99, 99, 99, 99, 99],
+    [99, 99, 99, 99, 99, 99, 99, 99]
+], dtype=np.uint8)
+
+def validate_quality(quality):
+    if not isinstance(quality, numbers.Integral) or isinstance(quality, bool) or not 1 <= quality <= 100:
+        raise ValueError(f"Quality must be an integer between 1 and 100, got {quality!r}")
+
+def adjust_quantization_matrix(base_matrix, quality_factor):
+    
+    base_matrix_float = base_matrix.astype(np.float64)
+
+    if quality_factor < 50:
+        scale_factor = 5000.0 / quality_factor
+    else:
+        scale_factor = 200.0 - 2.0 * quality_factor
+
+    adjusted = (base_matrix_float * scale_factor + 50.0) / 100.0
+    adjusted = np.floor(adjusted)
+    adjusted[adjusted < 1] = 1
+    adjusted[adjusted > 255] = 255
+
+    return adjusted.astype(np.uint8)
+
+def estimate_quality(q_matrix, base_matrix):
+    q_matrix = np.asarray(q_matrix)
+    for quality_factor in range(1, 101):
+        if np.array_equal(adjust_quantization_matrix(base_matrix, quality_factor), q_matrix):
+            return quality_factor
+    return None
+
+def quantize(dct_block, quant_matrix):
+    
+    quantized = np.round(dct_block / quant_matrix.astype(np.float64))
+    return quantized.astype(np.int32)
+
+def dequantize(quantized_block, quant_matrix):
+    
+    dequantized = quantized_block.astype(np.float64) * quant_matrix.astype(np.float64)
+    return dequantized
+
+@lru_cache(maxsize=None)
+def _aan_tables(q_bytes):
+    q_matrix = np.frombuffer(q_bytes, dtype=np.uint16).reshape(8, 8).astype(np.float64)
+    scaled = q_matrix * aan_scale_factors()
+    reciprocals = np.round((1 << AAN_QUANT_BITS) / (scaled * 8.0)).astype(np.int32)
+    multipliers = np.round(scaled * (1 << AAN_PASS1_BITS)).astype(np.int32)
+    reciprocals.setflags(write=False)
+    multipliers.setflags(write=False)
+    return reciprocals, multipliers
+
+def aan_quantization_tables(quant_matrix):
+    return _aan_tables(np.asarray(quant_matrix, dtype=np.uint16).tobytes())
+
+def quantize_aan(dct_blocks, quant_matrix):
+    reciprocals, _ = aan_quantization_tables(quant_matrix)
+    quantized = dct_blocks * reciprocals
+    quantized += 1 << (AAN_QUANT_BITS - 1)
+    quantized >>= AAN_QUANT_BITS
+    return quantized
+
+def dequantize_aan(quantized_block, quant_matrix):
+    _, multipliers = aan_quantization_tables(quant_matrix)
+    size = quantized_block.shape[-1]
+    return quantized_block.astype(np.int32) * multipliers[:size, :size]
@@ -0,0 +1,200 @@
+import numbers
+import numpy as np
+from compressor import (transform_components, quantize_components, encode_myjpeg_coefficients, component_huffman_tables,
+                        dpcm_encode_dc, pack_myjpeg)
+from block_processing import reconstruct_blocks
+from color_conversion import ycbcr_planes_to_rgb
+from subsampling import get_subsampling_factors, subsampled_size
+from quantization import adjust_quantization_matrix, BASE_Q_LUMINANCE, BASE_Q_CHROMINANCE
+from rle import rle_encode_blocks
+from huffman_coding import symbol_codes, build_optimized_table
+from progressive import expand_scan_script, scan_events, RAW_BITS
+
+MIN_QUALITY = 1
+MAX_QUALITY = 100
+CODE_WORD_BITS = 32
+
+def _coded_bytes(values, lengths, segment_starts):
+    # Packs the code words with numpy to count the 0xFF bytes that need a stuffed zero
+    if len(values) == 0:
+        return 0
+    segment_bits = np.add.reduceat(lengths, segment_starts)
+    segment_ends = np.append(segment_starts[1:], len(values))
+    padding = (-segment_bits) % 8
+    values = np.insert(values, segment_ends, (1 << padding) - 1)
+    lengths = np.insert(lengths, segment_ends, padding)
+
+    # Left-align every code in a 32-bit word and keep its first `length` bits, in stream order
+    words = (values << (CODE_WORD_BITS - lengths)).astype('>u4')
+    word_bits = np.unpackbits(words.view(np.uint8)).reshape(-1, CODE_WORD_BITS)
+    packed = np.packbits(word_bits[np.arange(CODE_WORD_BITS) < lengths[:, np.newaxis]])
+    return len(packed) + int(np.count_nonzero(packed == 0xFF))
+
+def _sequential_sizes(zigzag_components, optimize_huffman, restart_interval):
+    component_symbols = {comp_name: rle_encode_blocks(zigzag_blocks)
+                         for comp_name, zigzag_blocks in zigzag_components.items()}
+    huffman_tables = component_huffman_tables(component_symbols, optimize_huffman)
+    data_lengths = {}
+    for comp_name, symbols in component_symbols.items():
+        values, lengths = symbol_codes(*symbols, *huffman_tables[comp_name])
+        segment_starts = np.zeros(1, dtype=np.int64)
+        if restart_interval:
+            segment_starts = np.flatnonzero(symbols[3])[::restart_interval]
+        # Each restart interval is padded to a byte and followed by a two-byte RST marker
+        data_lengths[comp_name] = _coded_bytes(values, lengths, segment_starts) + 2 * (len(segment_starts) - 1)
+    return huffman_tables, data_lengths
+
+def _scan_sizes(zigzag_components, progressive, block_size):
+    scans = []
+    for comp_name, ss, se, ah, al in expand_scan_script(progressive, list(zigzag_components), block_size * block_size):
+        symbols, amplitudes, amplitude_lengths = scan_events(zigzag_components[comp_name], ss, se, ah, al)
+        coded = symbols != RAW_BITS
+        codes = np.zeros(len(symbols), dtype=np.int64)
+        code_lengths = np.zeros(len(symbols), dtype=np.int64)
+        scan = {'component': comp_name, 'ss': ss, 'se': se, 'ah': ah, 'al': al}
+        if coded.any():
+            table = build_optimized_table(np.bincount(symbols[coded], minlength=256))
+            table_codes, table_lengths = table.code_arrays()
+            codes[coded] = table_codes[symbols[coded]]
+            code_lengths[coded] = table_lengths[symbols[coded]]
+            scan['huff_bits'], scan['huff_huffval'] = table.bits, table.huffval
+        scan['data_len'] = _coded_bytes((codes << amplitude_lengths) | amplitudes, code_lengths + amplitude_lengths,
+                                        np.zeros(1, dtype=np.int64))
+        scans.append(scan)
+    return scans
+
+def estimate_myjpeg_size(zigzag_components, padded_dims, width, height, quality, q_y, q_c, block_size=8,
+                         subsampling='4:2:0', optimize_huffman=False, restart_interval=0, row_index=False,
+                         progressive=False):
+    if progressive:
+        scans = _scan_sizes(zigzag_components, progressive, block_size)
+        header = pack_myjpeg(width, height, quality, block_size, subsampling, q_y, q_c, padded_dims, {},
+                             [b''] * len(scans), scans=scans)
+        return len(header) + sum(scan['data_len'] for scan in scans)
+
+    zigzag_components = {comp_name: zigzag_blocks.copy() for comp_name, zigzag_blocks in zigzag_components.items()}
+    for zigzag_blocks in zigzag_components.values():
+        zigzag_blocks[:, 0] = dpcm_encode_dc(zigzag_blocks[:, 0], restart_interval)
+    huffman_tables, data_lengths = _sequential_sizes(zigzag_components, optimize_huffman, restart_interval)
+
+    # The header only depends on how many offsets and index rows there are, not their values
+    restart_offsets = None
+    if restart_interval:
+        restart_offsets = {comp_name: [0] * -(-len(zigzag_blocks) // restart_interval)
+                           for comp_name, zigzag_blocks in zigzag_components.items()}
+    row_positions = None
+    if row_index:
+        row_positions = {comp_name: [[0, 0]] * (padded_h // block_size)
+                         for comp_name, (padded_h, _) in padded_dims.items()}
+    header = pack_myjpeg(width, height, quality, block_size, subsampling, q_y, q_c, padded_dims, huffman_tables,
+                         {comp_name: b'' for comp_name in zigzag_components}, restart_interval, restart_offsets,
+                         row_positions)
+    return len(header) + sum(data_lengths.values())
+
+def reconstruction_psnr(zigzag_components, padded_dims, q_y, q_c, pixels, block_size=8, subsampling='4:2:0',
+                        dct_method='float'):
+    # Same dequantize/IDCT/colour path as decode_myjpeg, minus the entropy decoding
+    q_tables = {'Y': q_y, 'Cb': q_c, 'Cr': q_c}
+    planes = {}
+    for comp_name, zigzag_blocks in zigzag_components.items():
+        padded_h, padded_w = padded_dims[comp_name]
+        planes[comp_name] = reconstruct_blocks(zigzag_blocks, q_tables[comp_name], block_size, padded_h // block_size,
+                                               padded_w // block_size, dct_method=dct_method)
+    height, width = pixels.shape[:2]
+    if 'Cb' in planes:
+        factor_v, factor_h = get_subsampling_factors(subsampling)
+        chroma_height, chroma_width = subsampled_size(height, width, subsampling)
+        decoded = ycbcr_planes_to_rgb(planes['Y'][:height, :width], planes['Cb'][:chroma_height, :chroma_width],
+                                      planes['Cr'][:chroma_height, :chroma_width], factor_v, factor_h)
+    else:
+        decoded = planes['Y'][:height, :width]
+    mse = np.mean((decoded.astype(np.float64) - pixels) ** 2)
+    return 10 * np.log10(255.0 ** 2 / mse) if mse else float('inf')
+
+class RateController:
+    def __init__(self, pixels, y, chroma_planes, block_size=8, subsampling='4:2:0', optimize_huffman=False,
+                 restart_interval=0, row_index=False, dct_method='float', progressive=False):
+        self.pixels = pixels
+        self.height, self.width = y.shape
+        self.coefficients = transform_components(y, chroma_planes, block_size, dct_method)
+        self.options = {
+            'block_size': block_size,
+            'subsampling': subsampling,
+            'optimize_huffman': optimize_huffman,
+            'restart_interval': restart_interval,
+            'row_index': row_index,
+            'dct_method': dct_method,
+            'progressive': progressive,
+        }
+
+    def _quantize(self, quality):
+        q_y = adjust_quantization_matrix(BASE_Q_LUMINANCE, quality)
+        q_c = adjust_quantization_matrix(BASE_Q_CHROMINANCE, quality)
+        zigzag_components, padded_dims = quantize_components(self.coefficients, q_y, q_c, self.options['block_size'],
+                                                             self.options['dct_method'])
+        return zigzag_components, padded_dims, q_y, q_c
+
+    def estimate_size(self, quality):
+        zigzag_components, padded_dims, q_y, q_c = self._quantize(quality)
+        options = self.options
+        return estimate_myjpeg_size(zigzag_components, padded_dims, self.width, self.height, quality, q_y, q_c,
+                                    options['block_size'], options['subsampling'], options['optimize_huffman'],
+                                    options['restart_interval'], options['row_index'], options['progressive'])
+
+    def psnr(self, quality):
+        zigzag_components, padded_dims, q_y, q_c = self._quantize(quality)
+        return reconstruction_psnr(zigzag_components, padded_dims, q_y, q_c, self.pixels, self.options['block_size'],
+                                   self.options['subsampling'], self.options['dct_method'])
+
+    def encode(self, quality, verbose=False):
+        q_y = adjust_quantization_matrix(BASE_Q_LUMINANCE, quality)
+        q_c = adjust_quantization_matrix(BASE_Q_CHROMINANCE, quality)
+        return encode_myjpeg_coefficients(self.coefficients, self.width, self.height, q_y, q_c, quality,
+                                          verbose=verbose, **self.options)
+
+    def search(self, meets_target, prefer_high):
+        # Highest (or lowest) quality that meets the target, assuming the measure is monotonic in quality
+        low, high = MIN_QUALITY, MAX_QUALITY
+        best = None
+        while low <= high:
+            quality = (low + high) // 2
+            if meets_target(quality):
+                best = quality
+                if prefer_high:
+                    low = quality + 1
+                else:
+                    high = quality - 1
+            elif prefer_high:
+                high = quality - 1
+            else:
+                low = quality + 1
+        return best
+
+    def fit_bytes(self, target_bytes, verbose=False):
+        # The size estimate matches the encoder byte for byte, so only the winner is encoded
+        quality = self.search(lambda q: self.estimate_size(q) <= target_bytes, prefer_high=True) or MIN_QUALITY
+        data = self.encode(quality)
+        if verbose:
+            fits = "" if len(data) <= target_bytes else " (lowest quality, still over target)"
+            print(f"Rate control: quality {quality}, {len(data)} bytes for a {target_bytes} byte target{fits}")
+        return quality, data
+
+    def fit_psnr(self, target_psnr, verbose=False):
+        quality = self.search(lambda q: self.psnr(q) >= target_psnr, prefer_high=False) or MAX_QUALITY
+        data = self.encode(quality)
+        if verbose:
+            psnr = self.psnr(quality)
+            fits = "" if psnr >= target_psnr else " (highest quality, still under target)"
+            print(f"Rate control: quality {quality}, {psnr:.2f}dB for a {target_psnr}dB target, "
+                  f"{len(data)} bytes{fits}")
+        return quality, data
+
+def validate_rate_targets(target_bytes, target_psnr):
+    if target_bytes is not None and target_psnr is not None:
+        raise ValueError("Specify at most one of target_bytes and target_psnr.")
+    if target_bytes is not None and (not isinstance(target_bytes, numbers.Integral) or isinstance(target_bytes, bool)
+                                     or target_bytes <= 0):
+        raise ValueError(f"target_bytes must be a positive integer, got {target_bytes!r}")
+    if target_psnr is not None and (not isinstance(target_psnr, numbers.Real) or isinstance(target_psnr, bool)
+                                    or not target_psnr > 0):
+        raise ValueError(f"target_psnr must be a positive number of dB, got {target_psnr!r}")
@@ -0,0 +1,214 @@
+import math
+import numpy as np
+from decompressor import map_file, split_myjpeg, component_specs, reconstruct_blocks
+from huffman_coding import BitReader, decode_block_into
+from row_index import unpack_row_position
+from subsampling import get_subsampling_factors, subsampled_size, upsample_channel_by_factors
+from color_conversion import ycbcr_planes_to_rgb
+
+class ComponentRowDecoder:
+    def __init__(self, data, dc_table, ac_table, block_size, blocks_per_row, restart_interval=0, restart_offsets=None,
+                 row_index=None):
+        self.data = memoryview(data)
+        self.dc_table = dc_table
+        self.ac_table = ac_table
+        self.block_size = block_size
+        self.blocks_per_row = blocks_per_row
+        self.restart_interval = restart_interval
+        self.restart_offsets = restart_offsets
+        self.row_index = row_index
+        self._start_at(0, 0, 0, 0)
+
+    def _start_at(self, block_index, byte_offset, bit_offset, predictor):
+        self.bit_reader = BitReader(self.data[byte_offset:])
+        self.bit_reader.skip_bits(bit_offset)
+        self.block_index = block_index
+        self.predictor = predictor
+
+    def seek_row(self, row):
+        target = row * self.blocks_per_row
+        if target == self.block_index:
+            return
+        if self.row_index:
+            byte_offset, bit_offset = unpack_row_position(self.row_index[row][0])
+            self._start_at(target, byte_offset, bit_offset, self.row_index[row][1])
+            return
+        if self.restart_interval:
+            interval_start = target - target % self.restart_interval
+            if interval_start > self.block_index or target < self.block_index:
+                self._start_at(interval_start, self.restart_offsets[interval_start // self.restart_interval], 0, 0)
+        elif target < self.block_index:
+            self._start_at(0, 0, 0, 0)
+        self._decode(target - self.block_index)
+
+    def _decode(self, num_blocks, keep=False):
+        block_len = self.block_size * self.block_size
+        zigzag_blocks = np.zeros((num_blocks, block_len), dtype=np.int32) if keep else None
+        indices = []
+        values = []
+        try:
+            for block in range(num_blocks):
+                if self.restart_interval and self.block_index % self.restart_interval == 0 and self.block_index:
+                    interval = self.block_index // self.restart_interval
+                    self._start_at(self.block_index, self.restart_offsets[interval], 0, 0)
+                base = block * block_len if keep else 0
+                self.predictor += decode_block_into(self.bit_reader, self.dc_table, self.ac_table, block_len, base,
+                                                    indices, values)
+                self.block_index += 1
+                if keep:
+                    indices.append(base)
+                    values.append(self.predictor)
+                else:
+                    indices.clear()
+                    values.clear()
+        except (EOFError, ValueError):
+            pass
+        if keep:
+            zigzag_blocks.reshape(-1)[indices] = values
+        return zigzag_blocks
+
+    def decode_rows(self, num_rows):
+        return self._decode(num_rows * self.blocks_per_row, keep=True)
+
+class _PlaneRows:
+    def __init__(self, decoder, q_matrix, block_size, height, width, col_start, col_end, dct_method='float'):
+        self.decoder = decoder
+        self.dct_method = dct_method
+        self.q_matrix = q_matrix
+        self.block_size = block_size
+        self.height = height
+        self.width = width
+        self.block_rows = math.ceil(height / block_size)
+        self.block_col_start = col_start // block_size
+        self.block_col_end = math.ceil(col_end / block_size)
+        self.pixel_col_start = self.block_col_start * block_size
+        self.next_row = None
+
+    def read(self, block_row_start, block_row_end):
+        block_row_end = min(block_row_end, self.block_rows)
+        if block_row_start >= block_row_end:
+            return np.zeros((0, min(self.width, self.block_col_end * self.block_size) - self.pixel_col_start),
+                            dtype=np.uint8)
+        if self.next_row != block_row_start:
+            self.decoder.seek_row(block_row_start)
+        num_rows = block_row_end - block_row_start
+        zigzag_blocks = self.decoder.decode_rows(num_rows)
+        self.next_row = block_row_end
+
+        num_cols = self.block_col_end - self.block_col_start
+        zigzag_blocks = zigzag_blocks.reshape(num_rows, -1, zigzag_blocks.shape[1])
+        zigzag_blocks = zigzag_blocks[:, self.block_col_start:self.block_col_end].reshape(num_rows * num_cols, -1)
+        plane = reconstruct_blocks(zigzag_blocks, self.q_matrix, self.block_size, num_rows, num_cols,
+                                   dct_method=self.dct_method)
+        row_limit = self.height - block_row_start * self.block_size
+        col_limit = self.width - self.pixel_col_start
+        return plane[:row_limit, :col_limit]
+
+def _component_rows(metadata, payloads, left, right, fancy_upsampling, dct_method='float'):
+    if 'scans' in metadata:
+        raise ValueError("Region and strip decoding need a sequential file; this one is progressive.")
+    block_size = metadata['block_size']
+    width = metadata['original_width']
+    height = metadata['original_height']
+    subsampling = metadata.get('subsampling', '4:2:0')
+    _, factor_h = get_subsampling_factors(subsampling)
+    chroma_height, chroma_width = subsampled_size(height, width, subsampling)
+    restart_interval = metadata.get('restart_interval', 0)
+
+    margin = 1 if fancy_upsampling else 0
+    chroma_left = max(left // factor_h - margin, 0)
+    chroma_right = min(math.ceil(right / factor_h) + margin, chroma_width)
+    planes = {}
+    for comp_name, (dc_table, ac_table, q_matrix, (_, padded_w), restart_offsets, row_index) in \
+            component_specs(metadata).items():
+        decoder = ComponentRowDecoder(payloads[comp_name], dc_table, ac_table, block_size, padded_w // block_size,
+                                      restart_interval, restart_offsets, row_index)
+        if comp_name == 'Y':
+            planes[comp_name] = _PlaneRows(decoder, q_matrix, block_size, height, width, left, right, dct_method)
+        else:
+            planes[comp_name] = _PlaneRows(decoder, q_matrix, block_size, chroma_height, chroma_width,
+                                           chroma_left, chroma_right, dct_method)
+    return planes
+
+def _iter_strips(metadata, payloads, first_strip, last_strip, left, right, fancy_upsampling, dct_method='float'):
+    height = metadata['original_height']
+    factor_v, factor_h = get_subsampling_factors(metadata.get('subsampling', '4:2:0'))
+    strip_height = metadata['block_size'] * factor_v
+    planes = _component_rows(metadata, payloads, left, right, fancy_upsampling, dct_method)
+    chroma_names = [comp_name for comp_name in planes if comp_name != 'Y']
+
+    context = {}
+    lookahead = {}
+    for comp_name in chroma_names:
+        context[comp_name] = None
+        if fancy_upsampling and first_strip > 0:
+            context[comp_name] = planes[comp_name].read(first_strip - 1, first_strip)[-1:]
+
+    for strip in range(first_strip, last_strip):
+        row_start = strip * strip_height
+        row_end = min(row_start + strip_height, height)
+        y_rows = planes['Y'].read(strip * factor_v, (strip + 1) * factor_v)
+        y_rows = y_rows[:, left - planes['Y'].pixel_col_start:right - planes['Y'].pixel_col_start]
+        if not chroma_names:
+            yield row_start, y_rows
+            continue
+
+        chroma = []
+        for comp_name in chroma_names:
+            plane = planes[comp_name]
+            current = lookahead.pop(comp_name, None)
+            if current is None:
+                current = plane.read(strip, strip + 1)
+            window = [current]
+            context_rows = 0
+            if context[comp_name] is not None:
+                window.insert(0, context[comp_name])
+                context_rows = 1
+            if fancy_upsampling and strip + 1 < plane.block_rows:
+                lookahead[comp_name] = plane.read(strip + 1, strip + 2)
+                window.append(lookahead[comp_name][:1])
+            context[comp_name] = current[-1:] if fancy_upsampling else None
+
+            window = np.concatenate(window)
+            upsampled = upsample_channel_by_factors(window, window.shape[0] * factor_v, window.shape[1] * factor_h,
+                                                    factor_v, factor_h, fancy=fancy_upsampling)
+            row_offset = context_rows * factor_v
+            col_offset = left - plane.pixel_col_start * factor_h
+            chroma.append(upsampled[row_offset:row_offset + row_end - row_start,
+                                    col_offset:col_offset + right - left])
+
+        yield row_start, ycbcr_planes_to_rgb(y_rows, chroma[0], chroma[1])
+
+def decode_strips(input_path, fancy_upsampling=False, dct_method='float'):
+    with map_file(input_path) as data:
+        metadata, payloads = split_myjpeg(data)
+        factor_v, _ = get_subsampling_factors(metadata.get('subsampling', '4:2:0'))
+        num_strips = math.ceil(metadata['original_height'] / (metadata['block_size'] * factor_v))
+        try:
+            yield from _iter_strips(metadata, payloads, 0, num_strips, 0, metadata['original_width'],
+                                    fancy_upsampling, dct_method)
+        finally:
+            # The payloads are views into the mapping, which can only be closed once they are gone
+            del payloads
+
+def decode_region(input_path, left, top, width, height, fancy_upsampling=False, dct_method='float'):
+    with map_file(input_path) as data:
+        metadata, payloads = split_myjpeg(data)
+        image_width = metadata['original_width']
+        image_height = metadata['original_height']
+        if width <= 0 or height <= 0 or left < 0 or top < 0 or left + width > image_width or \
+                top + height > image_height:
+            raise ValueError(f"Region ({left}, {top}, {width}, {height}) is outside the "
+                             f"{image_width}x{image_height} image")
+
+        factor_v, _ = get_subsampling_factors(metadata.get('subsampling', '4:2:0'))
+        strip_height = metadata['block_size'] * factor_v
+        first_strip = top // strip_height
+        last_strip = math.ceil((top + height) / strip_height)
+        strips = [rows for _, rows in _iter_strips(metadata, payloads, first_strip, last_strip, left, left + width,
+                                                   fancy_upsampling, dct_method)]
+        # The payloads are views into the mapping, which can only be closed once they are gone
+        del payloads
+    region = np.concatenate(strips)
+    row_offset = top - first_strip * strip_height
+    return region[row_offset:row_offset + height]
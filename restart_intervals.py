@@ -0,0 +1,105 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from huffman_coding import BitWriter, symbol_codes, write_codes, huffman_decode_blocks
+
+RST0 = 0xD0
+NUM_RST_MARKERS = 8
+TASKS_PER_WORKER = 4
+
+def validate_restart_interval(restart_interval):
+    if not isinstance(restart_interval, int) or restart_interval < 0:
+        raise ValueError(f"restart_interval must be a non-negative integer, got {restart_interval!r}")
+    if restart_interval > 0xFFFF:
+        raise ValueError("restart_interval must fit in 16 bits")
+
+def restart_marker(interval_index):
+    return bytes([0xFF, RST0 + interval_index % NUM_RST_MARKERS])
+
+def dpcm_encode_intervals(dc_coeffs, restart_interval=0):
+    dc_coeffs = np.asarray(dc_coeffs, dtype=np.int32)
+    dc_diffs = np.diff(dc_coeffs, prepend=np.int32(0))
+    if restart_interval:
+        dc_diffs[::restart_interval] = dc_coeffs[::restart_interval]
+    return dc_diffs
+
+def dpcm_decode_intervals(dc_diffs, restart_interval=0):
+    dc_values = np.cumsum(np.asarray(dc_diffs, dtype=np.int32), dtype=np.int32)
+    if restart_interval and len(dc_values) > restart_interval:
+        interval_bases = np.concatenate(([0], dc_values[restart_interval - 1:-1:restart_interval]))
+        dc_values -= np.repeat(interval_bases, restart_interval)[:len(dc_values)]
+    return dc_values
+
+def split_groups(num_items, workers):
+    num_groups = min(num_items, max(1, workers * TASKS_PER_WORKER if workers > 1 else 1))
+    return np.linspace(0, num_items, num_groups + 1).astype(np.int64)
+
+def run_groups(func, group_args, workers):
+    if workers > 1 and len(group_args) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(func, *zip(*group_args)))
+    return [func(*args) for args in group_args]
+
+def encode_interval_segments(values, lengths, bounds):
+    segments = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        bit_writer = BitWriter()
+        write_codes(bit_writer, values[start:end], lengths[start:end])
+        segments.append(bit_writer.get_byte_string())
+    return segments
+
+def encode_code_intervals(values, lengths, bounds, workers=1):
+    bounds = np.asarray(bounds, dtype=np.int64)
+    group_edges = split_groups(len(bounds) - 1, workers)
+    group_args = []
+    for first, last in zip(group_edges[:-1], group_edges[1:]):
+        start, end = bounds[first], bounds[last]
+        group_args.append((values[start:end], lengths[start:end], bounds[first:last + 1] - start))
+
+    segments = []
+    for group_segments in run_groups(encode_interval_segments, group_args, workers):
+        segments.extend(group_segments)
+    return segments
+
+def join_intervals(segments):
+    output = bytearray()
+    offsets = []
+    for interval_index, segment in enumerate(segments):
+        if interval_index:
+            output += restart_marker(interval_index - 1)
+        offsets.append(len(output))
+        output += segment
+    return bytes(output), offsets
+
+def huffman_encode_intervals(symbols, amplitudes, amplitude_lengths, is_dc, dc_table, ac_table,
+                             restart_interval, workers=1):
+    values, lengths = symbol_codes(symbols, amplitudes, amplitude_lengths, is_dc, dc_table, ac_table)
+    block_starts = np.flatnonzero(is_dc)
+    bounds = np.append(block_starts[::restart_interval], len(values))
+    return join_intervals(encode_code_intervals(values, lengths, bounds, workers))
+
+def _decode_interval_group(byte_data, offsets, block_counts, dc_table, ac_table, block_size, num_coefficients=None):
+    ends = list(offsets[1:]) + [len(byte_data)]
+    return np.concatenate([
+        huffman_decode_blocks(byte_data[start:end], dc_table, ac_table, count, block_size,
+                              num_coefficients=num_coefficients)
+        for start, end, count in zip(offsets, ends, block_counts)
+    ])
+
+def huffman_decode_intervals(byte_data, offsets, dc_table, ac_table, num_blocks, restart_interval,
+                             block_size=8, workers=1, num_coefficients=None):
+    num_intervals = len(offsets)
+    expected_intervals = -(-num_blocks // restart_interval)
+    if num_intervals != expected_intervals:
+        raise ValueError(f"Restart index has {num_intervals} intervals, expected {expected_intervals}")
+    block_counts = [restart_interval] * num_intervals
+    block_counts[-1] = num_blocks - restart_interval * (num_intervals - 1)
+
+    offsets = list(offsets) + [len(byte_data)]
+    group_edges = split_groups(num_intervals, workers)
+    group_args = []
+    for first, last in zip(group_edges[:-1], group_edges[1:]):
+        start, end = offsets[first], offsets[last]
+        group_data = bytes(byte_data[start:end]) if workers > 1 else byte_data[start:end]
+        group_args.append((group_data, [offset - start for offset in offsets[first:last]],
+                           block_counts[first:last], dc_table, ac_table, block_size, num_coefficients))
+    return np.concatenate(run_groups(_decode_interval_group, group_args, workers))
@@ -1,41 +1,108 @@
-def rle_encode_ac_coefficients(ac_coeffs):
-    rle = []
-    zero_run = 0
-
-    for coeff in ac_coeffs:
-        if coeff == 0:
-            zero_run += 1
-            if zero_run == 16:
-                rle.append((15, 0))  
-                zero_run = 0
-        else:
-            rle.append((zero_run, coeff))
-            zero_run = 0
-
-    rle.append((0, 0))  
-    return rle
-
-def rle_decode_ac_coefficients(rle_encoded, num_ac_coeffs=63):
-    ac_coeffs = []
-    for run_length, value in rle_encoded:
-        if run_length == 0 and value == 0:
-            
-            remaining = num_ac_coeffs - len(ac_coeffs)
-            ac_coeffs.extend([0] * remaining)
-            break
-        elif run_length == 15 and value == 0:
-            
-            ac_coeffs.extend([0] * 16)
-        else:
-            ac_coeffs.extend([0] * run_length)
-            ac_coeffs.append(value)
-
-        if len(ac_coeffs) >= num_ac_coeffs:
-            ac_coeffs = ac_coeffs[:num_ac_coeffs]
-            break
-
-    
-    if len(ac_coeffs) < num_ac_coeffs:
-        ac_coeffs.extend([0] * (num_ac_coeffs - len(ac_coeffs)))
-
-    return ac_coeffs
+import numpy as np
+from vli_coding import vli_category_array, vli_amplitude_array
+
+def rle_encode_ac_coefficients(ac_coeffs):
+    rle = []
+    zero_run = 0
+
+    for coeff in ac_coeffs:
+        if coeff == 0:
+            zero_run += 1
+            if zero_run == 16:
+                rle.append((15, 0))  
+                zero_run = 0
+        else:
+            rle.append((zero_run, coeff))
+            zero_run = 0
+
+    rle.append((0, 0))  
+    return rle
+
+def rle_decode_ac_coefficients(rle_encoded, num_ac_coeffs=63):
+    ac_coeffs = []
+    for run_length, value in rle_encoded:
+        if run_length == 0 and value == 0:
+            
+            remaining = num_ac_coeffs - len(ac_coeffs)
+            ac_coeffs.extend([0] * remaining)
+            break
+        elif run_length == 15 and value == 0:
+            
+            ac_coeffs.extend([0] * 16)
+        else:
+            ac_coeffs.extend([0] * run_length)
+            ac_coeffs.append(value)
+
+        if len(ac_coeffs) >= num_ac_coeffs:
+            ac_coeffs = ac_coeffs[:num_ac_coeffs]
+            break
+
+    
+    if len(ac_coeffs) < num_ac_coeffs:
+        ac_coeffs.extend([0] * (num_ac_coeffs - len(ac_coeffs)))
+
+    return ac_coeffs
+
+def rle_encode_blocks(zigzag_blocks, baseline=False):
+    zigzag_blocks = np.asarray(zigzag_blocks, dtype=np.int64)
+    num_blocks, block_len = zigzag_blocks.shape
+    num_ac = block_len - 1
+    ac = zigzag_blocks[:, 1:]
+
+    block_idx, positions = np.nonzero(ac)
+    values = ac[block_idx, positions]
+    first_in_block = np.ones(len(block_idx), dtype=bool)
+    first_in_block[1:] = block_idx[1:] != block_idx[:-1]
+    last_in_block = np.ones(len(block_idx), dtype=bool)
+    last_in_block[:-1] = first_in_block[1:]
+
+    previous = np.empty_like(positions)
+    previous[1:] = positions[:-1]
+    previous[first_in_block] = -1
+    runs = positions - previous - 1
+
+    last_position = np.full(num_blocks, -1, dtype=np.int64)
+    last_position[block_idx[last_in_block]] = positions[last_in_block]
+    if baseline:
+        trailing_zeros = np.zeros(num_blocks, dtype=np.int64)
+        eob_blocks = np.flatnonzero(last_position < num_ac - 1)
+    else:
+        trailing_zeros = num_ac - 1 - last_position
+        eob_blocks = np.arange(num_blocks, dtype=np.int64)
+    num_eob = len(eob_blocks)
+
+    dc_values = zigzag_blocks[:, 0]
+    dc_categories = vli_category_array(dc_values)
+    ac_categories = vli_category_array(values)
+    if len(ac_categories) and ac_categories.max() > 15:
+        raise ValueError("AC VLI category > 15")
+
+    block_stride = num_ac + 2
+    event_keys = np.concatenate((
+        np.arange(num_blocks, dtype=np.int64) * block_stride,
+        block_idx * block_stride + positions + 1,
+        eob_blocks * block_stride + num_ac + 1,
+    ))
+    event_zrl = np.concatenate((np.zeros(num_blocks, dtype=np.int64), runs // 16, trailing_zeros[eob_blocks] // 16))
+    event_symbols = np.concatenate((dc_categories, ((runs % 16) << 4) | ac_categories, np.zeros(num_eob, dtype=np.int64)))
+    event_amplitudes = np.concatenate((
+        vli_amplitude_array(dc_values, dc_categories),
+        vli_amplitude_array(values, ac_categories),
+        np.zeros(num_eob, dtype=np.int64),
+    ))
+    event_lengths = np.concatenate((dc_categories, ac_categories, np.zeros(num_eob, dtype=np.int64)))
+    event_is_dc = np.zeros(len(event_keys), dtype=bool)
+    event_is_dc[:num_blocks] = True
+
+    order = np.argsort(event_keys, kind='stable')
+    counts = event_zrl[order] + 1
+    event_of_symbol = np.repeat(order, counts)
+    starts = np.cumsum(counts) - counts
+    offset_in_event = np.arange(counts.sum()) - np.repeat(starts, counts)
+    is_zrl = offset_in_event < event_zrl[event_of_symbol]
+
+    symbols = np.where(is_zrl, 0xF0, event_symbols[event_of_symbol])
+    amplitudes = np.where(is_zrl, 0, event_amplitudes[event_of_symbol])
+    amplitude_lengths = np.where(is_zrl, 0, event_lengths[event_of_symbol])
+    is_dc = event_is_dc[event_of_symbol]
+    return symbols, amplitudes, amplitude_lengths, is_dc
@@ -0,0 +1,42 @@
+import numpy as np
+from rle import rle_encode_blocks
+from huffman_coding import symbol_codes
+from restart_intervals import dpcm_decode_intervals
+
+def _data_byte_positions(payload):
+    data = np.frombuffer(payload, dtype=np.uint8)
+    stuffed = np.flatnonzero((data[:-1] == 0xFF) & (data[1:] == 0x00)) + 1
+    return np.delete(np.arange(len(data)), stuffed)
+
+def pack_row_position(byte_offset, bit_offset):
+    return (byte_offset << 3) | bit_offset
+
+def unpack_row_position(position):
+    return position >> 3, position & 7
+
+def block_row_index(payload, zigzag_blocks, dc_table, ac_table, blocks_per_row, restart_interval=0,
+                    restart_offsets=None):
+    symbols = rle_encode_blocks(zigzag_blocks)
+    _, lengths = symbol_codes(*symbols, dc_table, ac_table)
+    block_bits = np.add.reduceat(lengths, np.flatnonzero(symbols[3]))
+    bits_before_block = np.concatenate(([0], np.cumsum(block_bits)))
+
+    row_blocks = np.arange(0, len(zigzag_blocks), blocks_per_row)
+    if restart_interval:
+        intervals = row_blocks // restart_interval
+        segment_starts = np.asarray(restart_offsets, dtype=np.int64)[intervals]
+        relative_bits = bits_before_block[row_blocks] - bits_before_block[intervals * restart_interval]
+    else:
+        segment_starts = np.zeros(len(row_blocks), dtype=np.int64)
+        relative_bits = bits_before_block[row_blocks]
+
+    data_positions = _data_byte_positions(payload)
+    data_index = np.searchsorted(data_positions, segment_starts) + (relative_bits >> 3)
+    byte_offsets = data_positions[np.minimum(data_index, len(data_positions) - 1)]
+    positions = pack_row_position(byte_offsets, relative_bits & 7)
+
+    dc_values = dpcm_decode_intervals(zigzag_blocks[:, 0], restart_interval)
+    predictors = np.where(row_blocks > 0, dc_values[np.maximum(row_blocks - 1, 0)], 0)
+    if restart_interval:
+        predictors[row_blocks % restart_interval == 0] = 0
+    return [[int(position), int(predictor)] for position, predictor in zip(positions, predictors)]
@@ -0,0 +1,189 @@
+import math
+import os
+import shutil
+import tempfile
+import numpy as np
+from PIL import Image
+from container import write_header
+from color_conversion import rgb_to_ycbcr
+from subsampling import downsample_channel, get_subsampling_factors, subsampled_size
+from quantization import adjust_quantization_matrix, validate_quality, BASE_Q_LUMINANCE, BASE_Q_CHROMINANCE
+from rle import rle_encode_blocks
+from huffman_coding import BitWriter, symbol_codes, write_codes
+from restart_intervals import restart_marker, validate_restart_interval
+from row_index import pack_row_position
+from dct import validate_dct_method
+from compressor import quantize_channel_blocks, select_huffman_tables, myjpeg_metadata, GRAYSCALE_MODES
+
+def open_image_source(source):
+    if isinstance(source, np.ndarray):
+        array = source
+    elif str(source).endswith('.npy'):
+        array = np.load(source, mmap_mode='r')
+    else:
+        img = Image.open(source)
+        width, height = img.size
+        mode = 'L' if img.mode in GRAYSCALE_MODES else 'RGB'
+
+        def read_rows(row_start, row_end):
+            strip = img.crop((0, row_start, width, row_end))
+            return np.asarray(strip if strip.mode == mode else strip.convert(mode))
+
+        return height, width, mode == 'L', read_rows
+
+    if array.ndim not in (2, 3) or (array.ndim == 3 and array.shape[2] != 3):
+        raise ValueError("Input array must have shape (H, W) or (H, W, 3).")
+
+    def read_rows(row_start, row_end):
+        return np.asarray(array[row_start:row_end], dtype=np.uint8)
+
+    return array.shape[0], array.shape[1], array.ndim == 2, read_rows
+
+class ComponentStreamWriter:
+    def __init__(self, output, dc_table, ac_table, restart_interval=0, blocks_per_row=None):
+        self.output = output
+        self.dc_table = dc_table
+        self.ac_table = ac_table
+        self.restart_interval = restart_interval
+        self.bit_writer = BitWriter()
+        self.predictor = 0
+        self.block_index = 0
+        self.bytes_written = 0
+        self.restart_offsets = [0] if restart_interval else None
+        self.blocks_per_row = blocks_per_row
+        self.row_index = [] if blocks_per_row else None
+
+    def _write(self, data):
+        self.output.write(data)
+        self.bytes_written += len(data)
+
+    def _end_interval(self):
+        self._write(self.bit_writer.get_byte_string())
+        self._write(restart_marker(len(self.restart_offsets) - 1))
+        self.restart_offsets.append(self.bytes_written)
+        self.bit_writer = BitWriter()
+
+    def _record_row(self, predictor):
+        byte_count, bit_count = self.bit_writer.bit_position()
+        self.row_index.append([pack_row_position(self.bytes_written + byte_count, bit_count), predictor])
+
+    def write_blocks(self, zigzag_blocks):
+        num_blocks = len(zigzag_blocks)
+        if num_blocks == 0:
+            return
+        block_indices = self.block_index + np.arange(num_blocks)
+        dc_values = zigzag_blocks[:, 0].astype(np.int32)
+        predictors = np.concatenate(([self.predictor], dc_values[:-1]))
+        resets = np.zeros(num_blocks, dtype=bool)
+        if self.restart_interval:
+            resets = block_indices % self.restart_interval == 0
+            predictors[resets] = 0
+        self.predictor = int(dc_values[-1])
+        zigzag_blocks[:, 0] = dc_values - predictors
+
+        symbols = rle_encode_blocks(zigzag_blocks)
+        values, lengths = symbol_codes(*symbols, self.dc_table, self.ac_table)
+        row_starts = np.zeros(num_blocks, dtype=bool)
+        if self.blocks_per_row:
+            row_starts = block_indices % self.blocks_per_row == 0
+        block_starts = np.flatnonzero(symbols[3])
+        start = 0
+        for block in np.flatnonzero((resets & (block_indices > 0)) | row_starts).tolist():
+            boundary = block_starts[block]
+            write_codes(self.bit_writer, values[start:boundary], lengths[start:boundary])
+            if resets[block] and block_indices[block] > 0:
+                self._end_interval()
+            if row_starts[block]:
+                self._record_row(int(predictors[block]))
+            start = boundary
+        write_codes(self.bit_writer, values[start:], lengths[start:])
+        self.block_index += num_blocks
+        self._write(self.bit_writer.take_bytes())
+
+    def finish(self):
+        self._write(self.bit_writer.get_byte_string())
+
+def compress_image_streaming(source, output_path, quality=75, block_size=8, subsampling='4:2:0', restart_interval=0,
+                             strip_mcu_rows=1, row_index=False, dct_method='float'):
+    description = f"array {source.shape}" if isinstance(source, np.ndarray) else source
+    print(f"Streaming compression of {description} with quality {quality}...")
+    validate_quality(quality)
+    factor_v, factor_h = get_subsampling_factors(subsampling)
+    validate_restart_interval(restart_interval)
+    validate_dct_method(dct_method, block_size)
+    if strip_mcu_rows < 1:
+        raise ValueError("strip_mcu_rows must be at least 1")
+
+    height, width, grayscale, read_rows = open_image_source(source)
+    chroma_height, chroma_width = subsampled_size(height, width, subsampling)
+    strip_rows = block_size * factor_v * strip_mcu_rows
+
+    q_y = adjust_quantization_matrix(BASE_Q_LUMINANCE, quality)
+    q_c = adjust_quantization_matrix(BASE_Q_CHROMINANCE, quality)
+    huffman_tables = select_huffman_tables()
+
+    plane_dims = {'Y': (height, width), 'Cb': (chroma_height, chroma_width), 'Cr': (chroma_height, chroma_width)}
+    if grayscale:
+        plane_dims = {'Y': (height, width)}
+    padded_dims = {comp_name: (math.ceil(h / block_size) * block_size, math.ceil(w / block_size) * block_size)
+                   for comp_name, (h, w) in plane_dims.items()}
+    restart_offsets = None
+    if restart_interval:
+        restart_offsets = {comp_name: [0] * math.ceil((h // block_size) * (w // block_size) / restart_interval)
+                           for comp_name, (h, w) in padded_dims.items()}
+    row_positions = None
+    if row_index:
+        row_positions = {comp_name: [[0, 0]] * (h // block_size) for comp_name, (h, w) in padded_dims.items()}
+    placeholder = myjpeg_metadata(width, height, quality, block_size, subsampling, q_y, q_c, padded_dims,
+                                  huffman_tables, dict.fromkeys(plane_dims, 0), restart_interval, restart_offsets,
+                                  row_positions)
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    with open(output_path, 'wb') as f, tempfile.TemporaryFile() as cb_file, tempfile.TemporaryFile() as cr_file:
+        header_size = write_header(f, placeholder)
+        outputs = {'Y': f, 'Cb': cb_file, 'Cr': cr_file}
+        writers = {
+            comp_name: ComponentStreamWriter(outputs[comp_name], *huffman_tables[comp_name], restart_interval,
+                                             padded_dims[comp_name][1] // block_size if row_index else None)
+            for comp_name in plane_dims
+        }
+        q_tables = {'Y': q_y, 'Cb': q_c, 'Cr': q_c}
+
+        for row_start in range(0, height, strip_rows):
+            rows = read_rows(row_start, min(row_start + strip_rows, height))
+            if grayscale:
+                planes = {'Y': rows}
+            else:
+                ycbcr = rgb_to_ycbcr(rows)
+                planes = {
+                    'Y': ycbcr[:, :, 0],
+                    'Cb': downsample_channel(ycbcr[:, :, 1], subsampling),
+                    'Cr': downsample_channel(ycbcr[:, :, 2], subsampling),
+                }
+            for comp_name, plane in planes.items():
+                zigzag_blocks, _ = quantize_channel_blocks(plane, q_tables[comp_name], block_size, dct_method)
+                writers[comp_name].write_blocks(zigzag_blocks)
+
+        for writer in writers.values():
+            writer.finish()
+        for chroma_file in (cb_file, cr_file):
+            chroma_file.seek(0)
+            shutil.copyfileobj(chroma_file, f)
+
+        data_lengths = {comp_name: writer.bytes_written for comp_name, writer in writers.items()}
+        if restart_interval:
+            restart_offsets = {comp_name: writer.restart_offsets for comp_name, writer in writers.items()}
+        if row_index:
+            row_positions = {comp_name: writer.row_index for comp_name, writer in writers.items()}
+        metadata = myjpeg_metadata(width, height, quality, block_size, subsampling, q_y, q_c, padded_dims,
+                                   huffman_tables, data_lengths, restart_interval, restart_offsets, row_positions)
+        f.seek(0)
+        if write_header(f, metadata) != header_size:
+            raise ValueError("Streaming header size changed while patching")
+
+    for comp_name, length in data_lengths.items():
+        print(f"{comp_name}: {writers[comp_name].block_index} blocks, compressed size {length} bytes")
+    print(f"Compression complete. Output saved to {output_path}")
@@ -0,0 +1,82 @@
+import math
+import numpy as np
+
+SUBSAMPLING_FACTORS = {
+    '4:4:4': (1, 1),
+    '4:2:2': (1, 2),
+    '4:2:0': (2, 2),
+}
+
+def get_subsampling_factors(mode):
+    if mode not in SUBSAMPLING_FACTORS:
+        raise ValueError(f"Unsupported chroma subsampling mode {mode!r}. Expected one of {list(SUBSAMPLING_FACTORS)}.")
+    return SUBSAMPLING_FACTORS[mode]
+
+def subsampling_mode(factor_v, factor_h):
+    for mode, factors in SUBSAMPLING_FACTORS.items():
+        if factors == (factor_v, factor_h):
+            return mode
+    return None
+
+def subsampled_size(height, width, mode):
+    factor_v, factor_h = get_subsampling_factors(mode)
+    return math.ceil(height / factor_v), math.ceil(width / factor_h)
+
+def downsample_channel(channel, mode):
+    factor_v, factor_h = get_subsampling_factors(mode)
+    if factor_v == 1 and factor_h == 1:
+        return channel
+
+    height, width = channel.shape
+    new_height, new_width = subsampled_size(height, width, mode)
+    padded = np.zeros((new_height * factor_v, new_width * factor_h), dtype=np.float64)
+    padded[:height, :width] = channel
+    sums = padded.reshape(new_height, factor_v, new_width, factor_h).sum(axis=(1, 3))
+
+    row_counts = np.minimum(factor_v, height - np.arange(new_height) * factor_v)
+    col_counts = np.minimum(factor_h, width - np.arange(new_width) * factor_h)
+    counts = np.outer(row_counts, col_counts)
+    return np.round(sums / counts).astype(np.uint8)
+
+def _bilinear_taps(start, end, source_size, factor):
+    positions = (np.arange(start, end, dtype=np.float32) + 0.5) / factor - 0.5
+    positions = np.clip(positions, 0, source_size - 1)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, source_size - 1)
+    weights = positions - lower
+    return lower, upper, weights
+
+def upsample_channel(channel, target_height, target_width, mode, fancy=False):
+    factor_v, factor_h = get_subsampling_factors(mode)
+    return upsample_channel_by_factors(channel, target_height, target_width, factor_v, factor_h, fancy)
+
+def upsample_channel_by_factors(channel, target_height, target_width, factor_v, factor_h, fancy=False):
+    return upsample_rows(channel, 0, target_height, target_width, factor_v, factor_h, fancy)
+
+def upsample_rows(channel, row_start, row_end, target_width, factor_v, factor_h, fancy=False):
+    if channel.size == 0:
+        return np.full((row_end - row_start, target_width), 128, dtype=np.uint8)
+    if factor_v == 1 and factor_h == 1:
+        return channel[row_start:row_end, :target_width]
+
+    if not fancy:
+        first_row = row_start // factor_v
+        upsampled = channel[first_row:-(-row_end // factor_v)]
+        if factor_v > 1:
+            upsampled = upsampled.repeat(factor_v, axis=0)[row_start - first_row * factor_v:]
+        if factor_h > 1:
+            upsampled = upsampled.repeat(factor_h, axis=1)
+        return upsampled[:row_end - row_start, :target_width]
+
+    if factor_v > 1:
+        lower, upper, weights = _bilinear_taps(row_start, row_end, channel.shape[0], factor_v)
+        weights = weights[:, None]
+        source = channel[lower].astype(np.float32) * (1 - weights) + channel[upper].astype(np.float32) * weights
+    else:
+        source = channel[row_start:row_end].astype(np.float32)
+    if factor_h > 1:
+        lower, upper, weights = _bilinear_taps(0, target_width, source.shape[1], factor_h)
+        source = source[:, lower] * (1 - weights) + source[:, upper] * weights
+    else:
+        source = source[:, :target_width]
+    return np.clip(np.round(source), 0, 255).astype(np.uint8)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from container import parse_header
+from jpeg_codec import jpeg_compress, jpeg_decompress
+
+def _ac_first_ranges(data):
+    metadata, offset = parse_header(data)
+    ranges = []
+    for scan in metadata['scans']:
+        if scan['ss'] > 0 and scan['ah'] == 0:
+            ranges.append((offset, offset + scan['data_len']))
+        offset += scan['data_len']
+    return ranges
+
+@pytest.mark.parametrize('channels, quality', [(3, 95), (3, 50), (1, 95)])
+def test_truncated_ac_first_scan_decodes_full_image(channels, quality):
+    rng = np.random.default_rng(0)
+    shape = (67, 45, 3) if channels == 3 else (67, 45)
+    ramp = np.linspace(0, 255, 45).reshape(1, 45, *(1,) * (channels > 1))
+    image = np.clip(ramp + rng.normal(0, 20, shape), 0, 255).astype(np.uint8)
+    data = jpeg_compress(image, quality, progressive=True)
+    ranges = _ac_first_ranges(data)
+    assert ranges
+    for start, end in ranges:
+        for cut in range(start + 1, end, max(1, (end - start) // 8)):
+            assert jpeg_decompress(data[:cut]).shape == image.shape
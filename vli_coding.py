@@ -1,27 +1,46 @@
-def vli_value(number):
-    if number == 0:
-        return 0, ""
-
-    magnitude = abs(number)
-    category = magnitude.bit_length()
-
-    if number > 0:
-        value_bits = bin(magnitude)[2:].zfill(category)
-    else:
-        temp_val = (1 << category) - 1 - magnitude
-        value_bits = bin(temp_val)[2:].zfill(category)
-
-    return category, value_bits
-
-def decode_vli(category, value_bits_str):
-
-    value_from_bits = int(value_bits_str, 2)
-    sign_threshold = 1 << (category - 1)
-
-    if value_from_bits >= sign_threshold:
-        return value_from_bits
-    else:
-        return value_from_bits - ((1 << category) - 1)
-
-def get_vli_category_and_value(number):
-    return vli_value(number)
+import numpy as np
+
+def vli_value(number):
+    if number == 0:
+        return 0, ""
+
+    magnitude = abs(number)
+    category = magnitude.bit_length()
+
+    if number > 0:
+        value_bits = bin(magnitude)[2:].zfill(category)
+    else:
+        temp_val = (1 << category) - 1 - magnitude
+        value_bits = bin(temp_val)[2:].zfill(category)
+
+    return category, value_bits
+
+def decode_vli(category, value_bits_str):
+    if category == 0:
+        return 0
+
+    value_from_bits = int(value_bits_str, 2)
+    sign_threshold = 1 << (category - 1)
+
+    if value_from_bits >= sign_threshold:
+        return value_from_bits
+    else:
+        return value_from_bits - ((1 << category) - 1)
+
+def get_vli_category_and_value(number):
+    return vli_value(number)
+
+def decode_vli_value(category, value):
+    if category == 0:
+        return 0
+    if value >= 1 << (category - 1):
+        return value
+    return value - ((1 << category) - 1)
+
+def vli_category_array(values):
+    magnitudes = np.abs(np.asarray(values, dtype=np.int64))
+    return np.frexp(magnitudes.astype(np.float64))[1].astype(np.int64)
+
+def vli_amplitude_array(values, categories):
+    values = np.asarray(values, dtype=np.int64)
+    return np.where(values < 0, values + (np.int64(1) << categories) - 1, values)
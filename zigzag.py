@@ -1,68 +1,68 @@
-import numpy as np
-
-def zigzag_scan(matrix):
-    N = matrix.shape[0]
-    result = np.empty(N * N, dtype=matrix.dtype)
-    index = 0
-    row, col = 0, 0
-    up = True
-
-    for _ in range(N * N):
-        result[index] = matrix[row, col]
-        index += 1
-
-        if up:
-            if col == N - 1:
-                row += 1
-                up = False
-            elif row == 0:
-                col += 1
-                up = False
-            else:
-                row -= 1
-                col += 1
-        else:
-            if row == N - 1:
-                col += 1
-                up = True
-            elif col == 0:
-                row += 1
-                up = True
-            else:
-                row += 1
-                col -= 1
-
-    return result
-
-def inverse_zigzag_scan(array, N):
-    matrix = np.empty((N, N), dtype=array.dtype)
-    index = 0
-    row, col = 0, 0
-    up = True
-
-    for _ in range(N * N):
-        matrix[row, col] = array[index]
-        index += 1
-
-        if up:
-            if col == N - 1:
-                row += 1
-                up = False
-            elif row == 0:
-                col += 1
-                up = False
-            else:
-                row -= 1
-                col += 1
-        else:
-            if row == N - 1:
-                col += 1
-                up = True
-            elif col == 0:
-                row += 1
-                up = True
-            else:
-                row += 1
-                col -= 1
-
-    return matrix
+import numpy as np
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def zigzag_indices(N):
+    result = np.empty(N * N, dtype=np.intp)
+    index = 0
+    row, col = 0, 0
+    up = True
+
+    for _ in range(N * N):
+        result[index] = row * N + col
+        index += 1
+
+        if up:
+            if col == N - 1:
+                row += 1
+                up = False
+            elif row == 0:
+                col += 1
+                up = False
+            else:
+                row -= 1
+                col += 1
+        else:
+            if row == N - 1:
+                col += 1
+                up = True
+            elif col == 0:
+                row += 1
+                up = True
+            else:
+                row += 1
+                col -= 1
+
+    result.setflags(write=False)
+    return result
+
+@lru_cache(maxsize=None)
+def inverse_zigzag_indices(N):
+    result = np.argsort(zigzag_indices(N))
+    result.setflags(write=False)
+    return result
+
+def zigzag_scan(matrix):
+    N = matrix.shape[0]
+    return matrix.reshape(N * N)[zigzag_indices(N)]
+
+def inverse_zigzag_scan(array, N):
+    return np.asarray(array)[inverse_zigzag_indices(N)].reshape(N, N)
+
+def zigzag_scan_blocks(blocks):
+    num_blocks, N = blocks.shape[0], blocks.shape[1]
+    return blocks.reshape(num_blocks, N * N)[:, zigzag_indices(N)]
+
+def inverse_zigzag_scan_blocks(arrays, N):
+    return arrays[:, inverse_zigzag_indices(N)].reshape(arrays.shape[0], N, N)
+
+@lru_cache(maxsize=None)
+def corner_zigzag_positions(N, M):
+    natural = (np.arange(M)[:, None] * N + np.arange(M)[None, :]).reshape(-1)
+    result = inverse_zigzag_indices(N)[natural]
+    result.setflags(write=False)
+    return result
+
+def last_nonzero_indices(arrays):
+    positions = np.arange(arrays.shape[1], dtype=np.min_scalar_type(arrays.shape[1] - 1))
+    return ((arrays != 0) * positions).max(axis=1)